@@ -3,6 +3,24 @@ ASGI config for dairydjango_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The milk report and list pages (all farms, farm detail, cow list, milking
+sessions, daily and per-cow milk) are async views. Django 4.2 has no async
+database driver, so their queries still run in threads: each ORM call goes
+through sync_to_async(thread_sensitive=True), which under ASGI means a
+thread for every request in flight. The event loop only takes over the
+waiting between queries and on the client. Run it with, for example::
+
+    pip install uvicorn
+    MASHAMBA_CONN_MAX_AGE=0 uvicorn dairydjango_project.asgi:application
+
+or with daphne. Persistent connections leak under ASGI, hence
+MASHAMBA_CONN_MAX_AGE=0 (see DATABASES in settings.py). More worker
+processes need a shared report cache (MASHAMBA_REDIS_URL, see CACHES in
+settings.py). The remaining views are synchronous and Django runs each of
+them in a thread; under a WSGI server (runserver, gunicorn) the async views
+still work, each in its own event loop. Static files are not served by this
+application; put them behind the web server or a CDN.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mashamba.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,7 +56,7 @@ ROOT_URLCONF = 'dairydjango_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'mashamba.template_backends.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -73,13 +75,88 @@ WSGI_APPLICATION = 'dairydjango_project.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# SQLite by default. Set MASHAMBA_DATABASE=postgres and the POSTGRES_*
+# variables to use PostgreSQL instead (psycopg must be installed).
+#
+# Each worker thread keeps its connection (and its warm page cache) for up to
+# a minute, checked before reuse by CONN_HEALTH_CHECKS. MASHAMBA_CONN_MAX_AGE
+# overrides the lifetime in seconds; 'none' keeps connections for good. Under
+# ASGI, Django 4.2 opens a connection in each request's thread and does not
+# reliably close a persistent one afterwards, so set it to 0 there.
+
+_conn_max_age = os.environ.get('MASHAMBA_CONN_MAX_AGE', '60')
+DATABASE_CONN_MAX_AGE = None if _conn_max_age.lower() == 'none' else int(_conn_max_age)
+
+if os.environ.get('MASHAMBA_DATABASE', 'sqlite') == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'dairydjango'),
+            'USER': os.environ.get('POSTGRES_USER', ''),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', ''),
+            'PORT': os.environ.get('POSTGRES_PORT', ''),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            # Adds init_command and transaction_mode; see the module docstring.
+            'ENGINE': 'mashamba.db_backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Writers take the lock up front and wait for each other.
+                'transaction_mode': 'IMMEDIATE',
+                # WAL lets readers carry on while a write is in progress, and
+                # synchronous=NORMAL is durable across crashes in WAL mode.
+                # 64 MiB page cache, 256 MiB memory map.
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA busy_timeout=5000;'
+                    'PRAGMA cache_size=-65536;'
+                    'PRAGMA mmap_size=268435456;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Milk report pages are cached per farm; see mashamba/cache.py. Local memory
+# by default, which suits a single worker process. With several workers set
+# MASHAMBA_REDIS_URL (e.g. redis://localhost:6379/1, redis-py must be
+# installed) so they share the reports and see each other's invalidations.
+
+if os.environ.get('MASHAMBA_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['MASHAMBA_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'mashamba-reports',
+        }
     }
-}
+
+
+# Request metrics
+# Views declare query budgets with mashamba.middleware.query_budget. Going over
+# is logged; the test runner turns this on so it fails the test instead.
+
+QUERY_BUDGETS_ENFORCED = False
+
+TEST_RUNNER = 'mashamba.test_runner.QueryBudgetTestRunner'
 
 
 # Password validation
@@ -108,6 +185,9 @@ LOGOUT_REDIRECT_URL = 'mashamba:home'
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# The herd milking sheet posts two fields per cow; leave room for large herds.
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 5000
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
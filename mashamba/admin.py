@@ -1,9 +1,12 @@
 from django.contrib import admin
+from django.db.models import Q
 from .models import (
     Farm, Cow, MilkingSession, HealthRecord,
-    BreedingRecord, CalvingRecord, Inventory, Expense, Revenue, ProductService
+    BreedingRecord, CalvingRecord, Inventory, Expense, Revenue, ProductService, YieldAnomaly, MilkSale,
+    Customer, CustomerPayment
 )
 from .forms import MilkingSessionForm, BreedingRecordForm, CalvingRecordForm  # Import your custom forms here
+from .search import search_farms
 
 # Register your models and associate custom forms with admin models
 
@@ -12,6 +15,18 @@ class FarmAdmin(admin.ModelAdmin):
     list_display = ('name', 'manager', 'location', 'active', 'verified', 'created', 'updated')
     list_filter = ('active', 'verified', 'created', 'updated')
     search_fields = ('name', 'location', 'manager__username')
+    list_select_related = ('manager',)
+    raw_id_fields = ('manager',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Name, location and product words are looked up in the farm search
+        # index rather than scanned with icontains; managers match by username.
+        # Autocomplete widgets for farm fields search through here too.
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        farm_ids = search_farms(Farm.objects.all(), query=search_term).values('id')
+        return queryset.filter(Q(id__in=farm_ids) | Q(manager__username=search_term)), False
 
 
 @admin.register(ProductService)
@@ -19,32 +34,43 @@ class ProductServiceAdmin(admin.ModelAdmin):
     list_display = ('name', 'farm', 'price')  # Fields to display in the admin list view
     list_filter = ('farm',)  # Filter options in the admin
     search_fields = ('name', 'farm__name')
+    list_select_related = ('farm',)
+    autocomplete_fields = ('farm',)
 
 
 @admin.register(Cow)
 class CowAdmin(admin.ModelAdmin):
     list_display = ('name_or_tag', 'farm', 'breed', 'gender', 'date_of_birth')
     list_filter = ('gender', 'breed', 'farm')
-    search_fields = ('name_or_tag', 'farm__name')
+    search_fields = ('name_or_tag', 'identifier', 'farm__name')
+    list_select_related = ('farm',)
+    autocomplete_fields = ('farm',)
 
 
 @admin.register(MilkingSession)
 class MilkingSessionAdmin(admin.ModelAdmin):
     list_display = ('cow', 'milk_yield', 'milking_time')
     list_filter = ('milking_time',)
+    list_select_related = ('cow',)
+    autocomplete_fields = ('cow',)
     form = MilkingSessionForm  # Associate MilkingSessionForm with MilkingSessionAdmin
+    fields = ('cow', 'milk_yield', 'milking_time')  # MilkingSessionForm leaves the cow out
 
 @admin.register(HealthRecord)
 class HealthRecordAdmin(admin.ModelAdmin):
-    list_display = ('cow', 'health_issue', 'treatment_date', 'vet_name', 'vet_company')
+    list_display = ('cow', 'health_issue', 'treatment_date', 'withdrawal_until', 'vet_name', 'vet_company')
     list_filter = ('treatment_date', 'vet_name', 'vet_company')
     search_fields = ('cow__name_or_tag', 'health_issue')
+    list_select_related = ('cow',)
+    autocomplete_fields = ('cow',)
 
 @admin.register(BreedingRecord)
 class BreedingRecordAdmin(admin.ModelAdmin):
     list_display = ('cow', 'breeding_method', 'bull_name', 'expected_calving_date')
     list_filter = ('breeding_method', 'expected_calving_date')
     search_fields = ('cow__name_or_tag', 'bull_name')
+    list_select_related = ('cow',)
+    autocomplete_fields = ('cow',)
     form = BreedingRecordForm  # Associate BreedingRecordForm with BreedingRecordAdmin
 
 @admin.register(CalvingRecord)
@@ -52,6 +78,8 @@ class CalvingRecordAdmin(admin.ModelAdmin):
     list_display = ('cow', 'calving_date', 'calf_details')
     list_filter = ('calving_date',)
     search_fields = ('cow__name_or_tag', 'calf_details')
+    list_select_related = ('cow',)
+    autocomplete_fields = ('cow',)
     form = CalvingRecordForm  # Associate CalvingRecordForm with CalvingRecordAdmin
 
 @admin.register(Inventory)
@@ -59,15 +87,50 @@ class InventoryAdmin(admin.ModelAdmin):
     list_display = ('item_name', 'quantity', 'date_acquired')
     list_filter = ('date_acquired',)
     search_fields = ('item_name',)
+    autocomplete_fields = ('farm',)
 
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
     list_display = ('name', 'cost', 'date', 'category')
     list_filter = ('date', 'category')
     search_fields = ('name', 'category')
+    autocomplete_fields = ('farm',)
 
 @admin.register(Revenue)
 class RevenueAdmin(admin.ModelAdmin):
     list_display = ('name', 'cost', 'date', 'description')
     list_filter = ('date',)
     search_fields = ('name', 'description')
+    autocomplete_fields = ('farm',)
+
+@admin.register(MilkSale)
+class MilkSaleAdmin(admin.ModelAdmin):
+    list_display = ('customer_name', 'farm', 'milk_amount', 'price_per_litre', 'sale_time')
+    list_filter = ('farm', 'sale_time')
+    search_fields = ('customer_name',)
+    list_select_related = ('farm',)
+    autocomplete_fields = ('farm', 'customer')
+
+@admin.register(Customer)
+class CustomerAdmin(admin.ModelAdmin):
+    list_display = ('name', 'farm', 'phone_number', 'price_per_litre')
+    search_fields = ('name', 'phone_number')
+    list_select_related = ('farm',)
+    autocomplete_fields = ('farm',)
+
+@admin.register(CustomerPayment)
+class CustomerPaymentAdmin(admin.ModelAdmin):
+    list_display = ('customer', 'amount', 'paid_on', 'reference')
+    list_filter = ('paid_on',)
+    search_fields = ('customer__name', 'reference')
+    list_select_related = ('customer',)
+    autocomplete_fields = ('customer',)
+
+
+@admin.register(YieldAnomaly)
+class YieldAnomalyAdmin(admin.ModelAdmin):
+    list_display = ('cow', 'farm', 'kind', 'milk_yield', 'expected_yield', 'milking_time')
+    list_filter = ('kind', 'milking_time')
+    search_fields = ('cow__name_or_tag', 'farm__name')
+    list_select_related = ('cow', 'farm')
+    raw_id_fields = ('cow', 'farm', 'session')
@@ -0,0 +1,188 @@
+"""Lactation analytics for a farm's milking herd.
+
+The farm's recent daily yields are read with one ``values_list`` query and
+split into columns (cow, day number, litres). Each cow's rows are a slice of
+those columns, found by bisection, so per-cow figures come from builtins
+(sum, max, slicing) over the slice rather than from a loop per session. The
+herd curve adds each run of consecutive days to the curve in one map() and
+counts lactations per day in milk with a difference array, so it has no
+per-day loop either.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, timedelta
+from itertools import accumulate
+from operator import add, itemgetter
+
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import CalvingRecord, Cow, DailyMilkSummary
+
+# Standard lactation length the projection is made to.
+LACTATION_DAYS = 305
+# Daily yields are read from the oldest current calving, but never from
+# further back than this.
+HISTORY_DAYS = 2 * 365
+# Persistence compares the mean of the latest days with the peak.
+PERSISTENCE_DAYS = 30
+# Metrics the herd ranking can be ordered by, highest first.
+RANKING_KEYS = ['projected_305', 'yield_to_date', 'peak_yield', 'persistence', 'deviation', 'days_in_milk']
+
+
+def herd_lactation_metrics(farm, today=None):
+    """Current-lactation metrics for every active female cow on ``farm``.
+
+    Returns ``{'cows': [...], 'curve': [...]}``. Each cow entry has
+    ``calving_date``, ``days_in_milk``, ``yield_to_date``, ``peak_yield``,
+    ``peak_day``, ``projected_305``, ``persistence`` (latest 30-day mean as a
+    percentage of peak) and ``deviation`` (percentage above or below the herd
+    curve over the same days in milk). Cows with no calving on record have
+    None for the lactation figures. ``curve`` is the herd's mean daily yield
+    for each day in milk up to 305.
+    """
+    today = today or timezone.localdate()
+    today_number = today.toordinal()
+    since = today - timedelta(days=HISTORY_DAYS)
+
+    cows = list(
+        Cow.objects.filter(farm=farm, is_active=True, gender='Female').order_by('id').values_list('id', 'name_or_tag')
+    )
+    calvings = defaultdict(list)
+    for cow_id, calving_date in CalvingRecord.objects.filter(
+        cow__farm=farm, calving_date__lte=today,
+    ).order_by('cow_id', 'calving_date').values_list('cow_id', 'calving_date'):
+        calvings[cow_id].append(calving_date.toordinal())
+
+    # Nothing before the oldest current lactation is needed.
+    current = [starts[-1] for starts in calvings.values()]
+    if current:
+        since = max(since, date.fromordinal(min(current)) - timedelta(days=1))
+
+    # Both columns come back as text and are parsed in bulk with map(), which
+    # is far cheaper than Django's per-row date and float converters.
+    rows = list(DailyMilkSummary.objects.filter(farm=farm, date__gt=since, date__lte=today).order_by(
+        'cow_id', 'date',
+    ).annotate(
+        day=Cast('date', CharField()), litres=Cast('total_yield', CharField()),
+    ).values_list('cow_id', 'day', 'litres'))
+    cow_column, day_column, litres_column = zip(*rows) if rows else ((), (), ())
+    day_column = array('l', map(date.toordinal, map(date.fromisoformat, day_column)))
+    litres_column = array('d', map(float, litres_column))
+
+    def cow_slice(cow_id):
+        return bisect_left(cow_column, cow_id), bisect_right(cow_column, cow_id)
+
+    curve = _herd_curve(cows, calvings, cow_slice, day_column, litres_column)
+    expected_to = array('d', [0.0])
+    for litres in curve:
+        expected_to.append(expected_to[-1] + litres)
+
+    results = []
+    for cow_id, name in cows:
+        entry = {
+            'cow_id': cow_id, 'cow': name, 'calving_date': None, 'days_in_milk': None,
+            'yield_to_date': None, 'peak_yield': None, 'peak_day': None,
+            'projected_305': None, 'persistence': None, 'deviation': None,
+        }
+        results.append(entry)
+        if not calvings[cow_id]:
+            continue
+        calved = calvings[cow_id][-1]
+        entry['calving_date'] = date.fromordinal(calved)
+        entry['days_in_milk'] = today_number - calved
+
+        lo, hi = cow_slice(cow_id)
+        lo = bisect_left(day_column, calved, lo, hi)
+        if lo == hi:
+            continue
+        litres = litres_column[lo:hi]
+        first_day, last_day = day_column[lo] - calved, day_column[hi - 1] - calved
+
+        peak = max(litres)
+        entry['yield_to_date'] = round(sum(litres), 2)
+        entry['peak_yield'] = round(peak, 2)
+        entry['peak_day'] = day_column[lo + litres.index(peak)] - calved
+        recent = litres_column[bisect_left(day_column, day_column[hi - 1] - PERSISTENCE_DAYS + 1, lo, hi):hi]
+        entry['persistence'] = round(sum(recent) / len(recent) / peak * 100, 1) if peak else None
+
+        # Compare with what the herd curve gives over the days this cow has been milked.
+        expected = _curve_sum(expected_to, first_day, last_day + 1)
+        ratio = sum(litres) / expected if expected else None
+        if ratio is not None:
+            entry['deviation'] = round((ratio - 1) * 100, 1)
+
+        if last_day >= LACTATION_DAYS - 1:
+            in_305 = bisect_left(day_column, calved + LACTATION_DAYS, lo, hi)
+            entry['projected_305'] = round(sum(litres_column[lo:in_305]), 2)
+        elif ratio is not None:
+            remaining = _curve_sum(expected_to, last_day + 1, LACTATION_DAYS)
+            entry['projected_305'] = round(sum(litres) + ratio * remaining, 2)
+
+    return {'cows': results, 'curve': [round(litres, 2) for litres in curve]}
+
+
+def rank_cows(metrics, key):
+    """Split ``metrics['cows']`` into (ranked by ``key``, highest first; cows with no value for it)."""
+    ranked = sorted((entry for entry in metrics['cows'] if entry[key] is not None), key=itemgetter(key), reverse=True)
+    unranked = [entry for entry in metrics['cows'] if entry[key] is None]
+    return ranked, unranked
+
+
+def _herd_curve(cows, calvings, cow_slice, day_column, litres_column):
+    """Mean daily yield by day in milk (0..304) across every lactation in the window."""
+    totals = array('d', bytes(8 * LACTATION_DAYS))
+    # Lactations milked on each day in milk, as a difference array: +1 where a
+    # run of days starts and -1 after it ends.
+    count_steps = [0] * (LACTATION_DAYS + 1)
+    for cow_id, _ in cows:
+        cow_lo, cow_hi = cow_slice(cow_id)
+        starts = calvings[cow_id]
+        for i, calved in enumerate(starts):
+            lo = bisect_left(day_column, calved, cow_lo, cow_hi)
+            end = starts[i + 1] if i + 1 < len(starts) else calved + LACTATION_DAYS
+            hi = bisect_left(day_column, min(end, calved + LACTATION_DAYS), lo, cow_hi)
+            for run_lo, run_hi in _day_runs(day_column, lo, hi):
+                first = day_column[run_lo] - calved
+                stop = first + run_hi - run_lo
+                totals[first:stop] = array('d', map(add, totals[first:stop], litres_column[run_lo:run_hi]))
+                count_steps[first] += 1
+                count_steps[stop] -= 1
+
+    curve, last = [], 0.0
+    for total, count in zip(totals, accumulate(count_steps)):
+        # Days no cow has reached yet carry the last known mean forward.
+        last = total / count if count else last
+        curve.append(last)
+    return curve
+
+
+def _day_runs(day_column, lo, hi):
+    """Split rows lo:hi of one cow into (lo, hi) runs of consecutive days.
+
+    A cow has at most one row a day, so within a run day - row index stays
+    the same. Each run is found by galloping then bisecting on that, so the
+    work grows with the number of missed days, not the number of rows.
+    """
+    runs = []
+    while lo < hi:
+        base = day_column[lo] - lo
+        # Rows lo..end are consecutive while day_column[i] - i stays equal to base.
+        step, end = 1, lo
+        while end + step < hi and day_column[end + step] - (end + step) == base:
+            end += step
+            step *= 2
+        while step > 1:
+            step //= 2
+            if end + step < hi and day_column[end + step] - (end + step) == base:
+                end += step
+        runs.append((lo, end + 1))
+        lo = end + 1
+    return runs
+
+
+def _curve_sum(prefix, start, stop):
+    start, stop = max(start, 0), min(stop, LACTATION_DAYS)
+    return prefix[stop] - prefix[start] if stop > start else 0.0
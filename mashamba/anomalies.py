@@ -0,0 +1,132 @@
+"""Incremental detection of unusual milking-session yields.
+
+Each cow has a YieldBaseline holding an exponentially weighted mean and
+variance of its session yields. The scan reads only sessions newer than the
+stored high-water mark, scores each against its cow's baseline and folds it
+into the baseline. A yield far below the baseline is flagged as a drop (an
+early sign of mastitis), one far above as a spike (usually a typing error).
+
+The mark is a (milking_time, id) position, so sessions reach the baselines in
+the order the cows were milked. A session is only scanned once it is
+SETTLE_TIME old, which leaves time for entries synced late from the field
+and for transactions still in flight. A session recorded later than that
+with a milking time behind the mark (an import of old history, say) is
+never scored; ``detect_yield_anomalies --rescan`` replays everything in order.
+"""
+import math
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import MilkingSession, YieldAnomaly, YieldBaseline, YieldScanState
+
+SCAN_NAME = 'milking-sessions'
+SCAN_BATCH_SIZE = 5000
+SETTLE_TIME = timedelta(days=1)
+# Weight of the newest session in the rolling mean and variance.
+SMOOTHING = 0.1
+# Sessions a cow needs before any of hers are judged.
+WARMUP_SESSIONS = 10
+# The standard deviation is never taken as less than this, so a cow with
+# very even yields is not flagged for ordinary half-litre changes.
+MIN_STD_LITRES = 0.75
+DROP_Z = -3.0
+SPIKE_Z = 4.0
+
+
+def score(baseline, litres):
+    """Return ``(kind or None, z_score)`` for ``litres`` against ``baseline``."""
+    if baseline.samples < WARMUP_SESSIONS:
+        return None, 0.0
+    z_score = (litres - baseline.mean) / max(math.sqrt(baseline.variance), MIN_STD_LITRES)
+    if z_score <= DROP_Z:
+        return 'drop', z_score
+    if z_score >= SPIKE_Z:
+        return 'spike', z_score
+    return None, z_score
+
+
+def update(baseline, litres):
+    """Fold ``litres`` into the baseline's rolling mean and variance."""
+    if baseline.samples == 0:
+        baseline.mean, baseline.variance = litres, 0.0
+    else:
+        diff = litres - baseline.mean
+        increment = SMOOTHING * diff
+        baseline.mean += increment
+        baseline.variance = (1 - SMOOTHING) * (baseline.variance + diff * increment)
+    baseline.samples += 1
+
+
+def scan_milking_sessions(batch_size=SCAN_BATCH_SIZE, now=None):
+    """Scan every settled session past the high-water mark and return ``(scanned, flagged)``.
+
+    Each batch commits with its high-water mark, so an interrupted scan picks
+    up where it stopped.
+    """
+    settled = (now or timezone.now()) - SETTLE_TIME
+    scanned = flagged = 0
+    while True:
+        with transaction.atomic():
+            state, _ = YieldScanState.objects.select_for_update().get_or_create(name=SCAN_NAME)
+            sessions = MilkingSession.objects.filter(milking_time__lt=settled)
+            if state.last_milking_time is not None:
+                # Written so the range on milking_time can use the index.
+                sessions = sessions.filter(milking_time__gte=state.last_milking_time).filter(
+                    Q(milking_time__gt=state.last_milking_time) | Q(id__gt=state.last_session_id)
+                )
+            sessions = list(sessions.order_by('milking_time', 'id').values_list(
+                'id', 'cow_id', 'cow__farm_id', 'milk_yield', 'milking_time',
+            )[:batch_size])
+            if not sessions:
+                break
+            flagged += _scan_batch(sessions)
+            scanned += len(sessions)
+            state.last_session_id, state.last_milking_time = sessions[-1][0], sessions[-1][4]
+            state.save(update_fields=['last_session_id', 'last_milking_time', 'updated'])
+    return scanned, flagged
+
+
+def _scan_batch(sessions):
+    cow_ids = {session[1] for session in sessions}
+    baselines = YieldBaseline.objects.in_bulk(cow_ids)
+    new_baselines = {}
+    anomalies = []
+
+    # Within a batch each cow's sessions are taken in milking order.
+    for session_id, cow_id, farm_id, milk_yield, milking_time in sorted(sessions, key=lambda s: (s[1], s[4], s[0])):
+        baseline = baselines.get(cow_id)
+        if baseline is None:
+            baseline = baselines[cow_id] = new_baselines[cow_id] = YieldBaseline(cow_id=cow_id)
+        litres = float(milk_yield)
+        kind, z_score = score(baseline, litres)
+        if kind:
+            anomalies.append(YieldAnomaly(
+                cow_id=cow_id, farm_id=farm_id, session_id=session_id, kind=kind,
+                milking_time=milking_time, milk_yield=milk_yield,
+                expected_yield=round(baseline.mean, 2), z_score=round(z_score, 2),
+            ))
+        # A spike is most likely a mistyped entry; keep it out of the baseline.
+        if kind != 'spike':
+            update(baseline, litres)
+        if baseline.last_milking_time is None or milking_time > baseline.last_milking_time:
+            baseline.last_milking_time = milking_time
+
+    YieldBaseline.objects.bulk_create(new_baselines.values())
+    YieldBaseline.objects.bulk_update(
+        [baseline for cow_id, baseline in baselines.items() if cow_id not in new_baselines],
+        ['mean', 'variance', 'samples', 'last_milking_time'],
+        batch_size=SCAN_BATCH_SIZE,
+    )
+    YieldAnomaly.objects.bulk_create(anomalies, ignore_conflicts=True)
+    return len(anomalies)
+
+
+def reset_yield_scan():
+    """Forget all baselines, anomalies and the high-water mark."""
+    with transaction.atomic():
+        YieldAnomaly.objects.all().delete()
+        YieldBaseline.objects.all().delete()
+        YieldScanState.objects.filter(name=SCAN_NAME).delete()
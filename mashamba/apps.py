@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MashambaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mashamba'
+
+    def ready(self):
+        from . import middleware, signals  # noqa: F401  (connects the receivers)
@@ -0,0 +1,44 @@
+"""Async counterparts of the shortcuts the views use.
+
+Django 4.2 has no ``request.auser()``, ``aget_object_or_404`` or async-aware
+``login_required``; these fill the gap until the project moves to 5.0.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404
+
+
+def _load_user(request):
+    # Touching the lazy user runs the session and user queries.
+    request.user.is_authenticated
+    return request.user
+
+
+async def aget_user(request):
+    """Load ``request.user`` off the event loop and return it.
+
+    After this the user is cached on the request, so async code and
+    templates can read it without touching the database.
+    """
+    return await sync_to_async(_load_user)(request)
+
+
+def alogin_required(view_func):
+    """``login_required`` for async views."""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+async def aget_object_or_404(queryset, *args, **kwargs):
+    """Like ``get_object_or_404``, but for a model's queryset or manager in async code."""
+    try:
+        return await queryset.aget(*args, **kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
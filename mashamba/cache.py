@@ -0,0 +1,85 @@
+"""Versioned cache for the milk report pages.
+
+Each farm has a data version token, replaced whenever its milk data changes.
+Cached reports embed the token in their key, so a change makes every older
+entry unreachable at once and a report is never served stale.
+
+Tokens and reports both live in the default cache, so a cached report is
+served without touching the database. With the local-memory default that
+holds for one worker process; several workers need a shared default cache
+(see CACHES in settings.py) to see each other's bumps.
+"""
+import hashlib
+import uuid
+
+from django.core.cache import cache
+
+REPORT_CACHE_TIMEOUT = 60 * 60 * 24
+GLOBAL_VERSION_KEY = 'mashamba:milk-version:all'
+
+
+def _version_key(farm_id):
+    return f'mashamba:milk-version:{farm_id}'
+
+
+def _new_token():
+    # A new token (rather than a counter restarting at 1) means an evicted
+    # version can never match entries cached under an older one.
+    return uuid.uuid4().hex
+
+
+def milk_data_version(farm_id):
+    keys = [GLOBAL_VERSION_KEY, _version_key(farm_id)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # add() so that concurrent first readers settle on the same token.
+            cache.add(key, _new_token(), timeout=None)
+            versions[key] = cache.get(key)
+    return '.'.join(versions[key] for key in keys)
+
+
+async def amilk_data_version(farm_id):
+    keys = [GLOBAL_VERSION_KEY, _version_key(farm_id)]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, _new_token(), timeout=None)
+            versions[key] = await cache.aget(key)
+    return '.'.join(versions[key] for key in keys)
+
+
+def bump_milk_data_version(*farm_ids):
+    """Invalidate the cached reports of the given farms."""
+    if farm_ids:
+        cache.set_many({_version_key(farm_id): _new_token() for farm_id in farm_ids}, timeout=None)
+
+
+def bump_all_milk_data_versions():
+    """Invalidate the cached reports of every farm."""
+    cache.set(GLOBAL_VERSION_KEY, _new_token(), timeout=None)
+
+
+def _report_key(farm_id, version, name, params):
+    digest = hashlib.md5(repr(params).encode(), usedforsecurity=False).hexdigest()
+    return f'mashamba:report:{farm_id}:{version}:{name}:{digest}'
+
+
+def cached_report(farm_id, name, params, build):
+    """Return the report ``name`` for ``farm_id`` and ``params``, building it on a miss."""
+    key = _report_key(farm_id, milk_data_version(farm_id), name, params)
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, REPORT_CACHE_TIMEOUT)
+    return payload
+
+
+async def acached_report(farm_id, name, params, build):
+    """``cached_report`` for async views; ``build`` returns an awaitable."""
+    key = _report_key(farm_id, await amilk_data_version(farm_id), name, params)
+    payload = await cache.aget(key)
+    if payload is None:
+        payload = await build()
+        await cache.aset(key, payload, REPORT_CACHE_TIMEOUT)
+    return payload
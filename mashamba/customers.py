@@ -0,0 +1,157 @@
+"""Customer accounts: milk delivered, billed and paid for, month by month.
+
+CustomerMonth holds one row per customer, month and kind (deliveries or
+payments). When a sale or payment is written, the month it falls in is
+re-aggregated from its source rows, so a statement reads a couple of rows
+per month however many deliveries a regular customer has taken.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DateField, ExpressionWrapper, F, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Trunc
+from django.utils import timezone
+
+from .ledger import MONEY, LedgerSource, month_filter, month_start
+from .models import Customer, CustomerMonth, CustomerPayment, MilkSale
+
+
+class AccountSource(LedgerSource):
+    def __init__(self, model, date_field, amount, litres=None):
+        super().__init__(model, date_field, amount)
+        self.litres = litres
+
+
+ACCOUNT_SOURCES = {
+    'deliveries': AccountSource(
+        MilkSale, 'sale_time',
+        # Sales made before the customer had a price are delivered but not billed.
+        ExpressionWrapper(F('milk_amount') * Coalesce(F('price_per_litre'), Value(Decimal('0'))), output_field=MONEY),
+        litres=F('milk_amount'),
+    ),
+    'payments': AccountSource(CustomerPayment, 'paid_on', F('amount')),
+}
+ACCOUNT_KINDS = {source.model: kind for kind, source in ACCOUNT_SOURCES.items()}
+
+
+def account_key(kind, customer_id, day):
+    """The (kind, customer_id, month) CustomerMonth row a source row dated ``day`` is counted in."""
+    if isinstance(day, datetime):
+        day = timezone.localdate(day)
+    return (kind, customer_id, month_start(day))
+
+
+def instance_account_key(instance):
+    """As account_key for a sale or payment, or None for a sale with no customer."""
+    if instance.customer_id is None:
+        return None
+    kind = ACCOUNT_KINDS[type(instance)]
+    source = ACCOUNT_SOURCES[kind]
+    day = source.model._meta.get_field(source.date_field).to_python(getattr(instance, source.date_field))
+    return account_key(kind, instance.customer_id, day)
+
+
+def _account_rows(kind, queryset):
+    """CustomerMonth rows for ``queryset`` of the ``kind`` source, one per customer and month."""
+    source = ACCOUNT_SOURCES[kind]
+    rows = queryset.filter(customer__isnull=False).annotate(
+        account_month=Trunc(source.date_field, 'month', output_field=DateField()),
+    ).values('customer_id', 'account_month').annotate(
+        amount=Sum(source.amount, output_field=MONEY),
+        litres=Sum(source.litres) if source.litres else Value(Decimal('0')),
+        entries=Count('pk'),
+    ).order_by()
+    return [
+        CustomerMonth(
+            customer_id=row['customer_id'],
+            month=row['account_month'],
+            kind=kind,
+            litres=row['litres'],
+            amount=row['amount'],
+            entries=row['entries'],
+        )
+        for row in rows.iterator()
+    ]
+
+
+def refresh_customer_accounts(keys):
+    """Recompute the CustomerMonth rows for each (kind, customer_id, month) in ``keys``."""
+    with transaction.atomic():
+        for kind, customer_id, month in set(keys):
+            source = ACCOUNT_SOURCES[kind]
+            entries = source.model.objects.filter(customer_id=customer_id, **month_filter(source, month))
+            CustomerMonth.objects.filter(kind=kind, customer_id=customer_id, month=month).delete()
+            CustomerMonth.objects.bulk_create(_account_rows(kind, entries))
+
+
+def rebuild_customer_accounts(farm=None):
+    """Throw away and regenerate every customer account (or one farm's).
+
+    Returns the number of rows written.
+    """
+    written = 0
+    with transaction.atomic():
+        for kind, source in ACCOUNT_SOURCES.items():
+            entries = source.model.objects.all()
+            rows = CustomerMonth.objects.filter(kind=kind)
+            if farm is not None:
+                entries = entries.filter(customer__farm=farm)
+                rows = rows.filter(customer__farm=farm)
+            rows.delete()
+            written += len(CustomerMonth.objects.bulk_create(_account_rows(kind, entries), batch_size=1000))
+    return written
+
+
+def _billed_and_paid(prefix='', **filters):
+    zero = Value(Decimal('0'))
+    return {
+        'billed': Coalesce(Sum(f'{prefix}amount', filter=Q(**{f'{prefix}kind': 'deliveries'}, **filters)), zero),
+        'paid': Coalesce(Sum(f'{prefix}amount', filter=Q(**{f'{prefix}kind': 'payments'}, **filters)), zero),
+    }
+
+
+def farm_customers(farm):
+    """``farm``'s customers, each annotated with ``billed``, ``paid`` and the ``balance`` owed."""
+    return Customer.objects.filter(farm=farm).annotate(
+        **_billed_and_paid('account_months__'),
+    ).annotate(balance=F('billed') - F('paid'))
+
+
+def customer_statement(customer, year):
+    """``customer``'s account for ``year``, month by month, with a running balance.
+
+    ``opening_balance`` is what was owed at the start of the year. Each of
+    ``months`` has the ``deliveries`` made, ``litres`` and amount ``billed``,
+    the amount ``paid`` and the ``balance`` owed at the month's end.
+    ``years`` lists every year the account has entries for.
+    """
+    new_year = date(year, 1, 1)
+    account = CustomerMonth.objects.filter(customer=customer)
+    before = account.aggregate(first_month=Min('month'), **_billed_and_paid(month__lt=new_year))
+
+    months = {}
+    for row in account.filter(month__range=(new_year, date(year, 12, 1))).values(
+        'month', 'kind', 'litres', 'amount', 'entries',
+    ):
+        month = months.setdefault(row['month'], {
+            'period': row['month'], 'deliveries': 0, 'litres': Decimal('0'),
+            'billed': Decimal('0'), 'paid': Decimal('0'),
+        })
+        if row['kind'] == 'deliveries':
+            month.update(deliveries=row['entries'], litres=row['litres'], billed=row['amount'])
+        else:
+            month['paid'] = row['amount']
+
+    opening_balance = balance = before['billed'] - before['paid']
+    for month in sorted(months):
+        balance += months[month]['billed'] - months[month]['paid']
+        months[month]['balance'] = balance
+
+    first_year = before['first_month'].year if before['first_month'] else year
+    return {
+        'years': list(range(first_year, max(year, timezone.localdate().year) + 1)),
+        'opening_balance': opening_balance,
+        'months': [months[month] for month in sorted(months)],
+        'closing_balance': balance,
+    }
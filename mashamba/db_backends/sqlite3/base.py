@@ -0,0 +1,48 @@
+"""SQLite backend with the two connection options Django 5.1 adds.
+
+``OPTIONS['init_command']`` is run on every new connection (the pragmas in
+settings.py) and ``OPTIONS['transaction_mode']`` is how ``atomic()`` begins
+its transactions. With IMMEDIATE a transaction takes the write lock when it
+starts, so concurrent writers queue for up to ``busy_timeout``. Under the
+default DEFERRED, a transaction that reads before writing (as the daily milk
+summary refresh does) fails at once with "database is locked" if another
+writer got there first, and the busy timeout never applies.
+
+On Django 5.1 this backend can be swapped for the stock one with the same
+OPTIONS.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    init_command = None
+    transaction_mode = None
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.init_command = kwargs.pop('init_command', None)
+        transaction_mode = kwargs.pop('transaction_mode', None)
+        if transaction_mode is not None:
+            transaction_mode = transaction_mode.upper()
+            if transaction_mode not in TRANSACTION_MODES:
+                raise ImproperlyConfigured(
+                    f"settings.DATABASES['{self.alias}']['OPTIONS']['transaction_mode'] "
+                    f"must be one of {', '.join(TRANSACTION_MODES)}."
+                )
+        self.transaction_mode = transaction_mode
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for statement in (self.init_command or '').split(';'):
+            if statement.strip():
+                conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        # Connect first: the mode is read from OPTIONS when connecting.
+        cursor = self.cursor()
+        cursor.execute(f'BEGIN {self.transaction_mode}' if self.transaction_mode else 'BEGIN')
@@ -0,0 +1,74 @@
+"""Streaming CSV exports of a farm's records.
+
+Rows are read with QuerySet.iterator() and written through a pseudo-buffer,
+so a multi-year export starts downloading at once and never sits in memory.
+"""
+import csv
+from datetime import datetime
+
+from django.utils import timezone
+
+from .models import Expense, Inventory, MilkingSession, MilkSale, Revenue
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose write() hands the formatted line straight back."""
+
+    def write(self, value):
+        return value
+
+
+class RecordExport:
+    def __init__(self, header, fields, queryset):
+        self.header = header
+        self.fields = fields
+        self.queryset = queryset
+
+    def rows(self, farm):
+        return self.queryset(farm).values_list(*self.fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+EXPORTS = {
+    'milking-sessions': RecordExport(
+        ['cow', 'cow_name', 'milk_yield', 'milking_time'],
+        ['cow__identifier', 'cow__name_or_tag', 'milk_yield', 'milking_time'],
+        lambda farm: MilkingSession.objects.filter(cow__farm=farm).order_by('milking_time', 'id'),
+    ),
+    'milk-sales': RecordExport(
+        ['customer_name', 'milk_amount', 'price_per_litre', 'sale_time'],
+        ['customer_name', 'milk_amount', 'price_per_litre', 'sale_time'],
+        lambda farm: MilkSale.objects.filter(farm=farm).order_by('sale_time', 'id'),
+    ),
+    'expenses': RecordExport(
+        ['name', 'description', 'category', 'cost', 'date'],
+        ['name', 'description', 'category', 'cost', 'date'],
+        lambda farm: Expense.objects.filter(farm=farm).order_by('date', 'id'),
+    ),
+    'revenue': RecordExport(
+        ['name', 'description', 'amount', 'date'],
+        ['name', 'description', 'cost', 'date'],
+        lambda farm: Revenue.objects.filter(farm=farm).order_by('date', 'id'),
+    ),
+    'inventory': RecordExport(
+        ['item_name', 'quantity', 'unit_value', 'description', 'date_acquired'],
+        ['item_name', 'quantity', 'unit_value', 'description', 'date_acquired'],
+        lambda farm: Inventory.objects.filter(farm=farm).order_by('date_acquired', 'id'),
+    ),
+}
+
+
+def _format(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat() if timezone.is_aware(value) else value.isoformat()
+    return '' if value is None else value
+
+
+def stream_csv(farm, kind):
+    """Yield the CSV export of ``kind`` records for ``farm`` line by line."""
+    export = EXPORTS[kind]
+    writer = csv.writer(Echo())
+    yield writer.writerow(export.header)
+    for row in export.rows(farm):
+        yield writer.writerow([_format(value) for value in row])
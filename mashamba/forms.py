@@ -1,6 +1,12 @@
+from datetime import date, timedelta
+
 from django import forms
 from django.contrib.auth.models import User
-from .models import Farm, Cow, MilkingSession, BreedingRecord, CalvingRecord, ProductService, MilkSale
+from django.utils import timezone
+from .models import (
+    Farm, Cow, MilkingSession, BreedingRecord, CalvingRecord, HealthRecord, ProductService, MilkSale, Customer,
+    CustomerPayment,
+)
 
 
 class UserRegistrationForm(forms.ModelForm):
@@ -32,6 +38,19 @@ class CowForm(forms.ModelForm):
         fields = ['name_or_tag', 'breed', 'date_of_birth', 'gender', 'mass']
 
 
+class CowImportForm(CowForm):
+    """CowForm for import rows, which may carry their own identifier.
+
+    Identifier uniqueness is checked once per batch by the importer instead
+    of with one query per row.
+    """
+    class Meta(CowForm.Meta):
+        fields = CowForm.Meta.fields + ['identifier']
+
+    def validate_unique(self):
+        pass
+
+
 class MilkingSessionForm(forms.ModelForm):
     class Meta:
         model = MilkingSession
@@ -45,14 +64,125 @@ class MilkingSessionForm(forms.ModelForm):
         return cow
 
 
+class HerdMilkingSessionForm(MilkingSessionForm):
+    """One row of the herd milking sheet; a blank yield means the cow was not milked."""
+    cow = forms.IntegerField(widget=forms.HiddenInput)
+
+    class Meta(MilkingSessionForm.Meta):
+        fields = ['milk_yield']
+
+    def __init__(self, *args, herd=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.herd = herd or {}
+        self.fields['milk_yield'].required = False
+
+    def clean_cow(self):
+        cow = self.herd.get(self.cleaned_data.get('cow'))
+        if cow is None:
+            raise forms.ValidationError("This cow is not part of the farm's milking herd.")
+        if cow.gender != 'Female':
+            raise forms.ValidationError("Milking sessions can only be added for female cows.")
+        return cow
+
+    def clean_milk_yield(self):
+        milk_yield = self.cleaned_data.get('milk_yield')
+        if milk_yield is not None and milk_yield < 0:
+            raise forms.ValidationError("Milk yield cannot be negative.")
+        return milk_yield
+
+
+HerdMilkingFormSet = forms.formset_factory(HerdMilkingSessionForm, extra=0)
+
+
+class HerdMilkingTimeForm(forms.Form):
+    milking_time = forms.DateTimeField(
+        initial=timezone.now,
+        widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'),
+    )
+
+
 class MilkSaleForm(forms.ModelForm):
+    """A sale to one of the farm's customers, or to a walk-in buyer named in ``customer_name``."""
+
     class Meta:
         model = MilkSale
-        fields = ['customer_name', 'milk_amount', 'sale_time']
+        fields = ['customer', 'customer_name', 'milk_amount', 'sale_time']
         widgets = {
             'sale_time': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
         }
 
+    def __init__(self, *args, farm=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['customer'].queryset = Customer.objects.filter(farm=farm)
+        self.fields['customer_name'].required = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        customer = cleaned_data.get('customer')
+        if customer:
+            cleaned_data['customer_name'] = customer.name
+        elif not cleaned_data.get('customer_name'):
+            raise forms.ValidationError("Choose a customer or enter the buyer's name.")
+        return cleaned_data
+
+    def save(self, commit=True):
+        sale = super().save(commit=False)
+        if sale.customer:
+            sale.price_per_litre = sale.customer.price_per_litre
+        if commit:
+            sale.save()
+        return sale
+
+
+class CustomerForm(forms.ModelForm):
+    class Meta:
+        model = Customer
+        fields = ['name', 'phone_number', 'price_per_litre']
+
+    def __init__(self, *args, farm=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.farm = farm
+
+    def clean_name(self):
+        name = self.cleaned_data.get('name')
+        if Customer.objects.filter(farm=self.farm, name=name).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError("This farm already has a customer with that name.")
+        return name
+
+
+class CustomerPaymentForm(forms.ModelForm):
+    class Meta:
+        model = CustomerPayment
+        fields = ['amount', 'paid_on', 'reference']
+        widgets = {
+            'paid_on': forms.DateInput(attrs={'type': 'date'}),
+        }
+
+    def clean_amount(self):
+        amount = self.cleaned_data.get('amount')
+        if amount is not None and amount <= 0:
+            raise forms.ValidationError("A payment must be more than zero.")
+        return amount
+
+
+class HealthRecordForm(forms.ModelForm):
+    class Meta:
+        model = HealthRecord
+        fields = ['health_issue', 'treatment', 'treatment_date', 'withdrawal_days', 'notes', 'vet_name', 'vet_company']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Imports and older offline clients send no withdrawal period at all.
+        self.fields['withdrawal_days'].required = False
+
+    def clean_withdrawal_days(self):
+        return self.cleaned_data.get('withdrawal_days') or 0
+
+    def save(self, commit=True):
+        # Importers and sync bulk_create the unsaved instances, skipping Model.save().
+        self.instance.set_withdrawal_until()
+        return super().save(commit)
+
 
 class BreedingRecordForm(forms.ModelForm):
     class Meta:
@@ -75,3 +205,62 @@ class CalvingRecordForm(forms.ModelForm):
         if cow.gender != 'Female':
             raise forms.ValidationError("Calving records can only be added for female cows.")
         return cow
+
+
+class DateRangeForm(forms.Form):
+    """GET filter for the milk history pages.
+
+    ``before`` is the keyset cursor: only days strictly older than it are shown.
+    """
+    DEFAULT_DAYS = 30
+
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    before = forms.DateField(required=False, widget=forms.HiddenInput)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Windows and page bounds are worked out by adding days to these, so
+        # keep them clear of the ends of the calendar.
+        earliest, latest = date.min + timedelta(days=self.DEFAULT_DAYS), date.max - timedelta(days=self.DEFAULT_DAYS)
+        for field in ('start', 'end', 'before'):
+            value = cleaned_data.get(field)
+            if value and not earliest <= value <= latest:
+                self.add_error(field, f"Enter a date between {earliest} and {latest}.")
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and start > end:
+            raise forms.ValidationError("The start date must be on or before the end date.")
+        return cleaned_data
+
+    def get_window(self):
+        """Return the (start, end) dates to show, defaulting to the last DEFAULT_DAYS days."""
+        data = self.cleaned_data if self.is_valid() else {}
+        span = timedelta(days=self.DEFAULT_DAYS - 1)
+        start, end = data.get('start'), data.get('end')
+        if end is None:
+            end = start + span if start else timezone.localdate()
+        if start is None:
+            start = end - span
+        return start, end
+
+    def get_cursor(self):
+        return self.cleaned_data.get('before') if self.is_valid() else None
+
+
+class FarmDirectoryForm(forms.Form):
+    """GET filter for the farm directory; every word given must match."""
+    q = forms.CharField(required=False, max_length=100, label='Search')
+    location = forms.CharField(required=False, max_length=100)
+    product = forms.CharField(required=False, max_length=100)
+
+
+class RecordImportForm(forms.Form):
+    KIND_CHOICES = [
+        ('cows', 'Cows'),
+        ('milking-sessions', 'Milking sessions'),
+        ('health-records', 'Health records'),
+        ('breeding-records', 'Breeding records'),
+    ]
+
+    kind = forms.ChoiceField(choices=KIND_CHOICES)
+    file = forms.FileField(help_text='CSV or Excel (.xlsx) with a header row.')
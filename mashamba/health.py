@@ -0,0 +1,54 @@
+"""Treatments and the milk withdrawal periods that come with them.
+
+A treatment with a withdrawal period stores ``withdrawal_until``, the last
+day its cow's milk must not be sold: ``withdrawal_days`` after the treatment
+date, counted in whole days as the time of treatment is not recorded. Both
+lookups below are range scans on the (cow, treatment_date) index.
+"""
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import MAX_WITHDRAWAL_DAYS, HealthRecord
+
+# Treatments this recent count as current even without a withdrawal period.
+TREATMENT_DAYS = 7
+
+
+def withheld_milk(cow='cow_id', day='date'):
+    """True for a daily milk row whose cow was under milk withdrawal on that day.
+
+    ``cow`` and ``day`` name the outer query's cow id and date fields.
+    """
+    return Exists(HealthRecord.objects.filter(
+        cow_id=OuterRef(cow),
+        treatment_date__lte=OuterRef(day),
+        withdrawal_until__gte=OuterRef(day),
+    ))
+
+
+def cows_under_treatment(farm, today=None):
+    """Active cows treated in the last TREATMENT_DAYS days or whose milk is withheld today.
+
+    One entry per cow, cows under withdrawal first: the ``cow``, the last day
+    her milk is withheld (``withdrawal_until``, or None) and the current
+    treatment ``records``, newest first.
+    """
+    today = today or timezone.localdate()
+    # No withdrawal runs longer than MAX_WITHDRAWAL_DAYS, which bounds the range.
+    records = HealthRecord.objects.filter(
+        cow__farm=farm,
+        cow__is_active=True,
+        treatment_date__range=(today - timedelta(days=MAX_WITHDRAWAL_DAYS), today),
+    ).filter(
+        Q(treatment_date__gt=today - timedelta(days=TREATMENT_DAYS)) | Q(withdrawal_until__gte=today),
+    ).select_related('cow').order_by('-treatment_date', '-id')
+
+    cows = {}
+    for record in records:
+        entry = cows.setdefault(record.cow_id, {'cow': record.cow, 'withdrawal_until': None, 'records': []})
+        entry['records'].append(record)
+        if record.withdrawal_until and record.withdrawal_until >= today:
+            entry['withdrawal_until'] = max(entry['withdrawal_until'] or today, record.withdrawal_until)
+    return sorted(cows.values(), key=lambda entry: (entry['withdrawal_until'] is None, entry['cow'].name_or_tag))
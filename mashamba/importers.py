@@ -0,0 +1,241 @@
+"""Bulk import of farm records from CSV or Excel files.
+
+Rows are streamed from the file, validated with the app's model forms and
+written with bulk_create in fixed-size batches, so memory stays bounded by
+the batch size rather than the file size.
+"""
+import csv
+import io
+import os
+from itertools import islice
+from zipfile import BadZipFile
+
+from django import forms as django_forms
+from django.db import transaction
+
+from .cache import bump_milk_data_version
+from .forms import BreedingRecordForm, CowImportForm, HealthRecordForm, MilkingSessionForm
+from .models import BreedingRecord, Cow, HealthRecord, MilkingSession, generate_cow_identifier
+from .reproduction import rebuild_reproductive_status
+from .rollups import milking_day, refresh_daily_milk_summaries
+
+IMPORT_BATCH_SIZE = 1000
+# Only the first errors are kept so a badly broken file cannot exhaust memory.
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFileError(Exception):
+    """The uploaded file cannot be read as a table of records."""
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, messages):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, messages))
+
+
+def _normalise_header(name):
+    return str(name or '').strip().lower().replace(' ', '_')
+
+
+def _read_csv(fileobj):
+    if isinstance(fileobj, io.TextIOBase):
+        text = fileobj
+    else:
+        text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    try:
+        try:
+            header = [_normalise_header(name) for name in next(reader)]
+        except StopIteration:
+            return
+        for line, values in enumerate(reader, start=2):
+            if any(value.strip() for value in values):
+                yield line, dict(zip(header, (value.strip() for value in values)))
+    except UnicodeDecodeError:
+        raise ImportFileError("The file is not UTF-8 text. In Excel, save it as 'CSV UTF-8' and upload it again.")
+    except csv.Error as exc:
+        raise ImportFileError(f'Line {reader.line_num} is not valid CSV: {exc}.')
+
+
+def _read_xlsx(fileobj):
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise ImportFileError('Reading .xlsx files requires the openpyxl package; upload a CSV instead.')
+
+    try:
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    except (BadZipFile, InvalidFileException, KeyError):
+        raise ImportFileError('The file is not a readable Excel workbook; save it again as .xlsx or upload a CSV.')
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        try:
+            header = [_normalise_header(name) for name in next(rows)]
+        except StopIteration:
+            return
+        for line, values in enumerate(rows, start=2):
+            if any(value not in (None, '') for value in values):
+                yield line, {key: ('' if value is None else value) for key, value in zip(header, values)}
+    finally:
+        workbook.close()
+
+
+def read_rows(fileobj, filename):
+    """Yield ``(line_number, row_dict)`` for every data row of a CSV or .xlsx file."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        return _read_xlsx(fileobj)
+    if extension in ('.csv', '.txt', ''):
+        return _read_csv(fileobj)
+    raise ImportFileError(f"Unsupported file type '{extension}'; use .csv or .xlsx.")
+
+
+class RecordImporter:
+    """Base importer: validates rows with ``form_class`` and bulk inserts ``model``.
+
+    Rows of cow-owned records name their cow by identifier in a ``cow``
+    column; identifiers are resolved with one query per batch.
+    """
+    model = None
+    form_class = None
+    female_only = False
+
+    def __init__(self, farm, batch_size=IMPORT_BATCH_SIZE):
+        self.farm = farm
+        self.batch_size = batch_size
+
+    def run(self, rows):
+        result = ImportResult()
+        rows = iter(rows)
+        with transaction.atomic():
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                objects = self.build_batch(batch, result)
+                self.save_batch(objects)
+                result.created += len(objects)
+            self.finish()
+        return result
+
+    def build_batch(self, batch, result):
+        cows = self.resolve_cows(row.get('cow', '') for _, row in batch)
+        objects = []
+        for line, row in batch:
+            cow = cows.get(str(row.get('cow', '')).strip())
+            if cow is None:
+                result.add_error(line, [f"No cow with identifier '{row.get('cow', '')}' on this farm."])
+                continue
+            if self.female_only and cow.gender != 'Female':
+                result.add_error(line, [f"{self.model._meta.verbose_name.capitalize()}s can only be added for female cows."])
+                continue
+            form = self.form_class(row)
+            if not form.is_valid():
+                result.add_error(line, _form_messages(form))
+                continue
+            instance = form.save(commit=False)
+            instance.cow = cow
+            objects.append(instance)
+        return objects
+
+    def resolve_cows(self, identifiers):
+        identifiers = {str(identifier).strip() for identifier in identifiers if identifier}
+        cows = Cow.objects.filter(farm=self.farm, identifier__in=identifiers).only('id', 'identifier', 'gender')
+        return {cow.identifier: cow for cow in cows}
+
+    def save_batch(self, objects):
+        self.model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def finish(self):
+        pass
+
+
+class MilkingSessionImporter(RecordImporter):
+    model = MilkingSession
+    form_class = MilkingSessionForm
+    female_only = True
+
+    def __init__(self, farm, batch_size=IMPORT_BATCH_SIZE):
+        super().__init__(farm, batch_size=batch_size)
+        self.summary_keys = set()
+
+    def save_batch(self, objects):
+        super().save_batch(objects)
+        self.summary_keys.update((session.cow_id, milking_day(session.milking_time)) for session in objects)
+
+    def finish(self):
+        # Only the cow days the file touched, once for the whole file.
+        refresh_daily_milk_summaries(self.summary_keys)
+        bump_milk_data_version(self.farm.id)
+
+
+class HealthRecordImporter(RecordImporter):
+    model = HealthRecord
+    form_class = HealthRecordForm
+
+
+class BreedingRecordImporter(RecordImporter):
+    model = BreedingRecord
+    form_class = django_forms.modelform_factory(BreedingRecord, form=BreedingRecordForm, exclude=['cow'])
+    female_only = True
+
+    def finish(self):
+        rebuild_reproductive_status(farm=self.farm)
+
+
+class CowImporter(RecordImporter):
+    model = Cow
+    form_class = CowImportForm
+
+    def build_batch(self, batch, result):
+        identifiers = {str(row.get('identifier', '')).strip() for _, row in batch} - {''}
+        taken = set(Cow.objects.filter(identifier__in=identifiers).values_list('identifier', flat=True))
+        objects = []
+        for line, row in batch:
+            form = self.form_class(row)
+            if not form.is_valid():
+                result.add_error(line, _form_messages(form))
+                continue
+            cow = form.save(commit=False)
+            if cow.identifier in taken:
+                result.add_error(line, [f"A cow with identifier '{cow.identifier}' already exists."])
+                continue
+            if not cow.identifier:
+                cow.identifier = generate_cow_identifier()
+            taken.add(cow.identifier)
+            cow.farm = self.farm
+            objects.append(cow)
+        return objects
+
+
+IMPORTERS = {
+    'cows': CowImporter,
+    'milking-sessions': MilkingSessionImporter,
+    'health-records': HealthRecordImporter,
+    'breeding-records': BreedingRecordImporter,
+}
+
+
+def import_records(farm, kind, fileobj, filename, batch_size=IMPORT_BATCH_SIZE):
+    """Import one file of ``kind`` records into ``farm`` and return an ImportResult."""
+    try:
+        importer_class = IMPORTERS[kind]
+    except KeyError:
+        raise ImportFileError(f"Unknown record type '{kind}'.")
+    return importer_class(farm, batch_size=batch_size).run(read_rows(fileobj, filename))
+
+
+def _form_messages(form):
+    return [
+        f'{field}: {message}' if field != '__all__' else message
+        for field, messages in form.errors.items()
+        for message in messages
+    ]
@@ -0,0 +1,187 @@
+"""Monthly ledger of each farm's books, and the profit and loss report built on it.
+
+LedgerMonth holds one row per farm, month, kind of entry and (for expenses)
+category. When a revenue, expense, inventory or milk sale row is written,
+the month it falls in is re-aggregated from its source rows. The P&L report
+then reads a few rows per month instead of every line of the books.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DateField, DateTimeField, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import ExtractYear, Trunc
+from django.utils import timezone
+
+from .models import Expense, Inventory, LedgerMonth, MilkSale, Revenue
+from .rollups import day_start
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+class LedgerSource:
+    def __init__(self, model, date_field, amount, category=None):
+        self.model = model
+        self.date_field = date_field
+        self.amount = amount
+        self.category = category
+
+    @property
+    def timestamped(self):
+        return isinstance(self.model._meta.get_field(self.date_field), DateTimeField)
+
+
+LEDGER_SOURCES = {
+    'revenue': LedgerSource(Revenue, 'date', F('cost')),
+    'expense': LedgerSource(Expense, 'date', F('cost'), category='category'),
+    'inventory': LedgerSource(
+        Inventory, 'date_acquired', ExpressionWrapper(F('quantity') * F('unit_value'), output_field=MONEY),
+    ),
+    'milk_sales': LedgerSource(MilkSale, 'sale_time', F('milk_amount')),
+}
+LEDGER_KINDS = {source.model: kind for kind, source in LEDGER_SOURCES.items()}
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return month_start(month + timedelta(days=31))
+
+
+def ledger_key(kind, farm_id, day):
+    """The (kind, farm_id, month) LedgerMonth rows a source row dated ``day`` is counted in."""
+    if isinstance(day, datetime):
+        day = timezone.localdate(day)
+    return (kind, farm_id, month_start(day))
+
+
+def instance_ledger_key(instance):
+    kind = LEDGER_KINDS[type(instance)]
+    source = LEDGER_SOURCES[kind]
+    # to_python, as the field may still hold the string it was assigned.
+    day = source.model._meta.get_field(source.date_field).to_python(getattr(instance, source.date_field))
+    return ledger_key(kind, instance.farm_id, day)
+
+
+def month_filter(source, month):
+    if source.timestamped:
+        # Months follow the farm's local calendar, as milking days do.
+        start, end = day_start(month), day_start(next_month(month))
+    else:
+        start, end = month, next_month(month)
+    return {f'{source.date_field}__gte': start, f'{source.date_field}__lt': end}
+
+
+def _ledger_rows(kind, queryset):
+    """LedgerMonth rows for ``queryset`` of the ``kind`` source, one per farm, month and category."""
+    source = LEDGER_SOURCES[kind]
+    group_by = ['farm_id', 'ledger_month']
+    if source.category:
+        group_by.append(source.category)
+    rows = queryset.annotate(
+        ledger_month=Trunc(source.date_field, 'month', output_field=DateField()),
+    ).values(*group_by).annotate(amount=Sum(source.amount, output_field=MONEY), entries=Count('pk')).order_by()
+    return [
+        LedgerMonth(
+            farm_id=row['farm_id'],
+            month=row['ledger_month'],
+            kind=kind,
+            category=row[source.category] if source.category else '',
+            amount=row['amount'],
+            entries=row['entries'],
+        )
+        for row in rows.iterator()
+    ]
+
+
+def refresh_ledger(keys):
+    """Recompute the LedgerMonth rows for each (kind, farm_id, month) in ``keys``."""
+    with transaction.atomic():
+        for kind, farm_id, month in set(keys):
+            source = LEDGER_SOURCES[kind]
+            entries = source.model.objects.filter(farm_id=farm_id, **month_filter(source, month))
+            LedgerMonth.objects.filter(kind=kind, farm_id=farm_id, month=month).delete()
+            LedgerMonth.objects.bulk_create(_ledger_rows(kind, entries))
+
+
+def rebuild_ledger(farm=None):
+    """Throw away and regenerate the ledger (or one farm's share of it).
+
+    Returns the number of rows written.
+    """
+    written = 0
+    with transaction.atomic():
+        for kind, source in LEDGER_SOURCES.items():
+            entries = source.model.objects.all()
+            rows = LedgerMonth.objects.filter(kind=kind)
+            if farm is not None:
+                entries = entries.filter(farm=farm)
+                rows = rows.filter(farm=farm)
+            rows.delete()
+            written += len(LedgerMonth.objects.bulk_create(_ledger_rows(kind, entries), batch_size=1000))
+    return written
+
+
+def farm_profit_and_loss(farm, year):
+    """Yearly totals for every year on record and a monthly breakdown of ``year``.
+
+    Each period has ``revenue``, ``expenses``, ``net``, ``margin`` (net as a
+    percentage of revenue), ``milk_sold`` in litres and ``inventory_value``,
+    the value of all inventory acquired up to the period's end. ``categories``
+    is ``year``'s expenses by category, largest first.
+    """
+    ledger = LedgerMonth.objects.filter(farm=farm)
+
+    yearly = defaultdict(_period)
+    for row in ledger.annotate(year=ExtractYear('month')).values('year', 'kind').annotate(
+        amount=Sum('amount'),
+    ).order_by('year'):
+        yearly[row['year']][row['kind']] += row['amount']
+
+    monthly = defaultdict(_period)
+    categories = defaultdict(Decimal)
+    for row in ledger.filter(month__range=(date(year, 1, 1), date(year, 12, 1))).values(
+        'month', 'kind', 'category', 'amount',
+    ):
+        monthly[row['month']][row['kind']] += row['amount']
+        if row['kind'] == 'expense':
+            categories[row['category'] or 'Uncategorised'] += row['amount']
+
+    # Inventory is valued cumulatively: everything acquired up to the period's end.
+    years, inventory_value = [], Decimal('0')
+    for period_year in sorted(yearly):
+        inventory_value += yearly[period_year]['inventory']
+        years.append(_figures(period_year, yearly[period_year], inventory_value))
+
+    months = []
+    inventory_value = sum((totals['inventory'] for key, totals in yearly.items() if key < year), Decimal('0'))
+    for month in sorted(monthly):
+        inventory_value += monthly[month]['inventory']
+        months.append(_figures(month, monthly[month], inventory_value))
+
+    return {
+        'years': years,
+        'months': months,
+        'categories': sorted(categories.items(), key=lambda item: item[1], reverse=True),
+    }
+
+
+def _period():
+    return defaultdict(Decimal)
+
+
+def _figures(period, totals, inventory_value):
+    revenue, expenses = totals['revenue'], totals['expense']
+    net = revenue - expenses
+    return {
+        'period': period,
+        'revenue': revenue,
+        'expenses': expenses,
+        'net': net,
+        'margin': round(net / revenue * 100, 1) if revenue else None,
+        'milk_sold': totals['milk_sales'],
+        'inventory_value': inventory_value,
+    }
@@ -0,0 +1,67 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from mashamba.forms import DateRangeForm
+from mashamba.reports import group_herd_rows
+
+
+class Command(BaseCommand):
+    help = 'Time building and rendering the all-cows milk table for a synthetic herd history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=3 * 365)
+        parser.add_argument('--cows', type=int, default=300)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rows = self.synthetic_rows(options['days'], options['cows'], random.Random(options['seed']))
+        end = timezone.localdate()
+        context = {
+            'farm': None,
+            'filter_form': DateRangeForm(),
+            'start': end - timedelta(days=options['days'] - 1),
+            'end': end,
+            'page': None,
+        }
+
+        build_times, render_times = [], []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            days = group_herd_rows(rows)
+            built = time.perf_counter()
+            html = render_to_string('mashamba/dairyfarm/all_cows_milk.html', {**context, 'days': days})
+            rendered = time.perf_counter()
+            build_times.append(built - started)
+            render_times.append(rendered - built)
+
+        self.stdout.write(
+            f"{len(rows)} rows ({options['days']} days x {options['cows']} cows), {len(html)} bytes of HTML\n"
+            f"build:  median {statistics.median(build_times):.3f}s\n"
+            f"render: median {statistics.median(render_times):.3f}s"
+        )
+
+    def synthetic_rows(self, day_count, cow_count, rng):
+        """Rows shaped like the herd_daily_milk query's output, newest day first."""
+        today = timezone.localdate()
+        names = sorted(f'Cow {n:04d}' for n in range(cow_count))
+        rows = []
+        for offset in range(day_count):
+            date = today - timedelta(days=offset)
+            yields = [Decimal(rng.randint(300, 2500)) / 100 for _ in names]
+            day_total = sum(yields)
+            for name, total_yield in zip(names, yields):
+                rows.append({
+                    'date': date,
+                    'cow__name_or_tag': name,
+                    'total_yield': total_yield,
+                    'day_total': day_total,
+                })
+        return rows
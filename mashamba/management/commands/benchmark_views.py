@@ -0,0 +1,206 @@
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from mashamba import urls as mashamba_urls
+from mashamba.exports import EXPORTS
+from mashamba.models import Cow, Farm
+from mashamba.synthetic import SyntheticFarmGenerator
+
+# Views that change data on GET run last so they cannot skew the others.
+MUTATING_VIEWS = {'archive_cow'}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every mashamba URL through the test client and report latency percentiles, '
+        'query counts and peak memory per view as JSON. By default a throwaway test database '
+        'is created and filled with seeded synthetic data, so runs on different commits compare '
+        'like with like.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farms', type=int, default=1)
+        parser.add_argument('--cows', type=int, default=100)
+        parser.add_argument('--years', type=int, default=2)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per view after the first.')
+        parser.add_argument('--existing-farm', metavar='SLUG',
+                            help='Benchmark this farm in the configured database instead of seeding a test one. '
+                                 'Views in MUTATING_VIEWS are skipped.')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+        parser.add_argument('--compare', metavar='REPORT', help='Print per-view changes against an earlier report.')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1.')
+
+        if options['existing_farm']:
+            try:
+                farm = Farm.objects.get(slug=options['existing_farm'])
+            except Farm.DoesNotExist:
+                raise CommandError(f"No farm with slug '{options['existing_farm']}'.")
+            report = self.benchmark(farm, options, skip=MUTATING_VIEWS)
+        else:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                generator = SyntheticFarmGenerator(seed=options['seed'], years=options['years'], cows=options['cows'])
+                farm = generator.generate(options['farms'])[0]
+                report = self.benchmark(farm, options)
+                report['meta']['dataset'] = generator.counts
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2, default=str)
+        if options['output']:
+            with open(options['output'], 'w') as fileobj:
+                fileobj.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as fileobj:
+                self.compare(json.load(fileobj), report)
+
+    def targets(self, farm):
+        """Yield ``(label, pattern, url)`` for every mashamba URL pattern, filled in for ``farm``."""
+        cow = Cow.objects.filter(farm=farm, gender='Female', is_active=True).order_by('id').first()
+        customer = farm.customers.order_by('id').first()
+        patterns = [p for p in mashamba_urls.urlpatterns if isinstance(p, URLPattern) and p.name]
+        patterns.sort(key=lambda p: p.name in MUTATING_VIEWS)
+        for pattern in patterns:
+            converters = pattern.pattern.converters
+            kwargs = {}
+            if 'slug' in converters:
+                kwargs['slug'] = farm.slug
+            if 'cow_id' in converters:
+                kwargs['cow_id'] = cow.id
+            if 'customer_id' in converters:
+                if customer is None:
+                    continue
+                kwargs['customer_id'] = customer.id
+            name = f'{mashamba_urls.app_name}:{pattern.name}'
+            if 'kind' in converters:
+                for kind in EXPORTS:
+                    yield f'{name}[{kind}]', pattern, reverse(name, kwargs={**kwargs, 'kind': kind})
+            else:
+                yield name, pattern, reverse(name, kwargs=kwargs)
+
+    @override_settings(DEBUG=False)
+    def benchmark(self, farm, options, skip=()):
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost')
+        client.force_login(farm.manager)
+
+        views = []
+        for name, pattern, url in self.targets(farm):
+            if pattern.name in skip:
+                views.append({'name': name, 'url': url, 'skipped': 'changes data on GET'})
+                continue
+
+            # Cold: empty report cache, queries captured.
+            cache.clear()
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                status = self.fetch(client, url)
+                cold = time.perf_counter() - started
+            # captured_queries reads connection.queries lazily, so count now.
+            cold_queries = len(queries)
+
+            # Warm: what a returning user sees.
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                self.fetch(client, url)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+
+            reset_queries()
+            with CaptureQueriesContext(connection) as warm_queries:
+                tracemalloc.start()
+                self.fetch(client, url)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            warm_queries = len(warm_queries)
+
+            views.append({
+                'name': name,
+                'url': url,
+                'status': status,
+                'queries_cold': cold_queries,
+                'queries_warm': warm_queries,
+                'query_budget': getattr(pattern.callback, 'query_budget', None),
+                'cold_ms': round(cold * 1000, 3),
+                'p50_ms': round(percentile(timings, 50) * 1000, 3),
+                'p90_ms': round(percentile(timings, 90) * 1000, 3),
+                'p99_ms': round(percentile(timings, 99) * 1000, 3),
+                'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+                'peak_memory_kib': round(peak / 1024, 1),
+            })
+            self.stderr.write(f'{name}: p50 {views[-1]["p50_ms"]} ms, {cold_queries} queries')
+
+        return {
+            'meta': {
+                'commit': self.git_commit(),
+                'created': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'repeat': options['repeat'],
+                'seed': None if options['existing_farm'] else options['seed'],
+                'farm': farm.slug,
+            },
+            'views': views,
+        }
+
+    def fetch(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            # Streaming responses do their work while being consumed.
+            for _ in response.streaming_content:
+                pass
+        return response.status_code
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, baseline, report):
+        previous = {view['name']: view for view in baseline.get('views', []) if 'p50_ms' in view}
+        meta = baseline.get('meta', {})
+        self.stderr.write(f"\nagainst {meta.get('commit') or meta.get('created')}:")
+        for view in report['views']:
+            before = previous.get(view['name'])
+            if 'p50_ms' not in view or before is None:
+                continue
+            change = (view['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+            queries = view['queries_cold'] - before['queries_cold']
+            self.stderr.write(
+                f"{view['name']:<45} p50 {before['p50_ms']:>9.2f} -> {view['p50_ms']:>9.2f} ms "
+                f"({change:+6.1f}%)  queries {queries:+d}"
+            )
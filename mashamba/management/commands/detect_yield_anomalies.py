@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from mashamba.anomalies import SCAN_BATCH_SIZE, reset_yield_scan, scan_milking_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        'Score milking sessions recorded since the last run against each cow\'s rolling baseline '
+        'and store unusual drops and spikes. Safe to schedule (e.g. hourly from cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SCAN_BATCH_SIZE)
+        parser.add_argument('--rescan', action='store_true',
+                            help='Forget baselines, anomalies and the high-water mark, then scan all sessions.')
+
+    def handle(self, *args, **options):
+        if options['rescan']:
+            reset_yield_scan()
+        scanned, flagged = scan_milking_sessions(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Scanned {scanned} milking sessions; flagged {flagged}.'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mashamba.importers import IMPORT_BATCH_SIZE, IMPORTERS, ImportFileError, import_records
+from mashamba.models import Farm
+
+
+class Command(BaseCommand):
+    help = 'Import cows, milking sessions, health or breeding records from a CSV or .xlsx file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('farm', help='Slug of the farm the records belong to.')
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help='CSV or .xlsx file with a header row.')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            farm = Farm.objects.get(slug=options['farm'])
+        except Farm.DoesNotExist:
+            raise CommandError(f"No farm with slug '{options['farm']}'.")
+
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = import_records(
+                    farm, options['kind'], fileobj, options['path'], batch_size=options['batch_size']
+                )
+        except (OSError, ImportFileError) as exc:
+            raise CommandError(str(exc))
+
+        for line, messages in result.errors:
+            self.stderr.write(f"line {line}: {'; '.join(messages)}")
+        if result.error_count > len(result.errors):
+            self.stderr.write(f'... and {result.error_count - len(result.errors)} more errors')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} {options["kind"]}; {result.error_count} rows rejected.'
+        ))
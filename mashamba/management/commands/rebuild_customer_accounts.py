@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mashamba.customers import rebuild_customer_accounts
+from mashamba.models import Farm
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly customer accounts from milk sale and customer payment records.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farm', help='Only rebuild the customers of the farm with this slug.')
+
+    def handle(self, *args, **options):
+        farm = None
+        if options['farm']:
+            try:
+                farm = Farm.objects.get(slug=options['farm'])
+            except Farm.DoesNotExist:
+                raise CommandError(f"No farm with slug '{options['farm']}'.")
+
+        written = rebuild_customer_accounts(farm=farm)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} customer account rows.'))
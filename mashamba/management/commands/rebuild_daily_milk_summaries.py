@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mashamba.models import Farm
+from mashamba.rollups import rebuild_daily_milk_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-cow daily milk summaries from raw milking sessions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farm', help='Only rebuild the farm with this slug.')
+
+    def handle(self, *args, **options):
+        farm = None
+        if options['farm']:
+            try:
+                farm = Farm.objects.get(slug=options['farm'])
+            except Farm.DoesNotExist:
+                raise CommandError(f"No farm with slug '{options['farm']}'.")
+
+        written = rebuild_daily_milk_summaries(farm=farm)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily milk summaries.'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mashamba.ledger import rebuild_ledger
+from mashamba.models import Farm
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly ledger from revenue, expense, inventory and milk sale records.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farm', help='Only rebuild the farm with this slug.')
+
+    def handle(self, *args, **options):
+        farm = None
+        if options['farm']:
+            try:
+                farm = Farm.objects.get(slug=options['farm'])
+            except Farm.DoesNotExist:
+                raise CommandError(f"No farm with slug '{options['farm']}'.")
+
+        written = rebuild_ledger(farm=farm)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} ledger rows.'))
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from mashamba.models import Farm
+from mashamba.synthetic import SyntheticFarmGenerator
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with seeded synthetic farms, herds and several years of records.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farms', type=int, default=1)
+        parser.add_argument('--cows', type=int, default=50, help='Cows per farm.')
+        parser.add_argument('--years', type=int, default=2, help='Years of history, ending today.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='Synthetic Farm', help='Farms are named "<prefix> 1", "<prefix> 2", ...')
+        parser.add_argument('--manager', help='Username of the manager; defaults to a "synthetic-manager" user.')
+
+    def handle(self, *args, **options):
+        manager = None
+        if options['manager']:
+            try:
+                manager = User.objects.get(username=options['manager'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named '{options['manager']}'.")
+
+        names = [f"{options['prefix']} {i + 1}" for i in range(options['farms'])]
+        if Farm.objects.filter(name__in=names).exists():
+            raise CommandError(f"Farms named '{options['prefix']} N' already exist; pass a different --prefix.")
+
+        generator = SyntheticFarmGenerator(
+            seed=options['seed'], years=options['years'], cows=options['cows'],
+            prefix=options['prefix'], manager=manager,
+        )
+        farms = generator.generate(options['farms'])
+
+        for name, number in sorted(generator.counts.items()):
+            self.stdout.write(f'{name}: {number}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(farms)} farms: {', '.join(farm.slug for farm in farms)}"
+        ))
@@ -0,0 +1,146 @@
+"""Per-request query, SQL-time and render-time instrumentation.
+
+Queries are counted by an execute wrapper installed on every database
+connection, so the numbers are available with DEBUG off. The wrapper finds
+the request through a context variable, which asgiref carries into the
+thread async views run their queries in. Template time is reported by the
+backend in template_backends.py. Each response carries the figures in a
+Server-Timing header and one JSON line is logged to ``mashamba.requests``.
+"""
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('mashamba.requests')
+
+_current_metrics = ContextVar('mashamba_request_metrics', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """A view ran more queries than its declared budget."""
+
+
+def query_budget(max_queries):
+    """Declare the most queries a view may run, session and user lookups included.
+
+    Going over is logged as a warning; with ``QUERY_BUDGETS_ENFORCED`` on
+    (as the test runner sets it) the request fails with QueryBudgetExceeded.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.query_budget = None
+        self.view_name = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - started
+
+
+def current_metrics():
+    """The RequestMetrics of the request being handled, or None."""
+    return _current_metrics.get()
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestMetricsMiddleware:
+    """Goes first in MIDDLEWARE so session and auth queries are counted too.
+
+    It runs natively under both WSGI and ASGI, so async views are not pushed
+    back onto a thread per request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        total_time = time.perf_counter() - metrics.started
+        match = request.resolver_match
+        if match is not None:
+            metrics.view_name = match.view_name
+            metrics.query_budget = getattr(match.func, 'query_budget', None)
+
+        # Streaming bodies are produced after this point and are not included.
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries"',
+            f'tpl;dur={metrics.template_time * 1000:.1f}',
+            f'total;dur={total_time * 1000:.1f}',
+        ])
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': metrics.view_name,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'query_budget': metrics.query_budget,
+            'sql_ms': round(metrics.sql_time * 1000, 1),
+            'template_ms': round(metrics.template_time * 1000, 1),
+            'total_ms': round(total_time * 1000, 1),
+        }
+        logger.info(json.dumps(record), extra={'metrics': record})
+
+        if metrics.query_budget is not None and metrics.queries > metrics.query_budget:
+            message = (
+                f'{metrics.view_name} ran {metrics.queries} queries, '
+                f'over its budget of {metrics.query_budget}'
+            )
+            if getattr(settings, 'QUERY_BUDGETS_ENFORCED', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message, extra={'metrics': record})
+        return response
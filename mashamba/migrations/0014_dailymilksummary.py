@@ -0,0 +1,56 @@
+# Generated by Django 4.2.13 on 2026-10-18 09:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_daily_milk_summaries(apps, schema_editor):
+    MilkingSession = apps.get_model('mashamba', 'MilkingSession')
+    DailyMilkSummary = apps.get_model('mashamba', 'DailyMilkSummary')
+
+    rows = MilkingSession.objects.values('cow_id', 'cow__farm_id', 'milking_time__date').annotate(
+        total_yield=models.Sum('milk_yield'), session_count=models.Count('id')
+    ).order_by()
+    DailyMilkSummary.objects.bulk_create(
+        (
+            DailyMilkSummary(
+                cow_id=row['cow_id'],
+                farm_id=row['cow__farm_id'],
+                date=row['milking_time__date'],
+                total_yield=row['total_yield'],
+                session_count=row['session_count'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mashamba', '0013_remove_milksale_farm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMilkSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_yield', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('session_count', models.PositiveSmallIntegerField(default=0)),
+                ('cow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_milk_summaries', to='mashamba.cow')),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_milk_summaries', to='mashamba.farm')),
+            ],
+            options={
+                'verbose_name_plural': 'daily milk summaries',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailymilksummary',
+            constraint=models.UniqueConstraint(fields=('cow', 'date'), name='unique_daily_milk_summary'),
+        ),
+        migrations.RunPython(backfill_daily_milk_summaries, migrations.RunPython.noop),
+    ]
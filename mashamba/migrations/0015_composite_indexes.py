@@ -0,0 +1,29 @@
+# Generated by Django 4.2.13 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mashamba', '0014_dailymilksummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cow',
+            index=models.Index(fields=['farm', 'is_active', 'id'], name='mashamba_co_farm_id_db9ef5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailymilksummary',
+            index=models.Index(fields=['farm', 'date'], name='mashamba_da_farm_id_0b1d31_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='milkingsession',
+            index=models.Index(fields=['cow', 'milking_time'], name='mashamba_mi_cow_id_5b0b40_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='milksale',
+            index=models.Index(fields=['sale_time'], name='mashamba_mi_sale_ti_4a5bfa_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.13 on 2026-10-18 09:24
+
+from django.db import migrations, models
+import mashamba.models
+import secrets
+
+
+def fill_blank_identifiers(apps, schema_editor):
+    # Cows saved before the default existed keep their Cow-<pk> identifiers;
+    # only rows left blank by an interrupted two-step save need one.
+    Cow = apps.get_model('mashamba', 'Cow')
+    blank = list(Cow.objects.filter(identifier=''))
+    for cow in blank:
+        cow.identifier = f'Cow-{secrets.token_hex(8).upper()}'
+    Cow.objects.bulk_update(blank, ['identifier'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mashamba', '0015_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cow',
+            name='identifier',
+            field=models.CharField(blank=True, default=mashamba.models.generate_cow_identifier, max_length=100, unique=True),
+        ),
+        migrations.RunPython(fill_blank_identifiers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.13 on 2026-10-18 09:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mashamba', '0016_cow_identifier_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YieldBaseline',
+            fields=[
+                ('cow', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='yield_baseline', serialize=False, to='mashamba.cow')),
+                ('mean', models.FloatField(default=0)),
+                ('variance', models.FloatField(default=0)),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('last_milking_time', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='YieldScanState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_session_id', models.BigIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='YieldAnomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('drop', 'Sudden drop'), ('spike', 'Unlikely spike')], max_length=10)),
+                ('milking_time', models.DateTimeField()),
+                ('milk_yield', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('expected_yield', models.FloatField()),
+                ('z_score', models.FloatField()),
+                ('detected', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='yield_anomalies', to='mashamba.cow')),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='yield_anomalies', to='mashamba.farm')),
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='yield_anomaly', to='mashamba.milkingsession')),
+            ],
+            options={
+                'verbose_name_plural': 'yield anomalies',
+                'ordering': ['-milking_time'],
+                'indexes': [models.Index(fields=['farm', 'milking_time'], name='mashamba_yi_farm_id_bda422_idx'), models.Index(fields=['cow', 'milking_time'], name='mashamba_yi_cow_id_a5a64c_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.13 on 2026-10-18 09:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+
+def _words(text):
+    return {word[:50] for word in re.findall(r'\w+', text.casefold())}
+
+
+def index_existing_farms(apps, schema_editor):
+    Farm = apps.get_model('mashamba', 'Farm')
+    ProductService = apps.get_model('mashamba', 'ProductService')
+    FarmSearchToken = apps.get_model('mashamba', 'FarmSearchToken')
+
+    rows = set()
+    for farm_id, name, location in Farm.objects.values_list('id', 'name', 'location').iterator():
+        rows.update((farm_id, 'name', word) for word in _words(name))
+        rows.update((farm_id, 'location', word) for word in _words(location))
+    for farm_id, name in ProductService.objects.values_list('farm_id', 'name').iterator():
+        rows.update((farm_id, 'product', word) for word in _words(name))
+    FarmSearchToken.objects.bulk_create(
+        (FarmSearchToken(farm_id=farm_id, field=field, token=token) for farm_id, field, token in rows),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mashamba', '0018_sync_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FarmSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('name', 'Name'), ('location', 'Location'), ('product', 'Product')], max_length=10)),
+                ('token', models.CharField(max_length=50)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='farm',
+            index=models.Index(condition=models.Q(('active', True), ('verified', True)), fields=['name'], name='farm_directory_idx'),
+        ),
+        migrations.AddField(
+            model_name='farmsearchtoken',
+            name='farm',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='mashamba.farm'),
+        ),
+        migrations.AddIndex(
+            model_name='farmsearchtoken',
+            index=models.Index(fields=['token', 'field', 'farm'], name='mashamba_fa_token_c9a5ea_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='farmsearchtoken',
+            constraint=models.UniqueConstraint(fields=('farm', 'field', 'token'), name='unique_farm_search_token'),
+        ),
+        migrations.RunPython(index_existing_farms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2.13 on 2026-10-18 09:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import Trunc
+
+
+def backfill_ledger(apps, schema_editor):
+    LedgerMonth = apps.get_model('mashamba', 'LedgerMonth')
+    money = models.DecimalField(max_digits=14, decimal_places=2)
+    sources = [
+        ('revenue', apps.get_model('mashamba', 'Revenue'), 'date', models.F('cost'), None),
+        ('expense', apps.get_model('mashamba', 'Expense'), 'date', models.F('cost'), 'category'),
+        ('inventory', apps.get_model('mashamba', 'Inventory'), 'date_acquired',
+         models.ExpressionWrapper(models.F('quantity') * models.F('unit_value'), output_field=money), None),
+        ('milk_sales', apps.get_model('mashamba', 'MilkSale'), 'sale_time', models.F('milk_amount'), None),
+    ]
+    for kind, model, date_field, amount, category in sources:
+        group_by = ['ledger_month'] + (['farm_id'] if kind != 'milk_sales' else []) + ([category] if category else [])
+        rows = model.objects.annotate(
+            ledger_month=Trunc(date_field, 'month', output_field=models.DateField()),
+        ).values(*group_by).annotate(amount=models.Sum(amount, output_field=money), entries=models.Count('pk')).order_by()
+        LedgerMonth.objects.bulk_create(
+            (
+                LedgerMonth(
+                    farm_id=row.get('farm_id'), month=row['ledger_month'], kind=kind,
+                    category=row[category] if category else '', amount=row['amount'], entries=row['entries'],
+                )
+                for row in rows.iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mashamba', '0019_farm_search_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('kind', models.CharField(choices=[('revenue', 'Revenue'), ('expense', 'Expense'), ('inventory', 'Inventory acquired'), ('milk_sales', 'Milk sold')], max_length=10)),
+                ('category', models.CharField(blank=True, max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('entries', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['month'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['farm', 'date'], name='mashamba_ex_farm_id_f052ef_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['farm', 'date_acquired'], name='mashamba_in_farm_id_c8685e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='revenue',
+            index=models.Index(fields=['farm', 'date'], name='mashamba_re_farm_id_43ad92_idx'),
+        ),
+        migrations.AddField(
+            model_name='ledgermonth',
+            name='farm',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_months', to='mashamba.farm'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgermonth',
+            index=models.Index(fields=['farm', 'month'], name='mashamba_le_farm_id_1da89c_idx'),
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
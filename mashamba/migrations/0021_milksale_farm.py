@@ -0,0 +1,41 @@
+# Generated by Django 4.2.13 on 2026-10-18 09:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_sales_to_only_farm(apps, schema_editor):
+    # Which farm a sale came from was lost with the old link. With a single
+    # farm it can only be that one; otherwise the sales stay unassigned.
+    Farm = apps.get_model('mashamba', 'Farm')
+    MilkSale = apps.get_model('mashamba', 'MilkSale')
+    LedgerMonth = apps.get_model('mashamba', 'LedgerMonth')
+    farm_ids = list(Farm.objects.values_list('id', flat=True)[:2])
+    if len(farm_ids) != 1:
+        return
+    MilkSale.objects.filter(farm__isnull=True).update(farm_id=farm_ids[0])
+    LedgerMonth.objects.filter(kind='milk_sales', farm__isnull=True).update(farm_id=farm_ids[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mashamba', '0020_ledger_months'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='milksale',
+            name='mashamba_mi_sale_ti_4a5bfa_idx',
+        ),
+        migrations.AddField(
+            model_name='milksale',
+            name='farm',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='milk_sales', to='mashamba.farm'),
+        ),
+        migrations.AddIndex(
+            model_name='milksale',
+            index=models.Index(fields=['farm', 'sale_time'], name='mashamba_mi_farm_id_384fe6_idx'),
+        ),
+        migrations.RunPython(assign_sales_to_only_farm, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 4.2.13 on 2026-10-18 10:01
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db.models.functions import Trunc
+
+
+def create_customers_from_sales(apps, schema_editor):
+    # Each buyer name on a farm's sales becomes a customer. Their price is
+    # unknown, so past deliveries are counted in litres but not billed.
+    Customer = apps.get_model('mashamba', 'Customer')
+    CustomerMonth = apps.get_model('mashamba', 'CustomerMonth')
+    MilkSale = apps.get_model('mashamba', 'MilkSale')
+    buyers = MilkSale.objects.filter(farm__isnull=False).values_list('farm_id', 'customer_name').distinct()
+    Customer.objects.bulk_create(
+        (Customer(farm_id=farm_id, name=name) for farm_id, name in buyers.iterator()),
+        batch_size=1000, ignore_conflicts=True,
+    )
+    MilkSale.objects.filter(farm__isnull=False).update(customer_id=models.Subquery(
+        Customer.objects.filter(farm_id=models.OuterRef('farm_id'), name=models.OuterRef('customer_name')).values('id')[:1]
+    ))
+
+    rows = MilkSale.objects.filter(customer__isnull=False).annotate(
+        account_month=Trunc('sale_time', 'month', output_field=models.DateField()),
+    ).values('customer_id', 'account_month').annotate(
+        litres=models.Sum('milk_amount'), entries=models.Count('pk'),
+    ).order_by()
+    CustomerMonth.objects.bulk_create(
+        (
+            CustomerMonth(
+                customer_id=row['customer_id'], month=row['account_month'], kind='deliveries',
+                litres=row['litres'], amount=0, entries=row['entries'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mashamba', '0021_milksale_farm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Customer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('phone_number', models.CharField(blank=True, max_length=20)),
+                ('price_per_litre', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CustomerMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('kind', models.CharField(choices=[('deliveries', 'Milk delivered'), ('payments', 'Payments received')], max_length=10)),
+                ('litres', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('entries', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CustomerPayment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('paid_on', models.DateField(default=datetime.date.today)),
+                ('reference', models.CharField(blank=True, help_text='Receipt or M-Pesa code', max_length=100)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='milksale',
+            name='price_per_litre',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerpayment',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='mashamba.customer'),
+        ),
+        migrations.AddField(
+            model_name='customermonth',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='account_months', to='mashamba.customer'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='farm',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='customers', to='mashamba.farm'),
+        ),
+        migrations.AddField(
+            model_name='milksale',
+            name='customer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales', to='mashamba.customer'),
+        ),
+        migrations.AddIndex(
+            model_name='milksale',
+            index=models.Index(fields=['customer', 'sale_time'], name='mashamba_mi_custome_55417f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerpayment',
+            index=models.Index(fields=['customer', 'paid_on'], name='mashamba_cu_custome_0fd5fe_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='customermonth',
+            constraint=models.UniqueConstraint(fields=('customer', 'month', 'kind'), name='unique_customer_month'),
+        ),
+        migrations.AddConstraint(
+            model_name='customer',
+            constraint=models.UniqueConstraint(fields=('farm', 'name'), name='unique_customer_name_per_farm'),
+        ),
+        migrations.RunPython(create_customers_from_sales, migrations.RunPython.noop),
+    ]
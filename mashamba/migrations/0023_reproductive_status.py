@@ -0,0 +1,79 @@
+# Generated by Django 4.2.13 on 2026-10-18 10:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import defaultdict
+from datetime import timedelta
+
+GESTATION_DAYS = 283
+
+
+def backfill_reproductive_status(apps, schema_editor):
+    # The same rules as reproduction.reproductive_status, frozen here.
+    BreedingRecord = apps.get_model('mashamba', 'BreedingRecord')
+    CalvingRecord = apps.get_model('mashamba', 'CalvingRecord')
+    Cow = apps.get_model('mashamba', 'Cow')
+    ReproductiveStatus = apps.get_model('mashamba', 'ReproductiveStatus')
+
+    calvings = defaultdict(set)
+    for cow_id, calving_date in CalvingRecord.objects.values_list('cow_id', 'calving_date').iterator():
+        calvings[cow_id].add(calving_date)
+    breedings = defaultdict(list)
+    for cow_id, *breeding in BreedingRecord.objects.order_by('id').values_list(
+        'cow_id', 'expected_calving_date', 'repeat_breeding_date', 'last_calving_date', 'no_of_calving',
+    ).iterator():
+        breedings[cow_id].append(breeding)
+
+    statuses = []
+    for cow_id, farm_id in Cow.objects.filter(id__in=set(calvings) | set(breedings)).values_list('id', 'farm_id'):
+        dates = sorted(calvings[cow_id] | {breeding[2] for breeding in breedings[cow_id] if breeding[2]})
+        last_calving = dates[-1] if dates else None
+        current = None
+        for breeding in breedings[cow_id]:
+            expected, _, calved_before, _ = breeding
+            if (last_calving is None or (expected is None and calved_before == last_calving)
+                    or (expected is not None and last_calving < expected - timedelta(days=GESTATION_DAYS))):
+                current = breeding
+        expected_calving = current[0] if current else None
+        statuses.append(ReproductiveStatus(
+            cow_id=cow_id,
+            farm_id=farm_id,
+            status='bred' if current else 'open',
+            last_calving_date=last_calving,
+            calving_count=max(len(dates), max((breeding[3] or 0 for breeding in breedings[cow_id]), default=0)),
+            calving_interval=(dates[-1] - dates[-2]).days if len(dates) > 1 else None,
+            conception_date=expected_calving - timedelta(days=GESTATION_DAYS) if expected_calving else None,
+            expected_calving_date=expected_calving,
+            repeat_breeding_date=current[1] if current else None,
+        ))
+    ReproductiveStatus.objects.bulk_create(statuses, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mashamba', '0022_customer_accounts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReproductiveStatus',
+            fields=[
+                ('cow', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reproductive_status', serialize=False, to='mashamba.cow')),
+                ('status', models.CharField(choices=[('open', 'Open'), ('bred', 'Bred')], max_length=4)),
+                ('last_calving_date', models.DateField(blank=True, null=True)),
+                ('calving_count', models.PositiveIntegerField(default=0)),
+                ('calving_interval', models.PositiveIntegerField(blank=True, help_text='Days between the last two calvings', null=True)),
+                ('conception_date', models.DateField(blank=True, help_text='Estimated from the expected calving date', null=True)),
+                ('expected_calving_date', models.DateField(blank=True, null=True)),
+                ('repeat_breeding_date', models.DateField(blank=True, null=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reproductive_statuses', to='mashamba.farm')),
+            ],
+            options={
+                'verbose_name_plural': 'reproductive statuses',
+                'indexes': [models.Index(fields=['farm', 'expected_calving_date'], name='mashamba_re_farm_id_317bc0_idx'), models.Index(fields=['farm', 'repeat_breeding_date'], name='mashamba_re_farm_id_944e70_idx'), models.Index(fields=['farm', 'status', 'last_calving_date'], name='mashamba_re_farm_id_0e53f9_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_reproductive_status, migrations.RunPython.noop),
+    ]
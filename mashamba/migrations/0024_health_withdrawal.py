@@ -0,0 +1,28 @@
+# Generated by Django 4.2.13 on 2026-10-18 10:10
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mashamba', '0023_reproductive_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthrecord',
+            name='withdrawal_days',
+            field=models.PositiveIntegerField(default=0, help_text="Days after treatment the cow's milk must not be sold", validators=[django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='healthrecord',
+            name='withdrawal_until',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='healthrecord',
+            index=models.Index(fields=['cow', 'treatment_date'], name='mashamba_he_cow_id_dbe747_idx'),
+        ),
+    ]
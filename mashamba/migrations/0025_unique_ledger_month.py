@@ -0,0 +1,26 @@
+# Generated by Django 4.2.13 on 2026-10-18 10:17
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def drop_duplicate_ledger_months(apps, schema_editor):
+    # Duplicates hold the same re-aggregated figures, so the first of each is kept.
+    LedgerMonth = apps.get_model('mashamba', 'LedgerMonth')
+    keep = LedgerMonth.objects.values('farm', 'month', 'kind', 'category').annotate(keep=Min('id')).values('keep')
+    LedgerMonth.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mashamba', '0024_health_withdrawal'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_ledger_months, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ledgermonth',
+            constraint=models.UniqueConstraint(fields=('farm', 'month', 'kind', 'category'), name='unique_ledger_month'),
+        ),
+    ]
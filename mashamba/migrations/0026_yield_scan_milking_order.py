@@ -0,0 +1,38 @@
+# Generated by Django 4.2.13 on 2026-10-18 10:23
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def mark_scan_by_milking_time(apps, schema_editor):
+    # Everything up to the old id mark was scanned; carry on from the latest
+    # milking time among those sessions.
+    MilkingSession = apps.get_model('mashamba', 'MilkingSession')
+    YieldScanState = apps.get_model('mashamba', 'YieldScanState')
+    for state in YieldScanState.objects.filter(last_session_id__gt=0):
+        latest = MilkingSession.objects.filter(id__lte=state.last_session_id).aggregate(
+            latest=Max('milking_time'),
+        )['latest']
+        if latest is not None:
+            state.last_milking_time = latest
+            state.save(update_fields=['last_milking_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mashamba', '0025_unique_ledger_month'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='yieldscanstate',
+            name='last_milking_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='milkingsession',
+            index=models.Index(fields=['milking_time', 'id'], name='mashamba_mi_milking_c106be_idx'),
+        ),
+        migrations.RunPython(mark_scan_by_milking_time, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.13 on 2026-10-18 10:41
+
+from django.db import migrations
+from django.db.models import Count, DateField, OuterRef, Subquery, Sum
+from django.db.models.functions import Trunc
+
+
+def assign_sales_to_customer_farms(apps, schema_editor):
+    # Sales left without a farm by 0021 take their customer's farm. Sales
+    # from before customers existed cannot be placed and stay unassigned.
+    Customer = apps.get_model('mashamba', 'Customer')
+    LedgerMonth = apps.get_model('mashamba', 'LedgerMonth')
+    MilkSale = apps.get_model('mashamba', 'MilkSale')
+    assigned = MilkSale.objects.filter(farm__isnull=True, customer__isnull=False).update(
+        farm_id=Subquery(Customer.objects.filter(pk=OuterRef('customer_id')).values('farm_id')[:1]),
+    )
+    if not assigned:
+        return
+
+    # The assigned sales were totalled in ledger rows with no farm; count milk sales again.
+    LedgerMonth.objects.filter(kind='milk_sales').delete()
+    rows = MilkSale.objects.annotate(
+        ledger_month=Trunc('sale_time', 'month', output_field=DateField()),
+    ).values('farm_id', 'ledger_month').annotate(amount=Sum('milk_amount'), entries=Count('pk')).order_by()
+    LedgerMonth.objects.bulk_create([
+        LedgerMonth(
+            farm_id=row['farm_id'], month=row['ledger_month'], kind='milk_sales',
+            amount=row['amount'], entries=row['entries'],
+        )
+        for row in rows.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mashamba', '0026_yield_scan_milking_order'),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_sales_to_customer_farms, migrations.RunPython.noop),
+    ]
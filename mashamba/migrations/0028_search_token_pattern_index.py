@@ -0,0 +1,21 @@
+# Generated by Django 4.2.13 on 2026-10-18 10:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mashamba', '0027_assign_sales_to_customer_farms'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='farmsearchtoken',
+            name='mashamba_fa_token_c9a5ea_idx',
+        ),
+        migrations.AddIndex(
+            model_name='farmsearchtoken',
+            index=models.Index(fields=['token', 'field', 'farm'], name='mashamba_search_token_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops', 'int8_ops']),
+        ),
+    ]
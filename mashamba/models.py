@@ -1,9 +1,11 @@
 from django.contrib.auth.models import User
+from django.core.validators import MaxValueValidator
 from django.db import models
 from django.utils.text import slugify
 from django.utils import timezone
 from django.urls import reverse
-from datetime import date  #std lib
+from datetime import date, timedelta  #std lib
+import secrets
 
 # Farm Model
 class Farm(models.Model):
@@ -34,6 +36,8 @@ class Farm(models.Model):
         ordering = ['-created']
         indexes = [
             models.Index(fields=['-created']),
+            # The farm directory lists only active, verified farms by name.
+            models.Index(fields=['name'], condition=models.Q(active=True, verified=True), name='farm_directory_idx'),
         ]
 
     def __str__(self):
@@ -49,6 +53,15 @@ class ProductService(models.Model):
     def __str__(self):
         return f"{self.name} - {self.farm.name}"
 
+def generate_cow_identifier():
+    """Return a fresh cow identifier such as ``Cow-9F86D081884C7D65``.
+
+    Identifiers are made up front rather than derived from the pk, so a cow is
+    stored in a single INSERT and bulk_create works for cows too.
+    """
+    return f'Cow-{secrets.token_hex(8).upper()}'
+
+
 # Cow Model
 class Cow(models.Model):
     GENDER_CHOICES = [
@@ -58,7 +71,7 @@ class Cow(models.Model):
 
     farm = models.ForeignKey(Farm, on_delete=models.CASCADE)
     name_or_tag = models.CharField(max_length=100)
-    identifier = models.CharField(max_length=100, unique=True, blank=True)
+    identifier = models.CharField(max_length=100, unique=True, blank=True, default=generate_cow_identifier)
     breed = models.CharField(max_length=100, blank=True)
     date_of_birth = models.DateField(blank=True, null=True)
     gender = models.CharField(max_length=10, choices=GENDER_CHOICES)
@@ -78,10 +91,14 @@ class Cow(models.Model):
         return None
 
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['farm', 'is_active', 'id']),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.identifier:
-            super().save(*args, **kwargs)  # Save the instance to generate a pk
-            self.identifier = f'Cow-{self.pk}'  # Example: Cow-1, Cow-2, etc.
+            self.identifier = generate_cow_identifier()
         super().save(*args, **kwargs)
 
 
@@ -93,22 +110,112 @@ class MilkingSession(models.Model):
     cow = models.ForeignKey(Cow, on_delete=models.CASCADE, related_name='milking_sessions')
     milk_yield = models.DecimalField(max_digits=6, decimal_places=2)
     milking_time = models.DateTimeField(default=timezone.now)
+    # Set by offline clients so a resubmitted entry is recognised (see sync.py)
+    client_id = models.UUIDField(blank=True, null=True, unique=True, editable=False)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cow', 'milking_time']),
+            # The anomaly scan's high-water mark
+            models.Index(fields=['milking_time', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.cow} - {self.milk_yield} on {self.milking_time}"
 
 
+# DailyMilkSummary Model
+class DailyMilkSummary(models.Model):
+    """Per-cow, per-day rollup of MilkingSession yields.
+
+    Kept in step with MilkingSession by the signal handlers in signals.py and
+    rebuilt from raw sessions by the rebuild_daily_milk_summaries command.
+    """
+    cow = models.ForeignKey(Cow, on_delete=models.CASCADE, related_name='daily_milk_summaries')
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='daily_milk_summaries')
+    date = models.DateField()
+    total_yield = models.DecimalField(max_digits=8, decimal_places=2)
+    session_count = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['cow', 'date'], name='unique_daily_milk_summary'),
+        ]
+        indexes = [
+            models.Index(fields=['farm', 'date']),
+        ]
+        verbose_name_plural = 'daily milk summaries'
+
+    def __str__(self):
+        return f"{self.cow} - {self.total_yield} L on {self.date}"
+
+
+
+class Customer(models.Model):
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='customers')
+    name = models.CharField(max_length=255)
+    phone_number = models.CharField(max_length=20, blank=True)
+    price_per_litre = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(fields=['farm', 'name'], name='unique_customer_name_per_farm'),
+        ]
+
+    def __str__(self):
+        return self.name
+
 
 class MilkSale(models.Model):
+    # Sales recorded before MilkSale had a farm link take their customer's
+    # farm, or the only farm there is; any others are left for the admin.
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='milk_sales', blank=True, null=True)
+    customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, related_name='sales', blank=True, null=True)
     customer_name = models.CharField(max_length=255)
     milk_amount = models.DecimalField(max_digits=6, decimal_places=2)
+    # The customer's price when the sale was made; later price changes do not rebill it.
+    price_per_litre = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True)
     sale_time = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['farm', 'sale_time']),
+            models.Index(fields=['customer', 'sale_time']),
+        ]
+
+    @property
+    def amount(self):
+        if self.price_per_litre is None:
+            return None
+        return self.milk_amount * self.price_per_litre
+
     def __str__(self):
         return f"{self.customer_name} bought {self.milk_amount} L on {self.sale_time}"
 
 
+class CustomerPayment(models.Model):
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='payments')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    paid_on = models.DateField(default=date.today)
+    reference = models.CharField(max_length=100, blank=True, help_text='Receipt or M-Pesa code')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'paid_on']),
+        ]
+
+    def __str__(self):
+        return f"{self.customer} paid {self.amount} on {self.paid_on}"
+
+
 # HealthRecord Model
+# Longest milk withdrawal a treatment may carry; bounds the active-withdrawal lookup.
+MAX_WITHDRAWAL_DAYS = 90
+
 class HealthRecord(models.Model):
     cow = models.ForeignKey(Cow, on_delete=models.CASCADE)
     health_issue = models.CharField(max_length=255)
@@ -117,6 +224,29 @@ class HealthRecord(models.Model):
     notes = models.TextField(blank=True)
     vet_name = models.CharField(max_length=100)
     vet_company = models.CharField(max_length=100)
+    withdrawal_days = models.PositiveIntegerField(
+        default=0, validators=[MaxValueValidator(MAX_WITHDRAWAL_DAYS)],
+        help_text='Days after treatment the cow\'s milk must not be sold',
+    )
+    # Last day milk is withheld; set from the two fields above (see health.py)
+    withdrawal_until = models.DateField(blank=True, null=True, editable=False)
+    # Set by offline clients so a resubmitted entry is recognised (see sync.py)
+    client_id = models.UUIDField(blank=True, null=True, unique=True, editable=False)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cow', 'treatment_date']),
+        ]
+
+    def set_withdrawal_until(self):
+        """Work out ``withdrawal_until``; bulk_create callers must call this themselves."""
+        treatment_date = self._meta.get_field('treatment_date').to_python(self.treatment_date)
+        self.withdrawal_until = treatment_date + timedelta(days=self.withdrawal_days) if self.withdrawal_days else None
+
+    def save(self, *args, **kwargs):
+        self.set_withdrawal_until()
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.cow} - {self.health_issue} treated on {self.treatment_date}"
@@ -156,6 +286,49 @@ class CalvingRecord(models.Model):
         return f"{self.cow} - Calving on {self.calving_date}"
 
 
+# Reproductive status (see reproduction.py)
+class ReproductiveStatus(models.Model):
+    """Where a cow stands in her breeding cycle, from her breeding and calving records.
+
+    One row per cow with any such record. Kept in step by the signal handlers
+    in signals.py and rebuilt by the rebuild_reproductive_status command, so
+    the breeding calendar reads these rows instead of every record.
+    """
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('bred', 'Bred'),
+    ]
+
+    cow = models.OneToOneField(Cow, on_delete=models.CASCADE, primary_key=True, related_name='reproductive_status')
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='reproductive_statuses')
+    status = models.CharField(max_length=4, choices=STATUS_CHOICES)
+    last_calving_date = models.DateField(blank=True, null=True)
+    calving_count = models.PositiveIntegerField(default=0)
+    calving_interval = models.PositiveIntegerField(blank=True, null=True, help_text='Days between the last two calvings')
+    conception_date = models.DateField(blank=True, null=True, help_text='Estimated from the expected calving date')
+    expected_calving_date = models.DateField(blank=True, null=True)
+    repeat_breeding_date = models.DateField(blank=True, null=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['farm', 'expected_calving_date']),
+            models.Index(fields=['farm', 'repeat_breeding_date']),
+            models.Index(fields=['farm', 'status', 'last_calving_date']),
+        ]
+        verbose_name_plural = 'reproductive statuses'
+
+    @property
+    def days_open(self):
+        """Days from the last calving to conception, or to today while the cow is open."""
+        if self.last_calving_date is None:
+            return None
+        return ((self.conception_date or date.today()) - self.last_calving_date).days
+
+    def __str__(self):
+        return f"{self.cow} - {self.get_status_display()}"
+
+
 # Inventory Model
 class Inventory(models.Model):
     farm = models.ForeignKey(Farm, on_delete=models.CASCADE)
@@ -170,6 +343,9 @@ class Inventory(models.Model):
 
     class Meta:
         verbose_name_plural = 'inventories'
+        indexes = [
+            models.Index(fields=['farm', 'date_acquired']),
+        ]
 
 
 # Expense Model
@@ -181,6 +357,11 @@ class Expense(models.Model):
     date = models.DateField(default=date.today)
     category = models.CharField(max_length=100, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['farm', 'date']),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.cost} on {self.date}"
 
@@ -193,5 +374,166 @@ class Revenue(models.Model):
     cost = models.DecimalField(max_digits=10, decimal_places=2)
     date = models.DateField(default=date.today)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['farm', 'date']),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.cost} on {self.date}"
+
+
+# Monthly ledger (see ledger.py)
+class LedgerMonth(models.Model):
+    """One month of a farm's books for one kind of entry (and expense category).
+
+    ``amount`` is money, except for milk sales where it is litres. Kept in
+    step with Revenue, Expense, Inventory and MilkSale by the signal handlers
+    in signals.py and rebuilt by the rebuild_ledger command. Milk sales not
+    yet assigned to a farm are totalled in rows with no farm.
+    """
+    KIND_CHOICES = [
+        ('revenue', 'Revenue'),
+        ('expense', 'Expense'),
+        ('inventory', 'Inventory acquired'),
+        ('milk_sales', 'Milk sold'),
+    ]
+
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='ledger_months', blank=True, null=True)
+    month = models.DateField(help_text='First day of the month')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    category = models.CharField(max_length=100, blank=True)
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    entries = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['month']
+        constraints = [
+            models.UniqueConstraint(fields=['farm', 'month', 'kind', 'category'], name='unique_ledger_month'),
+        ]
+        indexes = [
+            models.Index(fields=['farm', 'month']),
+        ]
+
+    def __str__(self):
+        return f"{self.farm_id} {self.month:%Y-%m} {self.kind} {self.category}: {self.amount}"
+
+
+# Customer accounts (see customers.py)
+class CustomerMonth(models.Model):
+    """One month of a customer's account for one kind of entry.
+
+    Deliveries carry the litres and the amount billed for them; payments the
+    amount paid. Kept in step with MilkSale and CustomerPayment by the signal
+    handlers in signals.py and rebuilt by the rebuild_customer_accounts command.
+    """
+    KIND_CHOICES = [
+        ('deliveries', 'Milk delivered'),
+        ('payments', 'Payments received'),
+    ]
+
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='account_months')
+    month = models.DateField(help_text='First day of the month')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    litres = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    entries = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['month']
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'month', 'kind'], name='unique_customer_month'),
+        ]
+
+    def __str__(self):
+        return f"{self.customer_id} {self.month:%Y-%m} {self.kind}: {self.amount}"
+
+
+# Yield anomaly detection (see anomalies.py)
+class YieldBaseline(models.Model):
+    """Rolling per-session yield statistics for one cow.
+
+    An exponentially weighted mean and variance, updated as the anomaly scan
+    reaches each new session, so the cow's full history is never re-read.
+    """
+    cow = models.OneToOneField(Cow, on_delete=models.CASCADE, primary_key=True, related_name='yield_baseline')
+    mean = models.FloatField(default=0)
+    variance = models.FloatField(default=0)
+    samples = models.PositiveIntegerField(default=0)
+    last_milking_time = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.cow} - {self.mean:.2f} L over {self.samples} sessions"
+
+
+class YieldScanState(models.Model):
+    """High-water mark of the anomaly scan.
+
+    Every session up to (last_milking_time, last_session_id), in milking
+    order, has been scanned.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_milking_time = models.DateTimeField(blank=True, null=True)
+    last_session_id = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} up to {self.last_milking_time} (session {self.last_session_id})"
+
+
+class YieldAnomaly(models.Model):
+    KIND_CHOICES = [
+        ('drop', 'Sudden drop'),
+        ('spike', 'Unlikely spike'),
+    ]
+
+    cow = models.ForeignKey(Cow, on_delete=models.CASCADE, related_name='yield_anomalies')
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='yield_anomalies')
+    session = models.OneToOneField(MilkingSession, on_delete=models.CASCADE, related_name='yield_anomaly')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    milking_time = models.DateTimeField()
+    milk_yield = models.DecimalField(max_digits=6, decimal_places=2)
+    expected_yield = models.FloatField()
+    z_score = models.FloatField()
+    detected = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-milking_time']
+        indexes = [
+            models.Index(fields=['farm', 'milking_time']),
+            models.Index(fields=['cow', 'milking_time']),
+        ]
+        verbose_name_plural = 'yield anomalies'
+
+    def __str__(self):
+        return f"{self.cow} - {self.get_kind_display()} to {self.milk_yield} L on {self.milking_time}"
+
+
+# Farm directory search (see search.py)
+class FarmSearchToken(models.Model):
+    """One lowercase word of a farm's name, location or product names."""
+    FIELD_CHOICES = [
+        ('name', 'Name'),
+        ('location', 'Location'),
+        ('product', 'Product'),
+    ]
+
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='search_tokens')
+    field = models.CharField(max_length=10, choices=FIELD_CHOICES)
+    token = models.CharField(max_length=50)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['farm', 'field', 'token'], name='unique_farm_search_token'),
+        ]
+        indexes = [
+            # Prefix lookups are range scans on token; field and farm are read from the index.
+            # The operator classes (PostgreSQL only) let it serve LIKE 'word%' whatever the collation.
+            models.Index(
+                fields=['token', 'field', 'farm'], name='mashamba_search_token_idx',
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops', 'int8_ops'],
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.farm_id} {self.field}: {self.token}"
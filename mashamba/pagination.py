@@ -0,0 +1,47 @@
+class DayPage:
+    """A page of calendar days, newest first, from keyset pagination."""
+
+    def __init__(self, days, has_next):
+        self.days = days
+        self.has_next = has_next
+
+    def __bool__(self):
+        return bool(self.days)
+
+    @property
+    def newest(self):
+        return self.days[0] if self.days else None
+
+    @property
+    def oldest(self):
+        return self.days[-1] if self.days else None
+
+    @property
+    def next_cursor(self):
+        """Value for the ``before`` parameter of the next (older) page."""
+        return self.oldest.isoformat() if self.has_next else None
+
+
+def _day_window(queryset, field, before, per_page):
+    dates = queryset.order_by(f'-{field}').values_list(field, flat=True).distinct()
+    if before is not None:
+        dates = dates.filter(**{f'{field}__lt': before})
+    # One extra day tells whether an older page exists.
+    return dates[:per_page + 1]
+
+
+def paginate_days(queryset, field, before=None, per_page=30):
+    """Return the DayPage of distinct ``field`` dates in ``queryset``.
+
+    Pages walk backwards in time: ``before`` is the cursor returned by the
+    previous page, and only dates strictly older than it are considered, so
+    each page costs one indexed range scan however long the history is.
+    """
+    days = list(_day_window(queryset, field, before, per_page))
+    return DayPage(days[:per_page], has_next=len(days) > per_page)
+
+
+async def apaginate_days(queryset, field, before=None, per_page=30):
+    """``paginate_days`` for async code."""
+    days = [day async for day in _day_window(queryset, field, before, per_page)]
+    return DayPage(days[:per_page], has_next=len(days) > per_page)
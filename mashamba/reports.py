@@ -0,0 +1,215 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import Count, Exists, F, OuterRef, Q, Sum, Value, Window
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .health import withheld_milk
+from .models import (
+    Cow, DailyMilkSummary, Expense, HealthRecord, MilkingSession, MilkSale, ReproductiveStatus, Revenue, YieldAnomaly,
+)
+from .pagination import apaginate_days
+from .rollups import day_start, milking_day
+
+# Days shown per page on the milk history views
+SESSION_DAYS_PER_PAGE = 10
+HERD_DAYS_PER_PAGE = 7
+DAILY_DAYS_PER_PAGE = 31
+
+
+async def cow_milking_history(cow, start, end, before=None):
+    """One page of a cow's milking sessions grouped by day, newest day first."""
+    # Pick the page of days first, then load only the sessions inside it
+    days = DailyMilkSummary.objects.filter(cow=cow, date__range=(start, end))
+    page = await apaginate_days(days, 'date', before=before, per_page=SESSION_DAYS_PER_PAGE)
+
+    grouped_milk_yield = {}
+    if page:
+        milking_sessions = MilkingSession.objects.filter(
+            cow=cow,
+            milking_time__gte=day_start(page.oldest),
+            milking_time__lt=day_start(page.newest + timedelta(days=1)),
+        ).order_by('milking_time').values('milk_yield', 'milking_time')
+
+        async for session in milking_sessions:
+            date = milking_day(session['milking_time'])
+            if date not in grouped_milk_yield:
+                grouped_milk_yield[date] = {'sessions': [], 'total': 0}
+            grouped_milk_yield[date]['sessions'].append(session)
+            grouped_milk_yield[date]['total'] += session['milk_yield']
+
+    return {
+        'sorted_grouped_milk_yield': dict(sorted(grouped_milk_yield.items(), reverse=True)),
+        'page': page,
+    }
+
+
+async def herd_daily_milk(farm, start, end, before=None):
+    """One page of per-cow daily yields for the farm, grouped by day.
+
+    Each day comes back ready to render: its cows, its total and the rowspan,
+    with the day total computed by a window function in the same query.
+    """
+    # Per-cow daily totals come pre-aggregated from the summary table
+    summaries = DailyMilkSummary.objects.filter(farm=farm, date__range=(start, end))
+    page = await apaginate_days(summaries, 'date', before=before, per_page=HERD_DAYS_PER_PAGE)
+
+    days = []
+    if page:
+        rows = summaries.filter(date__range=(page.oldest, page.newest)).values(
+            'date', 'cow__name_or_tag', 'total_yield'
+        ).annotate(
+            day_total=Window(Sum('total_yield'), partition_by=[F('date')]),
+        ).order_by('-date', 'cow__name_or_tag')
+        days = group_herd_rows([row async for row in rows])
+
+    return {
+        'days': days,
+        'page': page,
+    }
+
+
+def group_herd_rows(rows):
+    """Fold date-ordered per-cow rows into one entry per day, in a single pass."""
+    days = []
+    for date, day_rows in groupby(rows, key=itemgetter('date')):
+        cows = []
+        for row in day_rows:
+            cows.append({'cow': row['cow__name_or_tag'], 'total_yield': row['total_yield']})
+        days.append({
+            'date': date,
+            'total': row['day_total'],
+            'cows': cows,
+            'rowspan': len(cows),
+        })
+    return days
+
+
+async def farm_daily_milk(farm, start, end, before=None):
+    """One page of whole-farm daily milk totals, newest first."""
+    summaries = DailyMilkSummary.objects.filter(farm=farm, date__range=(start, end))
+    page = await apaginate_days(summaries, 'date', before=before, per_page=DAILY_DAYS_PER_PAGE)
+
+    grouped_milk_yield = defaultdict(float)
+    if page:
+        # Aggregate the per-cow daily summaries by date
+        daily_totals = summaries.filter(date__range=(page.oldest, page.newest)).values(
+            'date'
+        ).annotate(day_total=Sum('total_yield')).order_by('-date')
+
+        async for day in daily_totals:
+            date_str = day['date'].strftime("%Y-%m-%d")
+            grouped_milk_yield[date_str] += float(day['day_total'])
+
+    return {
+        'sorted_grouped_milk_yield': sorted(grouped_milk_yield.items(), reverse=True),
+        'page': page,
+    }
+
+
+def milk_reconciliation(farm, start, end):
+    """Per-date milk produced, withheld, sold and remaining for ``farm``, newest first.
+
+    Production comes from the daily summaries and sales are totalled per
+    local date in a second grouped query; both are limited to the farm and
+    the ``start``..``end`` window, and the two are matched up in Python.
+    Milk from cows under a treatment withdrawal is withheld, so only the
+    rest counts as ``sellable``. A date with sales but no recorded milk
+    still gets a row, with nothing produced and a negative remainder.
+    """
+    zero = Decimal('0')
+    sold = dict(MilkSale.objects.filter(
+        farm=farm,
+        sale_time__gte=day_start(start),
+        sale_time__lt=day_start(end + timedelta(days=1)),
+    ).annotate(date=TruncDate('sale_time')).values('date').annotate(total=Sum('milk_amount')).values_list(
+        'date', 'total',
+    ).order_by())
+
+    produced = {
+        row['date']: row
+        for row in DailyMilkSummary.objects.filter(farm=farm, date__range=(start, end)).values('date').annotate(
+            produced=Sum('total_yield'),
+            withheld=Coalesce(Sum('total_yield', filter=Q(withheld_milk())), Value(zero)),
+        ).order_by()
+    }
+    report = []
+    for day in sorted(produced.keys() | sold.keys(), reverse=True):
+        row = produced.get(day) or {'date': day, 'produced': zero, 'withheld': zero}
+        row['sellable'] = row['produced'] - row['withheld']
+        row['sold'] = sold.get(day, zero)
+        row['remaining'] = row['sellable'] - row['sold']
+        report.append(row)
+    return report
+
+
+def milk_sales_in_window(farm, start, end):
+    """``farm``'s individual sales recorded between ``start`` and ``end``, newest first."""
+    return MilkSale.objects.filter(
+        farm=farm,
+        sale_time__gte=day_start(start),
+        sale_time__lt=day_start(end + timedelta(days=1)),
+    ).order_by('-sale_time')
+
+
+def farm_dashboard(farm, today=None):
+    """Key figures for the farm dashboard.
+
+    Every figure comes from a fixed handful of queries, so the cost
+    does not grow with the number of cows or records.
+    """
+    today = today or timezone.localdate()
+    week_start = today - timedelta(days=6)
+    month_window_start = today - timedelta(days=29)
+    month_start = today.replace(day=1)
+    zero = Value(Decimal('0'))
+
+    milked_this_week = DailyMilkSummary.objects.filter(cow=OuterRef('pk'), date__gte=week_start)
+    herd = Cow.objects.filter(farm=farm).aggregate(
+        herd_size=Count('id', filter=Q(is_active=True)),
+        cows_in_milk=Count('id', filter=Q(is_active=True, gender='Female') & Q(Exists(milked_this_week))),
+    )
+    milk = DailyMilkSummary.objects.filter(farm=farm, date__range=(month_window_start, today)).aggregate(
+        yield_7_days=Coalesce(Sum('total_yield', filter=Q(date__gte=week_start)), zero),
+        yield_30_days=Coalesce(Sum('total_yield'), zero),
+        withheld_30_days=Coalesce(Sum('total_yield', filter=Q(withheld_milk())), zero),
+    )
+    sales = MilkSale.objects.filter(
+        farm=farm,
+        sale_time__gte=day_start(month_window_start),
+        sale_time__lt=day_start(today + timedelta(days=1)),
+    ).aggregate(sold_30_days=Coalesce(Sum('milk_amount'), zero))
+    expenses = Expense.objects.filter(farm=farm, date__range=(month_start, today)).aggregate(
+        expenses_month_to_date=Coalesce(Sum('cost'), zero),
+    )
+    revenue = Revenue.objects.filter(farm=farm, date__range=(month_start, today)).aggregate(
+        revenue_month_to_date=Coalesce(Sum('cost'), zero),
+    )
+
+    upcoming_calvings = ReproductiveStatus.objects.filter(
+        farm=farm, status='bred', expected_calving_date__range=(today, today + timedelta(days=30))
+    ).select_related('cow').order_by('expected_calving_date')[:10]
+    recent_treatments = HealthRecord.objects.filter(
+        cow__farm=farm, treatment_date__gte=month_window_start
+    ).select_related('cow').order_by('-treatment_date')[:10]
+    yield_anomalies = YieldAnomaly.objects.filter(
+        farm=farm, milking_time__gte=day_start(week_start)
+    ).select_related('cow')[:10]
+
+    return {
+        **herd,
+        **milk,
+        **sales,
+        **expenses,
+        **revenue,
+        'sellable_30_days': milk['yield_30_days'] - milk['withheld_30_days'],
+        'unsold_30_days': milk['yield_30_days'] - milk['withheld_30_days'] - sales['sold_30_days'],
+        'net_month_to_date': revenue['revenue_month_to_date'] - expenses['expenses_month_to_date'],
+        'upcoming_calvings': list(upcoming_calvings),
+        'recent_treatments': list(recent_treatments),
+        'yield_anomalies': list(yield_anomalies),
+    }
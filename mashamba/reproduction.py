@@ -0,0 +1,123 @@
+"""Each cow's reproductive status and the farm breeding calendar built on it.
+
+ReproductiveStatus holds one row per cow, worked out from all of her
+breeding and calving records whenever one of them is written. The calendar
+then finds the cows due to calve or due for repeat breeding with a range
+scan on the farm's status rows, however many records the herd has.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+
+from .models import BreedingRecord, CalvingRecord, Cow, ReproductiveStatus
+
+GESTATION_DAYS = 283
+# Keep the cow__in lists well under SQLite's bound-parameter limit.
+COW_CHUNK_SIZE = 500
+# Cows past their expected calving date stay on the calendar this long.
+OVERDUE_DAYS = 14
+
+
+def reproductive_status(cow_id, farm_id, calving_dates, breedings):
+    """The ReproductiveStatus for a cow, or None if she has no records.
+
+    ``calving_dates`` is a set of dates; ``breedings`` is the cow's
+    (expected_calving_date, repeat_breeding_date, last_calving_date,
+    no_of_calving) tuples in the order they were recorded.
+    """
+    if not calving_dates and not breedings:
+        return None
+    # A breeding record may be the only place a calving was written down.
+    calvings = sorted(calving_dates | {breeding[2] for breeding in breedings if breeding[2]})
+    last_calving = calvings[-1] if calvings else None
+    recorded_count = max((breeding[3] or 0 for breeding in breedings), default=0)
+
+    # The latest breeding that no calving has ended yet. A calving after the
+    # estimated conception ends it, even one that came early. A breeding with
+    # no expected date counts only if it was made after the last calving.
+    current = None
+    for breeding in breedings:
+        expected, _, calved_before, _ = breeding
+        if last_calving is None:
+            current = breeding
+        elif expected is None:
+            if calved_before == last_calving:
+                current = breeding
+        elif last_calving < expected - timedelta(days=GESTATION_DAYS):
+            current = breeding
+
+    expected_calving = current[0] if current else None
+    return ReproductiveStatus(
+        cow_id=cow_id,
+        farm_id=farm_id,
+        status='bred' if current else 'open',
+        last_calving_date=last_calving,
+        calving_count=max(len(calvings), recorded_count),
+        calving_interval=(calvings[-1] - calvings[-2]).days if len(calvings) > 1 else None,
+        conception_date=expected_calving - timedelta(days=GESTATION_DAYS) if expected_calving else None,
+        expected_calving_date=expected_calving,
+        repeat_breeding_date=current[1] if current else None,
+    )
+
+
+def refresh_reproductive_status(cow_ids):
+    """Recompute the ReproductiveStatus rows of the given cows."""
+    cow_ids = sorted(set(cow_ids))
+    for i in range(0, len(cow_ids), COW_CHUNK_SIZE):
+        chunk = cow_ids[i:i + COW_CHUNK_SIZE]
+        calvings = defaultdict(set)
+        for cow_id, calving_date in CalvingRecord.objects.filter(cow_id__in=chunk).values_list('cow_id', 'calving_date'):
+            calvings[cow_id].add(calving_date)
+        breedings = defaultdict(list)
+        for cow_id, *breeding in BreedingRecord.objects.filter(cow_id__in=chunk).order_by('id').values_list(
+            'cow_id', 'expected_calving_date', 'repeat_breeding_date', 'last_calving_date', 'no_of_calving',
+        ):
+            breedings[cow_id].append(breeding)
+
+        statuses = [
+            reproductive_status(cow_id, farm_id, calvings[cow_id], breedings[cow_id])
+            for cow_id, farm_id in Cow.objects.filter(id__in=chunk).values_list('id', 'farm_id')
+        ]
+        with transaction.atomic():
+            ReproductiveStatus.objects.filter(cow_id__in=chunk).delete()
+            ReproductiveStatus.objects.bulk_create([status for status in statuses if status])
+
+
+def rebuild_reproductive_status(farm=None):
+    """Recompute every cow's status (or one farm's). Returns the number of rows written."""
+    cows = Cow.objects.all() if farm is None else Cow.objects.filter(farm=farm)
+    refresh_reproductive_status(cows.values_list('id', flat=True))
+    statuses = ReproductiveStatus.objects.all() if farm is None else ReproductiveStatus.objects.filter(farm=farm)
+    return statuses.count()
+
+
+def breeding_calendar(farm, days, today=None):
+    """The farm's breeding calendar for the next ``days`` days.
+
+    ``calvings`` are bred cows expected to calve in that time (or up to
+    OVERDUE_DAYS ago and not yet recorded as calved), ``repeat_breedings``
+    are cows whose repeat breeding date falls in it, and ``open_cows`` are
+    cows not bred since calving, longest open first. ``herd`` has the
+    number of ``bred`` and ``open`` cows and the ``average_calving_interval``.
+    """
+    today = today or timezone.localdate()
+    end = today + timedelta(days=days)
+    statuses = ReproductiveStatus.objects.filter(farm=farm, cow__is_active=True).select_related('cow')
+
+    return {
+        'calvings': list(statuses.filter(
+            expected_calving_date__range=(today - timedelta(days=OVERDUE_DAYS), end), status='bred',
+        ).order_by('expected_calving_date')),
+        'repeat_breedings': list(statuses.filter(
+            repeat_breeding_date__range=(today, end), status='bred',
+        ).order_by('repeat_breeding_date')),
+        'open_cows': list(statuses.filter(status='open', last_calving_date__isnull=False).order_by('last_calving_date')),
+        'herd': statuses.aggregate(
+            bred=Count('pk', filter=Q(status='bred')),
+            open=Count('pk', filter=Q(status='open')),
+            average_calving_interval=Avg('calving_interval'),
+        ),
+    }
@@ -0,0 +1,110 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .cache import bump_all_milk_data_versions, bump_milk_data_version
+from .models import Cow, DailyMilkSummary, MilkingSession
+
+# Keep the cow__in lists well under SQLite's bound-parameter limit.
+COW_CHUNK_SIZE = 500
+SUMMARY_BATCH_SIZE = 1000
+
+
+def milking_day(milking_time):
+    """Return the local calendar date a milking_time is reported under."""
+    if timezone.is_aware(milking_time):
+        return timezone.localtime(milking_time).date()
+    return milking_time.date()
+
+
+def day_start(day):
+    """Return the aware datetime at which the local calendar day begins."""
+    start = datetime.combine(day, time.min)
+    return timezone.make_aware(start) if timezone.is_naive(start) else start
+
+
+def _summaries_from_sessions(sessions):
+    rows = sessions.values('cow_id', 'cow__farm_id', 'milking_time__date').annotate(
+        total_yield=Sum('milk_yield'), session_count=Count('id')
+    )
+    for row in rows.iterator(chunk_size=SUMMARY_BATCH_SIZE):
+        yield DailyMilkSummary(
+            cow_id=row['cow_id'],
+            farm_id=row['cow__farm_id'],
+            date=row['milking_time__date'],
+            total_yield=row['total_yield'],
+            session_count=row['session_count'],
+        )
+
+
+def refresh_daily_milk_summaries(keys):
+    """Recompute the DailyMilkSummary rows for the given (cow_id, date) pairs.
+
+    Every cow/date combination in the pairs is recomputed from raw sessions,
+    so callers may pass the keys of created, edited or deleted sessions alike.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    cow_ids = sorted({cow_id for cow_id, _ in keys})
+    dates = {day for _, day in keys}
+    window_start, window_end = day_start(min(dates)), day_start(max(dates) + timedelta(days=1))
+
+    with transaction.atomic():
+        for i in range(0, len(cow_ids), COW_CHUNK_SIZE):
+            chunk = cow_ids[i:i + COW_CHUNK_SIZE]
+            sessions = MilkingSession.objects.filter(
+                cow_id__in=chunk,
+                milking_time__gte=window_start,
+                milking_time__lt=window_end,
+            )
+            summaries = [s for s in _summaries_from_sessions(sessions) if s.date in dates]
+            DailyMilkSummary.objects.filter(cow_id__in=chunk, date__in=dates).delete()
+            DailyMilkSummary.objects.bulk_create(summaries, batch_size=SUMMARY_BATCH_SIZE)
+
+
+def rebuild_daily_milk_summaries(farm=None):
+    """Throw away and regenerate the summary table (or one farm's share of it).
+
+    Returns the number of summary rows written.
+    """
+    sessions = MilkingSession.objects.all()
+    summaries = DailyMilkSummary.objects.all()
+    if farm is not None:
+        sessions = sessions.filter(cow__farm=farm)
+        summaries = summaries.filter(farm=farm)
+
+    written = 0
+    with transaction.atomic():
+        summaries.delete()
+        batch = []
+        for summary in _summaries_from_sessions(sessions.order_by()):
+            batch.append(summary)
+            if len(batch) >= SUMMARY_BATCH_SIZE:
+                DailyMilkSummary.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        DailyMilkSummary.objects.bulk_create(batch)
+        written += len(batch)
+    if farm is not None:
+        bump_milk_data_version(farm.id)
+    else:
+        bump_all_milk_data_versions()
+    return written
+
+
+def bulk_create_milking_sessions(sessions, batch_size=SUMMARY_BATCH_SIZE, **kwargs):
+    """``bulk_create`` MilkingSessions and bring their daily summaries up to date.
+
+    bulk_create does not send post_save, so every bulk insert of sessions goes
+    through here rather than straight to the manager.
+    """
+    sessions = list(sessions)
+    with transaction.atomic():
+        created = MilkingSession.objects.bulk_create(sessions, batch_size=batch_size, **kwargs)
+        refresh_daily_milk_summaries((s.cow_id, milking_day(s.milking_time)) for s in sessions)
+    cow_ids = {s.cow_id for s in sessions}
+    bump_milk_data_version(*set(Cow.objects.filter(id__in=cow_ids).values_list('farm_id', flat=True)))
+    return created
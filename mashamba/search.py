@@ -0,0 +1,71 @@
+"""Word index behind the farm directory search.
+
+Each farm's name, location and product names are split into lowercase words
+and stored as FarmSearchToken rows. A search word matches every stored word
+it is a prefix of, found by a prefix scan on the token index, so a lookup
+costs about the same however many farms there are. The rows are kept in
+step by the Farm and ProductService signal handlers in signals.py.
+"""
+import re
+
+from django.db import connection, transaction
+
+from .models import Farm, FarmSearchToken, ProductService
+
+TOKEN_LENGTH = 50
+SEARCH_FIELDS = ('name', 'location', 'product')
+# Each word is one more subquery; anything past this is ignored.
+MAX_SEARCH_WORDS = 6
+
+
+def tokenize(text):
+    """The distinct lowercase words of ``text``, in order."""
+    return list(dict.fromkeys(word[:TOKEN_LENGTH] for word in re.findall(r'\w+', text.casefold())))
+
+
+def index_farms(farm_ids, fields=SEARCH_FIELDS):
+    """Rebuild the search tokens for ``fields`` of the given farms."""
+    farm_ids = list(farm_ids)
+    rows = set()
+    if 'name' in fields or 'location' in fields:
+        for farm_id, name, location in Farm.objects.filter(id__in=farm_ids).values_list('id', 'name', 'location'):
+            if 'name' in fields:
+                rows.update((farm_id, 'name', word) for word in tokenize(name))
+            if 'location' in fields:
+                rows.update((farm_id, 'location', word) for word in tokenize(location))
+    if 'product' in fields:
+        for farm_id, name in ProductService.objects.filter(farm_id__in=farm_ids).values_list('farm_id', 'name'):
+            rows.update((farm_id, 'product', word) for word in tokenize(name))
+
+    with transaction.atomic():
+        FarmSearchToken.objects.filter(farm_id__in=farm_ids, field__in=fields).delete()
+        FarmSearchToken.objects.bulk_create(
+            [FarmSearchToken(farm_id=farm_id, field=field, token=token) for farm_id, field, token in rows],
+            batch_size=1000,
+        )
+
+
+def _prefix_lookup(word):
+    """Filter arguments for the tokens that start with ``word``."""
+    if connection.vendor == 'sqlite':
+        # SQLite compares text by code point, so [word, word + U+10FFFF) holds
+        # exactly those tokens. Its LIKE ignores case and cannot use the index.
+        return {'token__gte': word, 'token__lt': word + '\U0010ffff'}
+    # Other collations need not sort by code point; LIKE 'word%' is exact and
+    # uses the pattern_ops index on PostgreSQL.
+    return {'token__startswith': word}
+
+
+def search_farms(queryset, query='', location='', product=''):
+    """Narrow a Farm queryset to farms matching every word given.
+
+    Words of ``query`` may match a farm's name, location or products;
+    ``location`` and ``product`` words only match that field.
+    """
+    for field, text in ((None, query), ('location', location), ('product', product)):
+        for word in tokenize(text)[:MAX_SEARCH_WORDS]:
+            tokens = FarmSearchToken.objects.filter(**_prefix_lookup(word))
+            if field:
+                tokens = tokens.filter(field=field)
+            queryset = queryset.filter(id__in=tokens.values('farm_id'))
+    return queryset
@@ -0,0 +1,221 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_milk_data_version
+from .customers import instance_account_key, refresh_customer_accounts
+from .ledger import instance_ledger_key, refresh_ledger
+from .models import (
+    BreedingRecord, CalvingRecord, Cow, CustomerPayment, DailyMilkSummary, Expense, Farm, Inventory, MilkingSession, MilkSale,
+    ProductService, Revenue,
+)
+from .reproduction import refresh_reproductive_status
+from .rollups import milking_day, refresh_daily_milk_summaries
+from .search import index_farms
+
+
+@receiver(pre_save, sender=MilkingSession)
+def remember_previous_milking_day(sender, instance, raw=False, **kwargs):
+    # An edit may move a session to another cow or day; remember where it
+    # used to be so that summary row is corrected too.
+    instance._previous_summary_key = None
+    if raw or instance.pk is None:
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list('cow_id', 'milking_time').first()
+    if previous:
+        instance._previous_summary_key = (previous[0], milking_day(previous[1]))
+
+
+@receiver(post_save, sender=MilkingSession)
+def update_daily_milk_summary(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    keys = {(instance.cow_id, milking_day(instance.milking_time))}
+    previous = getattr(instance, '_previous_summary_key', None)
+    if previous:
+        keys.add(previous)
+    refresh_daily_milk_summaries(keys)
+    bump_milk_data_version(*_farm_ids(keys))
+
+
+@receiver(post_delete, sender=MilkingSession)
+def remove_from_daily_milk_summary(sender, instance, origin=None, **kwargs):
+    # A cow or farm delete takes the summary rows with it and bumps the
+    # version once, below.
+    if _cascaded(sender, origin):
+        return
+    refresh_daily_milk_summaries([(instance.cow_id, milking_day(instance.milking_time))])
+    bump_milk_data_version(*_farm_ids([(instance.cow_id, None)]))
+
+
+@receiver(post_save, sender=Cow)
+def move_daily_milk_summaries(sender, instance, created=False, raw=False, **kwargs):
+    # Summaries carry the farm so reports can skip the cow join; follow the
+    # cow if it is ever moved to another farm.
+    if raw:
+        return
+    bump_milk_data_version(instance.farm_id)
+    if created:
+        return
+    moved_from = set(
+        DailyMilkSummary.objects.filter(cow=instance).exclude(farm_id=instance.farm_id)
+        .values_list('farm_id', flat=True).distinct()
+    )
+    if moved_from:
+        DailyMilkSummary.objects.filter(cow=instance).update(farm_id=instance.farm_id)
+        bump_milk_data_version(*moved_from)
+
+
+@receiver(post_delete, sender=Cow)
+def forget_deleted_cow(sender, instance, origin=None, **kwargs):
+    if _cascaded(sender, origin):
+        return
+    bump_milk_data_version(instance.farm_id)
+
+
+@receiver(post_delete, sender=Farm)
+def forget_deleted_farm(sender, instance, **kwargs):
+    bump_milk_data_version(instance.pk)
+
+
+@receiver(post_save, sender=CalvingRecord)
+@receiver(post_delete, sender=CalvingRecord)
+def calving_changes_lactations(sender, instance, raw=False, **kwargs):
+    # Lactation metrics in the report cache start from the latest calving.
+    if raw:
+        return
+    bump_milk_data_version(*_farm_ids([(instance.cow_id, None)]))
+
+
+@receiver(pre_save, sender=BreedingRecord)
+@receiver(pre_save, sender=CalvingRecord)
+def remember_previous_cow(sender, instance, raw=False, **kwargs):
+    instance._previous_cow_id = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_cow_id = sender.objects.filter(pk=instance.pk).values_list('cow_id', flat=True).first()
+
+
+@receiver(post_save, sender=BreedingRecord)
+@receiver(post_save, sender=CalvingRecord)
+def update_reproductive_status(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cow_ids = {instance.cow_id, getattr(instance, '_previous_cow_id', None)} - {None}
+    refresh_reproductive_status(cow_ids)
+
+
+@receiver(post_delete, sender=BreedingRecord)
+@receiver(post_delete, sender=CalvingRecord)
+def remove_from_reproductive_status(sender, instance, origin=None, **kwargs):
+    # When the cow (or her farm) is being deleted her status row goes with
+    # her, so there is no need to recompute it once per deleted record.
+    if _cascaded(sender, origin):
+        return
+    refresh_reproductive_status([instance.cow_id])
+
+
+@receiver(post_save, sender=Farm)
+def index_farm_for_search(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_farms([instance.pk], fields=('name', 'location'))
+
+
+@receiver(post_save, sender=ProductService)
+@receiver(post_delete, sender=ProductService)
+def index_farm_products_for_search(sender, instance, raw=False, **kwargs):
+    # Rebuilt from the products left, so a delete cascading from the farm
+    # adds nothing back.
+    if raw:
+        return
+    index_farms([instance.farm_id], fields=('product',))
+
+
+@receiver(pre_save, sender=Revenue)
+@receiver(pre_save, sender=Expense)
+@receiver(pre_save, sender=Inventory)
+def remember_previous_ledger_month(sender, instance, raw=False, **kwargs):
+    # As with milking sessions, an edit may move an entry to another month
+    # or farm; that month's ledger rows need correcting too.
+    previous = _previous_row(sender, instance, raw)
+    instance._previous_ledger_key = instance_ledger_key(previous) if previous else None
+
+
+@receiver(pre_save, sender=MilkSale)
+def remember_previous_sale_months(sender, instance, raw=False, **kwargs):
+    # A sale is in both the ledger and its customer's account; one read of the
+    # old row serves both.
+    previous = _previous_row(sender, instance, raw)
+    instance._previous_ledger_key = instance_ledger_key(previous) if previous else None
+    instance._previous_account_key = instance_account_key(previous) if previous else None
+
+
+@receiver(post_save, sender=Revenue)
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Inventory)
+@receiver(post_save, sender=MilkSale)
+def update_ledger(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    keys = {instance_ledger_key(instance)}
+    previous = getattr(instance, '_previous_ledger_key', None)
+    if previous:
+        keys.add(previous)
+    refresh_ledger(keys)
+
+
+@receiver(post_delete, sender=Revenue)
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Inventory)
+@receiver(post_delete, sender=MilkSale)
+def remove_from_ledger(sender, instance, origin=None, **kwargs):
+    # A farm delete takes its ledger rows with it.
+    if _cascaded(sender, origin):
+        return
+    refresh_ledger([instance_ledger_key(instance)])
+
+
+@receiver(pre_save, sender=CustomerPayment)
+def remember_previous_account_month(sender, instance, raw=False, **kwargs):
+    # A payment may be moved to another customer or month.
+    previous = _previous_row(sender, instance, raw)
+    instance._previous_account_key = instance_account_key(previous) if previous else None
+
+
+@receiver(post_save, sender=MilkSale)
+@receiver(post_save, sender=CustomerPayment)
+def update_customer_account(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    keys = {instance_account_key(instance), getattr(instance, '_previous_account_key', None)} - {None}
+    if keys:
+        refresh_customer_accounts(keys)
+
+
+@receiver(post_delete, sender=MilkSale)
+@receiver(post_delete, sender=CustomerPayment)
+def remove_from_customer_account(sender, instance, origin=None, **kwargs):
+    # Deleting the customer (or farm) takes the account rows with it.
+    if _cascaded(sender, origin):
+        return
+    key = instance_account_key(instance)
+    if key:
+        refresh_customer_accounts([key])
+
+
+def _previous_row(sender, instance, raw):
+    """The stored version of ``instance`` about to be overwritten, if any."""
+    if raw or instance.pk is None:
+        return None
+    return sender.objects.filter(pk=instance.pk).first()
+
+
+def _cascaded(sender, origin):
+    """Whether a post_delete of ``sender`` comes from deleting some other object."""
+    # origin is the instance or queryset delete() was called on.
+    return origin is not None and getattr(origin, 'model', type(origin)) is not sender
+
+
+def _farm_ids(keys):
+    cow_ids = {cow_id for cow_id, _ in keys}
+    return set(Cow.objects.filter(id__in=cow_ids).values_list('farm_id', flat=True))
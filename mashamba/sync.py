@@ -0,0 +1,160 @@
+"""Batched, idempotent sync of field-recorded entries.
+
+Phones record milking sessions and health records offline, each under a
+client-generated UUID (``client_id``), and upload them in one request.
+Entries already on the server are recognised by that id and skipped, so a
+batch can be resent safely after a dropped connection. The response carries
+the server's changes since the client's previous sync token.
+"""
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .forms import HealthRecordForm, MilkingSessionForm
+from .models import Cow, HealthRecord, MilkingSession
+from .rollups import bulk_create_milking_sessions
+
+MAX_SYNC_ENTRIES = 2000
+SYNC_BATCH_SIZE = 1000
+# Changes are re-sent from a little before the client's token, so rows whose
+# transaction was still open when the token was issued are not missed.
+SYNC_OVERLAP = timedelta(seconds=60)
+# A client with no token gets this much recent history.
+INITIAL_SYNC_DAYS = 7
+
+
+class SyncError(Exception):
+    """The sync request as a whole is malformed."""
+
+
+class SyncKind:
+    def __init__(self, model, form_class, fields, female_only=False):
+        self.model = model
+        self.form_class = form_class
+        self.fields = fields
+        self.female_only = female_only
+
+
+SYNC_KINDS = {
+    'milking_sessions': SyncKind(MilkingSession, MilkingSessionForm, ['milk_yield', 'milking_time'], female_only=True),
+    'health_records': SyncKind(
+        HealthRecord, HealthRecordForm,
+        ['health_issue', 'treatment', 'treatment_date', 'withdrawal_days', 'notes', 'vet_name', 'vet_company'],
+    ),
+}
+
+
+def sync_farm(farm, payload):
+    """Apply an upload to ``farm`` and return the response body.
+
+    ``payload`` is ``{"since": <token or null>, "milking_sessions": [...],
+    "health_records": [...]}``; every entry needs a ``client_id`` UUID and the
+    ``cow`` identifier. Valid new entries are written in one transaction;
+    invalid ones are reported back by ``client_id`` and nothing else is lost.
+    """
+    if not isinstance(payload, dict):
+        raise SyncError('Expected a JSON object.')
+    since = _parse_token(payload.get('since'))
+    token = timezone.now()
+
+    uploads = {}
+    for kind in SYNC_KINDS:
+        entries = payload.get(kind) or []
+        if not isinstance(entries, list):
+            raise SyncError(f"'{kind}' must be a list.")
+        if len(entries) > MAX_SYNC_ENTRIES:
+            raise SyncError(f"At most {MAX_SYNC_ENTRIES} {kind.replace('_', ' ')} per request.")
+        uploads[kind] = entries
+
+    cows = _resolve_cows(farm, uploads)
+    result = {'sync_token': token.isoformat(), 'created': {}, 'duplicates': {}, 'errors': []}
+    with transaction.atomic():
+        for kind, entries in uploads.items():
+            objects, duplicates = _build(kind, SYNC_KINDS[kind], entries, cows, result['errors'])
+            if kind == 'milking_sessions':
+                bulk_create_milking_sessions(objects, batch_size=SYNC_BATCH_SIZE, ignore_conflicts=True)
+            else:
+                SYNC_KINDS[kind].model.objects.bulk_create(objects, batch_size=SYNC_BATCH_SIZE, ignore_conflicts=True)
+            result['created'][kind] = len(objects)
+            result['duplicates'][kind] = duplicates
+
+    result['changes'] = {kind: _changes(farm, sync_kind, since) for kind, sync_kind in SYNC_KINDS.items()}
+    return result
+
+
+def _parse_token(value):
+    if value in (None, ''):
+        return None
+    since = parse_datetime(value) if isinstance(value, str) else None
+    if since is None or timezone.is_naive(since):
+        raise SyncError("'since' must be a sync token from an earlier response.")
+    return since
+
+
+def _resolve_cows(farm, uploads):
+    identifiers = {
+        str(entry.get('cow', '')).strip()
+        for entries in uploads.values() for entry in entries if isinstance(entry, dict)
+    }
+    cows = Cow.objects.filter(farm=farm, identifier__in=identifiers).only('id', 'identifier', 'gender')
+    return {cow.identifier: cow for cow in cows}
+
+
+def _build(kind, sync_kind, entries, cows, errors):
+    """Validate ``entries`` and return (unsaved new objects, number already on the server)."""
+    valid = {}
+    resent = 0
+    for entry in entries:
+        if not isinstance(entry, dict):
+            errors.append({'kind': kind, 'client_id': None, 'errors': ['Each entry must be an object.']})
+            continue
+        try:
+            client_id = uuid.UUID(str(entry.get('client_id')))
+        except ValueError:
+            errors.append({'kind': kind, 'client_id': entry.get('client_id'), 'errors': ['client_id must be a UUID.']})
+            continue
+
+        cow = cows.get(str(entry.get('cow', '')).strip())
+        if cow is None:
+            messages = [f"No cow with identifier '{entry.get('cow', '')}' on this farm."]
+        elif sync_kind.female_only and cow.gender != 'Female':
+            messages = ['Only female cows can have milking sessions.']
+        else:
+            form = sync_kind.form_class({field: entry.get(field, '') for field in sync_kind.fields})
+            messages = [f'{field}: {message}' for field, field_messages in form.errors.items() for message in field_messages]
+        if messages:
+            errors.append({'kind': kind, 'client_id': str(client_id), 'errors': messages})
+            continue
+        instance = form.save(commit=False)
+        instance.cow = cow
+        instance.client_id = client_id
+        # A repeat of the same id inside one upload is a resend too.
+        if client_id in valid:
+            resent += 1
+        else:
+            valid[client_id] = instance
+
+    existing = set(
+        sync_kind.model.objects.filter(client_id__in=list(valid)).values_list('client_id', flat=True)
+    )
+    objects = [instance for client_id, instance in valid.items() if client_id not in existing]
+    return objects, resent + len(existing)
+
+
+def _changes(farm, sync_kind, since):
+    if since is None:
+        since = timezone.now() - timedelta(days=INITIAL_SYNC_DAYS)
+    else:
+        since -= SYNC_OVERLAP
+    rows = sync_kind.model.objects.filter(cow__farm=farm, modified__gt=since).order_by('modified').values(
+        'id', 'client_id', 'cow__identifier', *sync_kind.fields, 'modified',
+    )
+    changes = []
+    for row in rows:
+        row['cow'] = row.pop('cow__identifier')
+        row['client_id'] = row['client_id'] and str(row['client_id'])
+        changes.append(row)
+    return changes
@@ -0,0 +1,215 @@
+"""Seeded synthetic farm data for benchmarks and load testing.
+
+Everything is written with bulk_create in batches, and the same seed always
+produces the same herd, so benchmark runs can be compared across commits.
+"""
+import math
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    BreedingRecord, CalvingRecord, Cow, Customer, CustomerPayment, Expense, Farm, HealthRecord, Inventory,
+    MilkingSession, MilkSale, Revenue,
+)
+from .customers import rebuild_customer_accounts
+from .ledger import rebuild_ledger
+from .reproduction import GESTATION_DAYS, rebuild_reproductive_status
+from .rollups import rebuild_daily_milk_summaries
+
+BATCH_SIZE = 5000
+LOCATIONS = ['Nakuru', 'Eldoret', 'Kiambu', 'Nyeri', 'Meru', 'Kericho', 'Nyandarua', 'Bomet']
+BREEDS = ['Friesian', 'Ayrshire', 'Jersey', 'Guernsey', 'Sahiwal']
+# (issue, treatment, milk withdrawal days)
+HEALTH_ISSUES = [('Mastitis', 'Intramammary antibiotic', 4), ('Lameness', 'Hoof trimming', 0),
+                 ('East Coast Fever', 'Buparvaquone', 3), ('Milk fever', 'Calcium borogluconate', 0)]
+EXPENSE_CATEGORIES = ['Feed', 'Veterinary', 'Labour', 'Utilities', 'Equipment']
+MILKING_HOURS = (6, 17)
+CALVING_INTERVAL_DAYS = 385
+DRY_PERIOD_DAYS = 60
+
+
+def wood_curve(days_in_milk, peak_scale):
+    """Daily yield in litres on ``days_in_milk`` per Wood's lactation curve."""
+    return peak_scale * (days_in_milk ** 0.2) * math.exp(-0.004 * days_in_milk)
+
+
+class SyntheticFarmGenerator:
+    def __init__(self, seed=0, years=1, cows=50, prefix='Synthetic Farm', manager=None):
+        self.rng = random.Random(seed)
+        self.years = years
+        self.cow_count = cows
+        self.prefix = prefix
+        self.manager = manager
+        self.end = timezone.localdate()
+        self.start = self.end - timedelta(days=365 * years - 1)
+        self.counts = {}
+
+    def count(self, name, number):
+        self.counts[name] = self.counts.get(name, 0) + number
+
+    def generate(self, farm_count):
+        if self.manager is None:
+            self.manager, _ = User.objects.get_or_create(username='synthetic-manager')
+        farms = []
+        for i in range(farm_count):
+            with transaction.atomic():
+                farm = Farm.objects.create(
+                    name=f'{self.prefix} {i + 1}',
+                    manager=self.manager,
+                    location=self.rng.choice(LOCATIONS),
+                    description='Synthetic data for benchmarking.',
+                    active=True,
+                    verified=True,
+                )
+                self.generate_farm(farm)
+            farms.append(farm)
+        return farms
+
+    def generate_farm(self, farm):
+        cows = Cow.objects.bulk_create([
+            Cow(
+                farm=farm,
+                name_or_tag=f'Cow {n + 1:04d}',
+                breed=self.rng.choice(BREEDS),
+                gender='Female' if self.rng.random() < 0.9 else 'Male',
+                date_of_birth=self.start - timedelta(days=self.rng.randint(2 * 365, 8 * 365)),
+                mass=round(self.rng.uniform(350, 650), 1),
+            )
+            for n in range(self.cow_count)
+        ])
+        self.count('cows', len(cows))
+        # SQLite before 3.35 does not hand primary keys back from bulk_create.
+        cows = list(Cow.objects.filter(farm=farm).order_by('id'))
+
+        sessions = []
+        for cow in cows:
+            if cow.gender != 'Female':
+                continue
+            for session in self.cow_history(cow):
+                sessions.append(session)
+                if len(sessions) >= BATCH_SIZE:
+                    self.flush(MilkingSession, sessions, 'milking_sessions')
+        self.flush(MilkingSession, sessions, 'milking_sessions')
+
+        self.farm_books(farm)
+        rebuild_daily_milk_summaries(farm=farm)
+        rebuild_ledger(farm=farm)
+        rebuild_customer_accounts(farm=farm)
+        rebuild_reproductive_status(farm=farm)
+
+    def cow_history(self, cow):
+        """Yield the cow's milking sessions and queue its breeding, calving and health records."""
+        peak_scale = self.rng.uniform(5.0, 9.0)
+        calving = self.start - timedelta(days=self.rng.randint(0, CALVING_INTERVAL_DAYS - 1))
+        calvings, breedings, treatments = [], [], []
+
+        while calving <= self.end:
+            next_calving = calving + timedelta(days=CALVING_INTERVAL_DAYS + self.rng.randint(-20, 40))
+            service = next_calving - timedelta(days=GESTATION_DAYS)
+            if calving >= self.start:
+                calvings.append(CalvingRecord(cow=cow, calving_date=calving, calf_details='Healthy calf'))
+            if service <= self.end:
+                breedings.append(BreedingRecord(
+                    cow=cow,
+                    breeding_method='AI' if self.rng.random() < 0.8 else 'Natural',
+                    expected_calving_date=next_calving,
+                    repeat_breeding_date=service + timedelta(days=21),
+                    last_calving_date=calving,
+                    inseminator_name='Synthetic AI Services',
+                ))
+
+            dry_off = next_calving - timedelta(days=DRY_PERIOD_DAYS)
+            day = max(calving, self.start)
+            while day <= min(dry_off, self.end):
+                daily = wood_curve((day - calving).days + 1, peak_scale)
+                for hour in MILKING_HOURS:
+                    litres = max(0.5, self.rng.gauss(daily / len(MILKING_HOURS), 0.6))
+                    yield MilkingSession(
+                        cow=cow,
+                        milk_yield=Decimal(f'{litres:.2f}'),
+                        milking_time=timezone.make_aware(datetime.combine(day, time(hour, self.rng.randint(0, 59)))),
+                    )
+                day += timedelta(days=1)
+            calving = next_calving
+
+        for _ in range(self.rng.randint(0, 2 * self.years)):
+            issue, treatment, withdrawal_days = self.rng.choice(HEALTH_ISSUES)
+            record = HealthRecord(
+                cow=cow,
+                health_issue=issue,
+                treatment=treatment,
+                treatment_date=self.start + timedelta(days=self.rng.randint(0, (self.end - self.start).days)),
+                withdrawal_days=withdrawal_days,
+                vet_name='Dr. Synthetic',
+                vet_company='Synthetic Vets',
+            )
+            record.set_withdrawal_until()
+            treatments.append(record)
+
+        self.flush(CalvingRecord, calvings, 'calving_records')
+        self.flush(BreedingRecord, breedings, 'breeding_records')
+        self.flush(HealthRecord, treatments, 'health_records')
+
+    def farm_books(self, farm):
+        sales, payments, expenses, revenue = [], [], [], []
+        Customer.objects.bulk_create([
+            Customer(farm=farm, name=f'Customer {n + 1}', price_per_litre=Decimal(self.rng.randint(45, 65)))
+            for n in range(self.rng.randint(3, 12))
+        ])
+        self.count('customers', farm.customers.count())
+        customers = list(farm.customers.order_by('id'))
+        owed = dict.fromkeys(customers, Decimal('0'))
+        day = self.start
+        while day <= self.end:
+            for customer in self.rng.sample(customers, self.rng.randint(1, len(customers))):
+                sale = MilkSale(
+                    farm=farm,
+                    customer=customer,
+                    customer_name=customer.name,
+                    milk_amount=Decimal(f'{self.rng.uniform(2, 40):.2f}'),
+                    price_per_litre=customer.price_per_litre,
+                    sale_time=timezone.make_aware(datetime.combine(day, time(self.rng.randint(7, 19)))),
+                )
+                sales.append(sale)
+                owed[customer] += sale.amount
+            if day.day == 1:
+                # Customers settle most of what they owe at the start of the month.
+                for customer, amount in owed.items():
+                    if amount > 0:
+                        paid = (amount * Decimal(self.rng.uniform(0.8, 1))).quantize(Decimal('0.01'))
+                        payments.append(CustomerPayment(customer=customer, amount=paid, paid_on=day))
+                        owed[customer] -= paid
+                for category in EXPENSE_CATEGORIES:
+                    expenses.append(Expense(
+                        farm=farm, name=f'{category} for {day:%B %Y}', category=category, date=day,
+                        cost=Decimal(f'{self.rng.uniform(2000, 40000):.2f}'),
+                    ))
+                revenue.append(Revenue(
+                    farm=farm, name=f'Milk deliveries {day:%B %Y}', date=day,
+                    cost=Decimal(f'{self.rng.uniform(50000, 250000):.2f}'),
+                ))
+            if len(sales) >= BATCH_SIZE:
+                self.flush(MilkSale, sales, 'milk_sales')
+            day += timedelta(days=1)
+
+        self.flush(MilkSale, sales, 'milk_sales')
+        self.flush(CustomerPayment, payments, 'customer_payments')
+        self.flush(Expense, expenses, 'expenses')
+        self.flush(Revenue, revenue, 'revenue')
+        self.flush(Inventory, [
+            Inventory(farm=farm, item_name=item, quantity=self.rng.randint(1, 200),
+                      unit_value=Decimal(f'{self.rng.uniform(50, 5000):.2f}'), date_acquired=self.start)
+            for item in ('Dairy meal (70kg)', 'Milking cans', 'Mineral licks', 'Hay bales')
+        ], 'inventory')
+
+    def flush(self, model, objects, name):
+        """bulk_create and empty ``objects`` in place."""
+        if objects:
+            model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+            self.count(name, len(objects))
+            objects.clear()
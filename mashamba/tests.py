@@ -1,3 +1,1051 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Sum
+from django.db.utils import load_backend
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import views
+from .analytics import herd_lactation_metrics
+from .anomalies import SETTLE_TIME, scan_milking_sessions
+from .customers import rebuild_customer_accounts
+from .forms import DateRangeForm
+from .importers import import_records
+from .ledger import rebuild_ledger
+from .middleware import QueryBudgetExceeded
+from .models import (
+    BreedingRecord, CalvingRecord, Cow, Customer, CustomerMonth, CustomerPayment, DailyMilkSummary, Expense, Farm,
+    FarmSearchToken, HealthRecord, MilkingSession, Inventory, LedgerMonth, MilkSale, ProductService,
+    ReproductiveStatus, Revenue, YieldAnomaly, YieldBaseline, YieldScanState,
+)
+from .reports import group_herd_rows
+from .rollups import day_start, rebuild_daily_milk_summaries
+from .synthetic import SyntheticFarmGenerator
+
+
+class FarmTestMixin:
+    """Creates a manager with one active farm and a small milking herd."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('manager', password='secret')
+        cls.farm = Farm.objects.create(name='Green Acres', manager=cls.user, location='Nakuru', active=True)
+        cls.cows = []
+        for i in range(3):
+            cls.cows.append(Cow.objects.create(farm=cls.farm, name_or_tag=f'Cow {i}', gender='Female'))
+        now = timezone.now()
+        for cow in cls.cows:
+            for days_ago in range(5):
+                MilkingSession.objects.create(
+                    cow=cow, milk_yield=Decimal('6.50'), milking_time=now - timedelta(days=days_ago)
+                )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Reads SQLite EXPLAIN QUERY PLAN output')
+class IndexUsageTests(FarmTestMixin, TestCase):
+    """The hot report queries must be answered from an index, not a table scan."""
+
+    HOT_TABLES = (
+        'mashamba_cow', 'mashamba_milkingsession', 'mashamba_dailymilksummary', 'mashamba_milksale',
+        'mashamba_healthrecord',
+    )
+
+    def assertViewUsesIndexes(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        checked = 0
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not any(table in sql for table in self.HOT_TABLES):
+                continue
+            plan = f'{connection.ops.explain_query_prefix()} {sql}'
+            with connection.cursor() as cursor:
+                cursor.execute(plan)
+                steps = [row[-1] for row in cursor.fetchall()]
+            for step in steps:
+                for table in self.HOT_TABLES:
+                    self.assertFalse(
+                        step.startswith(f'SCAN {table}'),
+                        f'{url} scans {table}:\n{sql}\n{steps}',
+                    )
+            checked += 1
+        self.assertGreater(checked, 0)
+
+    def test_cow_list_uses_index(self):
+        self.assertViewUsesIndexes(reverse('mashamba:cow_list', kwargs={'slug': self.farm.slug}))
+
+    def test_daily_milk_uses_index(self):
+        self.assertViewUsesIndexes(reverse('mashamba:daily-milk', kwargs={'slug': self.farm.slug}))
+
+    def test_all_cows_milk_uses_index(self):
+        self.assertViewUsesIndexes(reverse('mashamba:all_cows_milk', kwargs={'slug': self.farm.slug}))
+
+    def test_milking_sessions_uses_index(self):
+        url = reverse('mashamba:milking_sessions', kwargs={'slug': self.farm.slug, 'cow_id': self.cows[0].id})
+        self.assertViewUsesIndexes(url)
+
+    def test_milk_sales_entry_uses_index(self):
+        self.assertViewUsesIndexes(reverse('mashamba:milk_sales_entry', kwargs={'slug': self.farm.slug}))
+
+    def test_herd_health_uses_index(self):
+        self.assertViewUsesIndexes(reverse('mashamba:herd_health', kwargs={'slug': self.farm.slug}))
+
+
+class CowIdentifierTests(FarmTestMixin, TestCase):
+    def test_create_is_a_single_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            cow = Cow.objects.create(farm=self.farm, name_or_tag='Daisy', gender='Female')
+        cow_queries = [query['sql'] for query in queries.captured_queries if '"mashamba_cow"' in query['sql']]
+        self.assertEqual(len(cow_queries), 1)
+        self.assertTrue(cow_queries[0].startswith('INSERT'))
+        self.assertRegex(Cow.objects.get(pk=cow.pk).identifier, r'^Cow-[0-9A-F]{16}$')
+
+    def test_bulk_create_gives_distinct_identifiers(self):
+        cows = Cow.objects.bulk_create(
+            Cow(farm=self.farm, name_or_tag=f'Heifer {i}', gender='Female') for i in range(50)
+        )
+        identifiers = set(Cow.objects.filter(pk__in=[cow.pk for cow in cows]).values_list('identifier', flat=True))
+        self.assertEqual(len(identifiers), 50)
+        self.assertNotIn('', identifiers)
+
+
+class DailyMilkSummaryTests(FarmTestMixin, TestCase):
+    def summaries(self, cow):
+        return list(DailyMilkSummary.objects.filter(cow=cow, date=timezone.localdate()).values_list(
+            'total_yield', 'session_count',
+        ))
+
+    def test_summary_follows_sessions(self):
+        first, second = self.cows[0], self.cows[1]
+        session = MilkingSession.objects.create(cow=first, milk_yield=Decimal('3.00'), milking_time=timezone.now())
+        self.assertEqual(self.summaries(first), [(Decimal('9.50'), 2)])
+
+        session.cow = second
+        session.milk_yield = Decimal('4.00')
+        session.save()
+        self.assertEqual(self.summaries(first), [(Decimal('6.50'), 1)])
+        self.assertEqual(self.summaries(second), [(Decimal('10.50'), 2)])
+
+        session.delete()
+        self.assertEqual(self.summaries(second), [(Decimal('6.50'), 1)])
+
+    def test_cow_delete_does_not_refresh_per_session(self):
+        cow = self.cows[0]
+        now = timezone.now()
+        MilkingSession.objects.bulk_create(
+            MilkingSession(cow=cow, milk_yield=Decimal('6.00'), milking_time=now - timedelta(days=days_ago))
+            for days_ago in range(5, 300)
+        )
+        cow_id = cow.id
+        with CaptureQueriesContext(connection) as ctx:
+            cow.delete()
+        self.assertLess(len(ctx.captured_queries), 20)
+        self.assertFalse(DailyMilkSummary.objects.filter(cow_id=cow_id).exists())
+
+    def test_rebuild_matches_sessions(self):
+        DailyMilkSummary.objects.all().delete()
+        self.assertEqual(rebuild_daily_milk_summaries(farm=self.farm), 15)
+        self.assertEqual(
+            DailyMilkSummary.objects.filter(farm=self.farm).aggregate(total=Sum('total_yield'))['total'],
+            MilkingSession.objects.filter(cow__farm=self.farm).aggregate(total=Sum('milk_yield'))['total'],
+        )
+        self.assertEqual(self.summaries(self.cows[0]), [(Decimal('6.50'), 1)])
+
+
+class DashboardTests(FarmTestMixin, TestCase):
+    def get_dashboard(self):
+        return self.client.get(reverse('mashamba:dashboard', kwargs={'slug': self.farm.slug}))
+
+    def test_dashboard_figures(self):
+        today = timezone.localdate()
+        BreedingRecord.objects.create(
+            cow=self.cows[0], breeding_method='AI', expected_calving_date=today + timedelta(days=10)
+        )
+        Expense.objects.create(farm=self.farm, name='Feed', cost=Decimal('300.00'), date=today)
+        Revenue.objects.create(farm=self.farm, name='Milk', cost=Decimal('500.00'), date=today)
+
+        response = self.get_dashboard()
+        kpis = response.context['kpis']
+        self.assertEqual(kpis['herd_size'], 3)
+        self.assertEqual(kpis['cows_in_milk'], 3)
+        self.assertEqual(kpis['yield_7_days'], Decimal('97.50'))
+        self.assertEqual(kpis['net_month_to_date'], Decimal('200.00'))
+        self.assertEqual([record.cow for record in kpis['upcoming_calvings']], [self.cows[0]])
+
+    def test_query_count_does_not_grow_with_herd(self):
+        # session, user, farm, then the dashboard's eight queries
+        with self.assertNumQueries(11):
+            self.get_dashboard()
+
+        today = timezone.localdate()
+        for i in range(20):
+            cow = Cow.objects.create(farm=self.farm, name_or_tag=f'Extra {i}', gender='Female')
+            MilkingSession.objects.create(cow=cow, milk_yield=Decimal('4.00'))
+            BreedingRecord.objects.create(cow=cow, breeding_method='AI', expected_calving_date=today)
+            HealthRecord.objects.create(
+                cow=cow, health_issue='Lameness', treatment='Rest', vet_name='Dr. Otieno', vet_company='VetCare'
+            )
+
+        with self.assertNumQueries(11):
+            self.get_dashboard()
+
+
+class MilkHistoryTests(FarmTestMixin, TestCase):
+    def test_before_cursor_pages_back_in_time(self):
+        today = timezone.localdate()
+        url = reverse('mashamba:milking_sessions', kwargs={'slug': self.farm.slug, 'cow_id': self.cows[0].id})
+        page = self.client.get(url).context['page']
+        self.assertEqual(page.days, [today - timedelta(days=days_ago) for days_ago in range(5)])
+        self.assertFalse(page.has_next)
+
+        page = self.client.get(url, {'before': today - timedelta(days=2)}).context['page']
+        self.assertEqual(page.days, [today - timedelta(days=3), today - timedelta(days=4)])
+
+        response = self.client.get(url, {'end': '9999-12-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('end', response.context['filter_form'].errors)
+
+
+class HerdDailyMilkTests(FarmTestMixin, TestCase):
+    def test_group_herd_rows(self):
+        today = timezone.localdate()
+        yesterday = today - timedelta(days=1)
+        rows = [
+            {'date': today, 'cow__name_or_tag': 'Cow 0', 'total_yield': Decimal('7.00'), 'day_total': Decimal('12.50')},
+            {'date': today, 'cow__name_or_tag': 'Cow 1', 'total_yield': Decimal('5.50'), 'day_total': Decimal('12.50')},
+            {'date': yesterday, 'cow__name_or_tag': 'Cow 0', 'total_yield': Decimal('6.00'), 'day_total': Decimal('6.00')},
+        ]
+        days = group_herd_rows(rows)
+        self.assertEqual([(day['date'], day['total'], day['rowspan']) for day in days], [
+            (today, Decimal('12.50'), 2), (yesterday, Decimal('6.00'), 1),
+        ])
+        self.assertEqual(days[0]['cows'], [
+            {'cow': 'Cow 0', 'total_yield': Decimal('7.00')}, {'cow': 'Cow 1', 'total_yield': Decimal('5.50')},
+        ])
+
+    def test_days_are_grouped_per_farm(self):
+        other = User.objects.create_user('other', password='secret')
+        hill = Farm.objects.create(name='Sunrise Hill', manager=other, active=True)
+        for name in ('Amani', 'Baraka'):
+            cow = Cow.objects.create(farm=hill, name_or_tag=name, gender='Female')
+            MilkingSession.objects.create(cow=cow, milk_yield=Decimal('10.00'))
+
+        url = reverse('mashamba:all_cows_milk', kwargs={'slug': self.farm.slug})
+        days = self.client.get(url).context['days']
+        self.assertEqual(len(days), 5)
+        self.assertTrue(all(day['total'] == Decimal('19.50') and day['rowspan'] == 3 for day in days))
+        self.assertEqual([row['cow'] for row in days[0]['cows']], ['Cow 0', 'Cow 1', 'Cow 2'])
+
+        self.client.force_login(other)
+        days = self.client.get(reverse('mashamba:all_cows_milk', kwargs={'slug': hill.slug})).context['days']
+        self.assertEqual([(day['total'], day['rowspan']) for day in days], [(Decimal('20.00'), 2)])
+
+
+class HerdMilkingTests(FarmTestMixin, TestCase):
+    def post_sheet(self, rows, milking_time='2024-05-01T06:30'):
+        data = {
+            'milking_time': milking_time,
+            'form-TOTAL_FORMS': str(len(rows)),
+            'form-INITIAL_FORMS': str(len(rows)),
+        }
+        for i, (cow_id, milk_yield) in enumerate(rows):
+            data[f'form-{i}-cow'] = str(cow_id)
+            data[f'form-{i}-milk_yield'] = milk_yield
+        url = reverse('mashamba:herd_milking', kwargs={'slug': self.farm.slug})
+        return self.client.post(url, data)
+
+    def test_valid_batch(self):
+        rows = [(self.cows[0].id, '7.25'), (self.cows[1].id, ''), (self.cows[2].id, '5.00')]
+        response = self.post_sheet(rows)
+        self.assertRedirects(
+            response, reverse('mashamba:all_cows_milk', kwargs={'slug': self.farm.slug}), fetch_redirect_response=False,
+        )
+        sessions = MilkingSession.objects.filter(milking_time__date=date(2024, 5, 1))
+        self.assertEqual(
+            sorted(sessions.values_list('cow_id', 'milk_yield')),
+            [(self.cows[0].id, Decimal('7.25')), (self.cows[2].id, Decimal('5.00'))],
+        )
+
+    def test_cow_from_another_farm_is_rejected(self):
+        other = Farm.objects.create(name='Sunrise Hill', manager=User.objects.create_user('other'), active=True)
+        stranger = Cow.objects.create(farm=other, name_or_tag='Stranger', gender='Female')
+        response = self.post_sheet([(self.cows[0].id, '7.00'), (stranger.id, '8.00')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['formset'][1].errors['cow'], ["This cow is not part of the farm's milking herd."])
+        self.assertEqual(MilkingSession.objects.count(), 15)
+
+    def test_negative_yield_is_rejected(self):
+        response = self.post_sheet([(self.cows[0].id, '7.00'), (self.cows[1].id, '-2.00')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['formset'][1].errors['milk_yield'], ['Milk yield cannot be negative.'])
+        self.assertEqual(MilkingSession.objects.count(), 15)
+
+
+class MilkSalesTests(FarmTestMixin, TestCase):
+    def test_sales_are_scoped_to_the_farm(self):
+        other = Farm.objects.create(name='Hill Top', manager=User.objects.create_user('neighbour'), active=True)
+        MilkSale.objects.create(farm=other, customer_name='Hotel', milk_amount=Decimal('40.00'))
+        url = reverse('mashamba:milk_sales_entry', kwargs={'slug': self.farm.slug})
+        self.client.post(url, {
+            'customer_name': 'Kiosk', 'milk_amount': '12.50',
+            'sale_time': timezone.localtime().strftime('%Y-%m-%dT%H:%M'),
+        })
+        self.assertEqual(MilkSale.objects.get(customer_name='Kiosk').farm, self.farm)
+
+        response = self.client.get(url)
+        self.assertEqual([sale.customer_name for sale in response.context['milk_sales']], ['Kiosk'])
+        dashboard = self.client.get(reverse('mashamba:dashboard', kwargs={'slug': self.farm.slug}))
+        self.assertEqual(dashboard.context['kpis']['sold_30_days'], Decimal('12.50'))
+        other_url = reverse('mashamba:milk_sales_entry', kwargs={'slug': other.slug})
+        self.assertEqual(self.client.get(other_url).status_code, 404)
+
+    def test_unassigned_sales_are_left_out_and_listed_in_admin(self):
+        MilkSale.objects.create(customer_name='Old ledger', milk_amount=Decimal('30.00'))
+        url = reverse('mashamba:milk_sales_entry', kwargs={'slug': self.farm.slug})
+        self.assertEqual(list(self.client.get(url).context['milk_sales']), [])
+        self.assertEqual(LedgerMonth.objects.get(kind='milk_sales').farm, None)
+
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        changelist = reverse('admin:mashamba_milksale_changelist')
+        self.assertContains(self.client.get(changelist, {'farm__isnull': 'True'}), 'Old ledger')
+
+    def test_sales_without_production_are_reconciled(self):
+        today = timezone.localdate()
+        MilkSale.objects.create(
+            farm=self.farm, customer_name='Hotel', milk_amount=Decimal('20.00'),
+            sale_time=day_start(today - timedelta(days=10)) + timedelta(hours=9),
+        )
+        MilkSale.objects.create(farm=self.farm, customer_name='Kiosk', milk_amount=Decimal('5.00'))
+
+        url = reverse('mashamba:milk_sales_entry', kwargs={'slug': self.farm.slug})
+        rows = {row['date']: row for row in self.client.get(url).context['report_data']}
+        self.assertEqual(len(rows), 6)
+        unrecorded = rows[today - timedelta(days=10)]
+        self.assertEqual((unrecorded['produced'], unrecorded['sold'], unrecorded['remaining']), (0, 20, -20))
+        self.assertEqual((rows[today]['produced'], rows[today]['remaining']), (Decimal('19.50'), Decimal('14.50')))
+
+
+class DateRangeFormTests(SimpleTestCase):
+    def window(self, **data):
+        return DateRangeForm(data or None).get_window()
+
+    def test_default_window(self):
+        today = timezone.localdate()
+        self.assertEqual(self.window(), (today - timedelta(days=29), today))
+        self.assertEqual(self.window(start='2026-01-01'), (date(2026, 1, 1), date(2026, 1, 30)))
+        self.assertEqual(self.window(end='2026-01-30'), (date(2026, 1, 1), date(2026, 1, 30)))
+        self.assertEqual(self.window(start='2025-01-01', end='2026-01-30'), (date(2025, 1, 1), date(2026, 1, 30)))
+
+    def test_invalid_dates_fall_back_to_the_default(self):
+        default = self.window()
+        self.assertEqual(self.window(start='2026-02-01', end='2026-01-01'), default)
+        for field in ('start', 'end', 'before'):
+            for value in ('0001-01-01', '9999-12-31'):
+                form = DateRangeForm({field: value})
+                self.assertIn(field, form.errors)
+                self.assertEqual(form.get_window(), default)
+                self.assertIsNone(form.get_cursor())
+
+
+class MilkReportCacheTests(FarmTestMixin, TestCase):
+    def test_repeat_views_skip_report_queries(self):
+        url = reverse('mashamba:all_cows_milk', kwargs={'slug': self.farm.slug})
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(url)
+        # session, user and farm lookups only
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertGreater(len(first), 3)
+        self.assertEqual(len(response.context['days']), 5)
+
+    def test_new_session_invalidates_farm_reports(self):
+        url = reverse('mashamba:daily-milk', kwargs={'slug': self.farm.slug})
+        before = dict(self.client.get(url).context['sorted_grouped_milk_yield'])
+
+        MilkingSession.objects.create(cow=self.cows[0], milk_yield=Decimal('1.00'))
+
+        after = dict(self.client.get(url).context['sorted_grouped_milk_yield'])
+        today = timezone.localdate().strftime('%Y-%m-%d')
+        self.assertEqual(after[today], before[today] + 1.0)
+
+    def test_renamed_cow_invalidates_farm_reports(self):
+        url = reverse('mashamba:all_cows_milk', kwargs={'slug': self.farm.slug})
+        self.client.get(url)
+
+        cow = self.cows[0]
+        cow.name_or_tag = 'Renamed'
+        cow.save()
+
+        rows = self.client.get(url).context['days'][0]['cows']
+        self.assertIn('Renamed', [row['cow'] for row in rows])
+
+
+class RequestMetricsTests(FarmTestMixin, TestCase):
+    def test_server_timing_reports_queries(self):
+        url = reverse('mashamba:cow_list', kwargs={'slug': self.farm.slug})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_view_over_budget_fails(self):
+        url = reverse('mashamba:daily-milk', kwargs={'slug': self.farm.slug})
+        with mock.patch.object(views.daily_milk_view, 'query_budget', 2):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(url)
+
+
+class AsyncViewTests(FarmTestMixin, TestCase):
+    """The report pages served through Django's ASGI handler."""
+
+    def setUp(self):
+        super().setUp()
+        self.async_client.force_login(self.user)
+
+    async def test_concurrent_report_requests(self):
+        urls = [
+            reverse('mashamba:all_farms'),
+            reverse('mashamba:farm_detail', kwargs={'slug': self.farm.slug}),
+            reverse('mashamba:cow_list', kwargs={'slug': self.farm.slug}),
+            reverse('mashamba:daily-milk', kwargs={'slug': self.farm.slug}),
+            reverse('mashamba:all_cows_milk', kwargs={'slug': self.farm.slug}),
+            reverse('mashamba:milking_sessions', kwargs={'slug': self.farm.slug, 'cow_id': self.cows[0].id}),
+        ]
+        responses = await asyncio.gather(*(self.async_client.get(url) for url in urls * 3))
+        self.assertEqual([response.status_code for response in responses], [200] * len(urls) * 3)
+        # Queries made from async views are still counted against the budgets.
+        self.assertNotIn('desc="0 queries"', responses[0]['Server-Timing'])
+        self.assertEqual(len(responses[3].context['sorted_grouped_milk_yield']), 5)
+
+    async def test_login_required(self):
+        self.async_client.cookies.clear()
+        response = await self.async_client.get(reverse('mashamba:daily-milk', kwargs={'slug': self.farm.slug}))
+        self.assertEqual(response.status_code, 302)
+
+    async def test_view_over_budget_fails(self):
+        url = reverse('mashamba:all_cows_milk', kwargs={'slug': self.farm.slug})
+        with mock.patch.object(views.all_cows_milk_view, 'query_budget', 2):
+            with self.assertRaises(QueryBudgetExceeded):
+                await self.async_client.get(url)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Exercises SQLite locking')
+class SQLiteConcurrencyTests(SimpleTestCase):
+    def test_parallel_writers_wait_instead_of_failing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = {**connection.settings_dict, 'NAME': os.path.join(directory, 'db.sqlite3')}
+            DatabaseWrapper = load_backend(settings_dict['ENGINE']).DatabaseWrapper
+            setup = DatabaseWrapper(settings_dict)
+            with setup.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('CREATE TABLE tally (n integer UNIQUE)')
+            setup.close()
+
+            def writer():
+                # Read then write in one transaction, like the daily summary refresh.
+                wrapper = DatabaseWrapper(settings_dict)
+                try:
+                    for _ in range(25):
+                        wrapper._start_transaction_under_autocommit()
+                        with wrapper.cursor() as cursor:
+                            cursor.execute('SELECT COALESCE(MAX(n), 0) FROM tally')
+                            cursor.execute('INSERT INTO tally (n) VALUES (%s)', [cursor.fetchone()[0] + 1])
+                        wrapper.commit()
+                finally:
+                    wrapper.close()
+
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                for future in [pool.submit(writer) for _ in range(8)]:
+                    future.result()
+
+            with setup.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*), MAX(n) FROM tally')
+                self.assertEqual(cursor.fetchone(), (200, 200))
+            setup.close()
+
+
+class ListQueryCountTests(FarmTestMixin, TestCase):
+    """List pages and admin changelists run the same queries however many rows they show."""
+
+    def add_rows(self, count):
+        farm = Farm.objects.create(
+            name=f'Farm {Farm.objects.count()}', manager=User.objects.create_user(f'user{User.objects.count()}'),
+            location='Nyeri',
+        )
+        for i in range(count):
+            ProductService.objects.create(farm=farm, name=f'Product {i}')
+            cow = Cow.objects.create(farm=self.farm, name_or_tag=f'Extra {i}', gender='Female')
+            MilkingSession.objects.create(cow=cow, milk_yield=Decimal('3.00'))
+            HealthRecord.objects.create(
+                cow=cow, health_issue='Mastitis', treatment='Antibiotics', vet_name='Dr. Wanjiku', vet_company='VetCare'
+            )
+            BreedingRecord.objects.create(cow=cow, breeding_method='AI')
+            CalvingRecord.objects.create(cow=cow, calf_details='Heifer')
+
+    def assertConstantQueries(self, urls):
+        counts = {}
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            counts[url] = len(queries)
+        self.add_rows(5)
+        for url in urls:
+            with self.subTest(url=url), CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            self.assertEqual(len(queries), counts[url], url)
+
+    def test_admin_changelists(self):
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        models = [Farm, ProductService, Cow, MilkingSession, HealthRecord, BreedingRecord, CalvingRecord]
+        self.assertConstantQueries([
+            reverse(f'admin:mashamba_{model._meta.model_name}_changelist') for model in models
+        ])
+
+    def test_list_views(self):
+        self.assertConstantQueries([
+            reverse('mashamba:all_farms'),
+            reverse('mashamba:farm_list'),
+            reverse('mashamba:farm_directory'),
+            reverse('mashamba:cow_list', kwargs={'slug': self.farm.slug}),
+            reverse('mashamba:farm_detail', kwargs={'slug': self.farm.slug}),
+        ])
+
+    def test_cow_fields_use_autocomplete(self):
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        response = self.client.get(reverse('admin:mashamba_milkingsession_add'))
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, f'>{self.cows[1].name_or_tag}</option>')
+
+
+class FarmDirectoryTests(FarmTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        Farm.objects.filter(pk=self.farm.pk).update(verified=True)
+        other = User.objects.create_user('other')
+        self.hill = Farm.objects.create(name='Sunrise Hill Dairy', manager=other, location='Nyeri', active=True, verified=True)
+        ProductService.objects.create(farm=self.hill, name='Fresh Yoghurt')
+        Farm.objects.create(name='Sunrise Valley', manager=other, location='Nyeri', active=True)
+
+    def directory(self, **params):
+        response = self.client.get(reverse('mashamba:farm_directory'), params)
+        return [farm.name for farm in response.context['farms']]
+
+    def test_search_and_filters(self):
+        self.assertEqual(self.directory(), ['Green Acres', 'Sunrise Hill Dairy'])
+        self.assertEqual(self.directory(q='sunr'), ['Sunrise Hill Dairy'])
+        self.assertEqual(self.directory(q='acres nak'), ['Green Acres'])
+        self.assertEqual(self.directory(location='nyeri', product='yog'), ['Sunrise Hill Dairy'])
+        self.assertEqual(self.directory(location='nakuru', product='yog'), [])
+
+    def test_prefix_search_without_code_point_collation(self):
+        # Backends other than SQLite match prefixes with LIKE instead of a range.
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            self.assertEqual(self.directory(q='sunr'), ['Sunrise Hill Dairy'])
+            self.assertEqual(self.directory(location='nyeri', product='yog'), ['Sunrise Hill Dairy'])
+
+    def test_index_follows_changes(self):
+        self.hill.name = 'Highland Hill Dairy'
+        self.hill.save()
+        self.assertEqual(self.directory(q='highland'), ['Highland Hill Dairy'])
+        self.assertEqual(self.directory(q='sunrise'), [])
+
+        self.hill.products_services.all().delete()
+        self.assertEqual(self.directory(product='yoghurt'), [])
+        ProductService.objects.create(farm=self.hill, name='Ghee')
+        self.hill.delete()
+        self.assertFalse(FarmSearchToken.objects.filter(farm_id=self.hill.pk).exists())
+
+    def test_admin_search_uses_index(self):
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        url = reverse('admin:mashamba_farm_changelist')
+        self.assertContains(self.client.get(url, {'q': 'yoghurt'}), 'Sunrise Hill Dairy')
+        self.assertNotContains(self.client.get(url, {'q': 'yoghurt'}), 'Green Acres')
+        self.assertContains(self.client.get(url, {'q': 'manager'}), 'Green Acres')
+
+
+class LedgerTests(FarmTestMixin, TestCase):
+    def ledger(self):
+        return list(LedgerMonth.objects.order_by('kind', 'month', 'category').values_list(
+            'farm_id', 'month', 'kind', 'category', 'amount', 'entries',
+        ))
+
+    def test_ledger_follows_entries(self):
+        feed = Expense.objects.create(farm=self.farm, name='Dairy meal', cost=Decimal('3000'), category='Feed', date='2026-01-10')
+        Expense.objects.create(farm=self.farm, name='Vet visit', cost=Decimal('1500'), category='Vet', date='2026-01-20')
+        Expense.objects.create(farm=self.farm, name='Hay', cost=Decimal('500'), category='Feed', date='2026-02-03')
+        Revenue.objects.create(farm=self.farm, name='Milk deliveries', cost=Decimal('10000'), date='2026-01-31')
+        Inventory.objects.create(farm=self.farm, item_name='Cans', quantity=4, unit_value=Decimal('250'), date_acquired='2025-12-01')
+        MilkSale.objects.create(farm=self.farm, customer_name='Kiosk', milk_amount=Decimal('12.50'))
+        feed.date = '2026-02-01'
+        feed.save()
+        Expense.objects.filter(name='Vet visit').get().delete()
+
+        incremental = self.ledger()
+        rebuild_ledger()
+        self.assertEqual(incremental, self.ledger())
+        self.assertIn((self.farm.id, date(2026, 2, 1), 'expense', 'Feed', Decimal('3500'), 2), incremental)
+
+        url = reverse('mashamba:profit_and_loss', kwargs={'slug': self.farm.slug})
+        response = self.client.get(url, {'year': 2026})
+        january = response.context['months'][0]
+        self.assertEqual((january['revenue'], january['expenses'], january['margin']), (Decimal('10000'), 0, Decimal('100.0')))
+        self.assertEqual(january['inventory_value'], Decimal('1000'))
+        self.assertEqual(response.context['categories'], [('Feed', Decimal('3500'))])
+        self.assertEqual([row['period'] for row in response.context['years']], [2025, 2026])
+        self.assertEqual(self.client.get(url, {'year': 0}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'year': 99999}).status_code, 404)
+
+    def test_farm_delete_clears_ledger(self):
+        for day in range(200):
+            Expense.objects.create(
+                farm=self.farm, name='Dairy meal', cost=Decimal('300'), category='Feed',
+                date=date(2025, 1, 1) + timedelta(days=day),
+            )
+        farm_id = self.farm.id
+        self.assertTrue(LedgerMonth.objects.filter(farm_id=farm_id).exists())
+        with CaptureQueriesContext(connection) as ctx:
+            self.farm.delete()
+        self.assertLess(len(ctx.captured_queries), 40)
+        self.assertFalse(LedgerMonth.objects.filter(farm_id=farm_id).exists())
+
+
+class CustomerAccountTests(FarmTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.kiosk = Customer.objects.create(farm=self.farm, name='Kiosk', price_per_litre=Decimal('50'))
+        self.hotel = Customer.objects.create(farm=self.farm, name='Hotel', price_per_litre=Decimal('60'))
+
+    def sell(self, customer, litres, day):
+        return MilkSale.objects.create(
+            farm=self.farm, customer=customer, customer_name=customer.name, milk_amount=Decimal(litres),
+            price_per_litre=customer.price_per_litre, sale_time=timezone.make_aware(timezone.datetime(*day, 8)),
+        )
+
+    def test_sale_edit_reads_the_old_row_once(self):
+        sale = self.sell(self.kiosk, '10', (2026, 1, 5))
+        sale.sale_time = timezone.make_aware(timezone.datetime(2026, 2, 5, 8))
+        with CaptureQueriesContext(connection) as queries:
+            sale.save()
+        lookups = [query['sql'] for query in queries.captured_queries if query['sql'].endswith('LIMIT 1')]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(LedgerMonth.objects.get(kind='milk_sales').month, date(2026, 2, 1))
+        self.assertEqual(CustomerMonth.objects.get(customer=self.kiosk).month, date(2026, 2, 1))
+
+    def test_statement_follows_sales_and_payments(self):
+        self.sell(self.kiosk, '20', (2025, 12, 30))
+        self.sell(self.kiosk, '10', (2026, 1, 5))
+        self.sell(self.kiosk, '10', (2026, 2, 5))
+        moved = self.sell(self.kiosk, '5', (2026, 2, 6))
+        self.sell(self.kiosk, '1', (2026, 2, 7)).delete()
+        moved.customer = self.hotel
+        moved.save()
+        CustomerPayment.objects.create(customer=self.kiosk, amount=Decimal('1200'), paid_on=date(2026, 1, 2))
+
+        accounts = CustomerMonth.objects.order_by('customer', 'month', 'kind').values_list(
+            'customer', 'month', 'kind', 'litres', 'amount', 'entries',
+        )
+        incremental = list(accounts)
+        rebuild_customer_accounts()
+        self.assertEqual(incremental, list(accounts.all()))
+
+        url = reverse('mashamba:customer_statement', kwargs={'slug': self.farm.slug, 'customer_id': self.kiosk.id})
+        response = self.client.get(url, {'year': 2026})
+        self.assertEqual(response.context['opening_balance'], Decimal('1000'))
+        self.assertEqual(
+            [(row['deliveries'], row['billed'], row['paid'], row['balance']) for row in response.context['months']],
+            [(1, Decimal('500'), Decimal('1200'), Decimal('300')), (1, Decimal('500'), 0, Decimal('800'))],
+        )
+        self.assertEqual(response.context['years'][0], 2025)
+
+        # A statement reads the monthly rows, however many deliveries there are.
+        for day in range(1, 29):
+            self.sell(self.kiosk, '2', (2026, 3, day))
+        with self.assertNumQueries(6):
+            self.client.get(url, {'year': 2026})
+        self.assertEqual(self.client.get(url, {'year': 0}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'year': 99999}).status_code, 404)
+
+    def test_sale_entry_bills_the_customer(self):
+        self.client.post(reverse('mashamba:milk_sales_entry', kwargs={'slug': self.farm.slug}), {
+            'customer': self.hotel.id, 'milk_amount': '12.50',
+            'sale_time': timezone.localtime().strftime('%Y-%m-%dT%H:%M'),
+        })
+        sale = MilkSale.objects.get()
+        self.assertEqual((sale.customer_name, sale.amount), ('Hotel', Decimal('750')))
+
+        url = reverse('mashamba:customer_statement', kwargs={'slug': self.farm.slug, 'customer_id': self.hotel.id})
+        self.client.post(url, {'amount': '500', 'paid_on': timezone.localdate().isoformat()})
+        response = self.client.get(reverse('mashamba:customer_list', kwargs={'slug': self.farm.slug}))
+        balances = {customer.name: customer.balance for customer in response.context['customers']}
+        self.assertEqual(balances, {'Hotel': Decimal('250'), 'Kiosk': 0})
+
+    def test_customer_delete_does_not_refresh_per_payment(self):
+        for day in range(1, 29):
+            CustomerPayment.objects.create(customer=self.kiosk, amount=Decimal('100'), paid_on=date(2026, 1, day))
+        customer_id = self.kiosk.id
+        with CaptureQueriesContext(connection) as ctx:
+            self.kiosk.delete()
+        self.assertLess(len(ctx.captured_queries), 15)
+        self.assertFalse(CustomerMonth.objects.filter(customer_id=customer_id).exists())
+
+
+class BreedingCalendarTests(FarmTestMixin, TestCase):
+    def test_status_follows_breeding_and_calving(self):
+        today = timezone.localdate()
+        cow, other = self.cows[0], self.cows[1]
+        CalvingRecord.objects.create(cow=cow, calving_date=today - timedelta(days=400), calf_details='Heifer')
+        BreedingRecord.objects.create(
+            cow=cow, breeding_method='AI', expected_calving_date=today + timedelta(days=5),
+            repeat_breeding_date=today + timedelta(days=3),
+        )
+        CalvingRecord.objects.create(cow=other, calving_date=today - timedelta(days=50), calf_details='Bull')
+
+        url = reverse('mashamba:breeding_calendar', kwargs={'slug': self.farm.slug})
+        with self.assertNumQueries(7):
+            response = self.client.get(url)
+        self.assertEqual([status.cow for status in response.context['calvings']], [cow])
+        self.assertEqual([status.cow for status in response.context['repeat_breedings']], [cow])
+        self.assertEqual([(status.cow, status.days_open) for status in response.context['open_cows']], [(other, 50)])
+        self.assertEqual(ReproductiveStatus.objects.get(cow=cow).days_open, 122)
+
+        # Calving a few days early still ends the breeding.
+        CalvingRecord.objects.create(cow=cow, calving_date=today - timedelta(days=1), calf_details='Heifer')
+        status = ReproductiveStatus.objects.get(cow=cow)
+        self.assertEqual((status.status, status.calving_count, status.calving_interval), ('open', 2, 399))
+
+        cow.delete()
+        self.assertFalse(ReproductiveStatus.objects.filter(cow_id=status.cow_id).exists())
+
+
+class HealthWithdrawalTests(FarmTestMixin, TestCase):
+    def test_withdrawn_milk_is_not_sellable(self):
+        today = timezone.localdate()
+        cow = self.cows[0]
+        response = self.client.post(
+            reverse('mashamba:cow_health', kwargs={'slug': self.farm.slug, 'cow_id': cow.id}),
+            {
+                'health_issue': 'Mastitis', 'treatment': 'Intramammary antibiotic',
+                'treatment_date': today - timedelta(days=2), 'withdrawal_days': 3,
+                'vet_name': 'Dr. Otieno', 'vet_company': 'VetCare',
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(HealthRecord.objects.get(cow=cow).withdrawal_until, today + timedelta(days=1))
+        HealthRecord.objects.create(
+            cow=self.cows[1], health_issue='Lameness', treatment='Hoof trimming', treatment_date=today,
+            vet_name='Dr. Otieno', vet_company='VetCare',
+        )
+
+        response = self.client.get(reverse('mashamba:herd_health', kwargs={'slug': self.farm.slug}))
+        self.assertEqual([entry['cow'] for entry in response.context['withdrawn_cows']], [cow])
+        self.assertEqual([entry['cow'] for entry in response.context['treated_cows']], [self.cows[1]])
+
+        # The three days milked since the treatment are withheld.
+        kpis = self.client.get(reverse('mashamba:dashboard', kwargs={'slug': self.farm.slug})).context['kpis']
+        self.assertEqual(kpis['withheld_30_days'], Decimal('19.50'))
+        self.assertEqual(kpis['sellable_30_days'], Decimal('78.00'))
+
+        response = self.client.get(reverse('mashamba:cow_health', kwargs={'slug': self.farm.slug, 'cow_id': cow.id}))
+        self.assertEqual(len(response.context['records']), 1)
+
+
+class LactationAnalyticsTests(FarmTestMixin, TestCase):
+    def test_metrics_from_last_calving(self):
+        today = timezone.localdate()
+        CalvingRecord.objects.create(cow=self.cows[0], calving_date=today - timedelta(days=30), calf_details='Bull')
+        CalvingRecord.objects.create(cow=self.cows[0], calving_date=today - timedelta(days=4), calf_details='Heifer')
+
+        response = self.client.get(
+            reverse('mashamba:cow_detail', kwargs={'slug': self.farm.slug, 'cow_id': self.cows[0].id})
+        )
+        lactation = response.context['lactation']
+        self.assertEqual(lactation['days_in_milk'], 4)
+        self.assertEqual(lactation['yield_to_date'], 32.5)
+        self.assertEqual(lactation['peak_yield'], 6.5)
+        self.assertEqual(lactation['persistence'], 100.0)
+        self.assertEqual(lactation['deviation'], 0.0)
+        # Five days milked, the other 300 follow the herd curve at 6.5 L/day.
+        self.assertEqual(lactation['projected_305'], 1982.5)
+
+    def test_herd_curve_skips_days_not_milked(self):
+        now, today = timezone.now(), timezone.localdate()
+        for cow in self.cows[:2]:
+            CalvingRecord.objects.create(cow=cow, calving_date=today - timedelta(days=4), calf_details='Heifer')
+        MilkingSession.objects.create(
+            cow=self.cows[1], milk_yield=Decimal('3.00'), milking_time=now - timedelta(days=3),
+        )
+        day_two = (day_start(today - timedelta(days=2)), day_start(today - timedelta(days=1)))
+        MilkingSession.objects.filter(cow=self.cows[1], milking_time__range=day_two).delete()
+
+        curve = herd_lactation_metrics(self.farm, today)['curve']
+        # Day 1 averages 6.5 and 9.5 L; on day 2 only the first cow was milked.
+        self.assertEqual(curve[:5], [6.5, 8.0, 6.5, 6.5, 6.5])
+        self.assertEqual(curve[-1], 6.5)
+
+    def test_ranking_lists_cows_without_calving_separately(self):
+        CalvingRecord.objects.create(
+            cow=self.cows[1], calving_date=timezone.localdate() - timedelta(days=4), calf_details='Heifer'
+        )
+        response = self.client.get(
+            reverse('mashamba:lactation_ranking', kwargs={'slug': self.farm.slug}), {'sort': 'peak_yield'}
+        )
+        self.assertEqual([entry['cow_id'] for entry in response.context['ranked']], [self.cows[1].id])
+        self.assertEqual(len(response.context['unranked']), 2)
+
+
+class YieldAnomalyTests(FarmTestMixin, TestCase):
+    def scan(self, settled_after=SETTLE_TIME):
+        return scan_milking_sessions(now=timezone.now() + settled_after)
+
+    def test_scan_flags_drops_and_spikes_once(self):
+        cow = self.cows[0]
+        start = timezone.now() - timedelta(days=30)
+        for i in range(10):
+            MilkingSession.objects.create(cow=cow, milk_yield=Decimal('6.50'), milking_time=start + timedelta(hours=12 * i))
+        self.assertEqual(self.scan(), (25, 0))
+
+        drop = MilkingSession.objects.create(cow=cow, milk_yield=Decimal('1.00'))
+        spike = MilkingSession.objects.create(cow=cow, milk_yield=Decimal('65.00'))
+        MilkingSession.objects.create(cow=self.cows[1], milk_yield=Decimal('6.00'))
+        mean_before = YieldBaseline.objects.get(cow=cow).mean
+
+        self.assertEqual(self.scan(), (3, 2))
+        self.assertEqual(self.scan(), (0, 0))
+        self.assertEqual(
+            dict(YieldAnomaly.objects.values_list('session_id', 'kind')), {drop.id: 'drop', spike.id: 'spike'}
+        )
+        # The drop is folded into the baseline, the spike is not.
+        baseline = YieldBaseline.objects.get(cow=cow)
+        self.assertAlmostEqual(baseline.mean, mean_before + 0.1 * (1.0 - mean_before))
+
+        response = self.client.get(reverse('mashamba:dashboard', kwargs={'slug': self.farm.slug}))
+        self.assertEqual(len(response.context['kpis']['yield_anomalies']), 2)
+
+    def test_scan_waits_for_sessions_to_settle(self):
+        now = timezone.now()
+        # Today's sessions are not settled yet.
+        self.assertEqual(scan_milking_sessions(now=now), (12, 0))
+
+        # Synced late, but milked before the settled sessions still to come.
+        late = MilkingSession.objects.create(
+            cow=self.cows[0], milk_yield=Decimal('6.00'), milking_time=now - timedelta(hours=12),
+        )
+        self.assertEqual(self.scan(), (4, 0))
+        newest = MilkingSession.objects.order_by('milking_time', 'id').last()
+        state = YieldScanState.objects.get()
+        self.assertEqual((state.last_milking_time, state.last_session_id), (newest.milking_time, newest.id))
+        self.assertEqual(YieldBaseline.objects.get(cow=late.cow).samples, 6)
+
+        # Behind the mark by the time it arrives: left for a rescan.
+        MilkingSession.objects.create(cow=self.cows[0], milk_yield=Decimal('6.00'), milking_time=now - timedelta(days=3))
+        self.assertEqual(self.scan(), (0, 0))
+
+
+class RecordImportTests(FarmTestMixin, TestCase):
+    def import_csv(self, kind, lines):
+        # Batches of two, so every file below spans several batches.
+        data = io.BytesIO('\n'.join(lines).encode())
+        return import_records(self.farm, kind, data, f'{kind}.csv', batch_size=2)
+
+    def assertImported(self, result, created, error_lines):
+        self.assertEqual(result.created, created)
+        self.assertEqual([line for line, _ in result.errors], error_lines)
+
+    def test_cows(self):
+        result = self.import_csv('cows', [
+            'Name or tag,Gender,Breed,Identifier',
+            'Imani,Female,Friesian,IMP-1',
+            'Baraka,Male,,',
+            'Zawadi,Unknown,,',
+            f'Twin,Female,,{self.cows[0].identifier}',
+            'Neema,Female,Jersey,IMP-2',
+        ])
+        self.assertImported(result, 3, [4, 5])
+        imported = Cow.objects.filter(farm=self.farm, name_or_tag__in=['Imani', 'Baraka', 'Neema'])
+        self.assertEqual(len({cow.identifier for cow in imported}), 3)
+        self.assertTrue(Cow.objects.filter(identifier='IMP-2', breed='Jersey').exists())
+
+    def test_milking_sessions(self):
+        bull = Cow.objects.create(farm=self.farm, name_or_tag='Bull', gender='Male')
+        cow, other = self.cows[0].identifier, self.cows[1].identifier
+        history = set(DailyMilkSummary.objects.values_list('id', flat=True))
+        result = self.import_csv('milking-sessions', [
+            'cow,milk_yield,milking_time',
+            f'{cow},7.25,2026-01-05 06:00',
+            f'{cow},plenty,2026-01-05 17:00',
+            'NO-SUCH-COW,5.00,2026-01-05 06:00',
+            f'{other},4.00,2026-01-05 06:00',
+            f'{bull.identifier},5.00,2026-01-05 06:00',
+        ])
+        self.assertImported(result, 2, [3, 4, 6])
+        self.assertEqual(
+            DailyMilkSummary.objects.get(cow=self.cows[0], date=date(2026, 1, 5)).total_yield, Decimal('7.25'),
+        )
+        # Only the imported days are summarised again; the rest of the history is left alone.
+        self.assertEqual(DailyMilkSummary.objects.exclude(id__in=history).count(), 2)
+        self.assertEqual(DailyMilkSummary.objects.filter(id__in=history).count(), len(history))
+
+    def test_health_records(self):
+        cow = self.cows[0].identifier
+        result = self.import_csv('health-records', [
+            'cow,health_issue,treatment,treatment_date,withdrawal_days,vet_name,vet_company',
+            f'{cow},Mastitis,Antibiotic,2026-01-05,4,Dr. Otieno,VetCare',
+            f'{cow},Lameness,Rest,2026-01-06,,Dr. Otieno,VetCare',
+            f'{cow},Lameness,Rest,2026-01-07,,,VetCare',
+        ])
+        self.assertImported(result, 2, [4])
+        self.assertEqual(
+            list(HealthRecord.objects.order_by('treatment_date').values_list('withdrawal_until', flat=True)),
+            [date(2026, 1, 9), None],
+        )
+
+    def test_breeding_records(self):
+        expected = timezone.localdate() + timedelta(days=100)
+        result = self.import_csv('breeding-records', [
+            'cow,breeding_method,expected_calving_date',
+            f'{self.cows[0].identifier},AI,{expected}',
+            f'{self.cows[1].identifier},Cloning,',
+            f'{self.cows[2].identifier},Natural,',
+        ])
+        self.assertImported(result, 2, [3])
+        self.assertEqual(ReproductiveStatus.objects.get(cow=self.cows[0]).expected_calving_date, expected)
+
+    def test_unreadable_files_are_reported(self):
+        url = reverse('mashamba:import_records', kwargs={'slug': self.farm.slug})
+        upload = SimpleUploadedFile('herd.csv', 'name_or_tag,gender\nZoé,Female\n'.encode('cp1252'))
+        response = self.client.post(url, {'kind': 'cows', 'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('UTF-8', response.context['form'].errors['file'][0])
+        self.assertFalse(Cow.objects.filter(name_or_tag__startswith='Zo').exists())
+
+        upload = SimpleUploadedFile('herd.xlsx', b'not a workbook')
+        response = self.client.post(url, {'kind': 'cows', 'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors['file'])
+
+
+class RecordExportTests(FarmTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        other = Farm.objects.create(name='Sunrise Hill', manager=User.objects.create_user('other'), active=True)
+        stranger = Cow.objects.create(farm=other, name_or_tag='Stranger', gender='Female')
+        MilkingSession.objects.create(cow=stranger, milk_yield=Decimal('9.00'))
+        Expense.objects.create(farm=other, name='Fencing', cost=Decimal('800.00'), date='2026-01-05')
+
+    def export(self, kind):
+        url = reverse('mashamba:export_records', kwargs={'slug': self.farm.slug, 'kind': kind})
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        return list(csv.reader(lines))
+
+    def test_milking_sessions_match_the_records(self):
+        header, *rows = self.export('milking-sessions')
+        self.assertEqual(header, ['cow', 'cow_name', 'milk_yield', 'milking_time'])
+        sessions = MilkingSession.objects.filter(cow__farm=self.farm).select_related('cow').order_by('milking_time', 'id')
+        self.assertEqual(rows, [
+            [session.cow.identifier, session.cow.name_or_tag, '6.50', timezone.localtime(session.milking_time).isoformat()]
+            for session in sessions
+        ])
+        self.assertNotIn('Stranger', [row[1] for row in rows])
+
+    def test_expenses_are_scoped_to_the_farm(self):
+        Expense.objects.create(farm=self.farm, name='Dairy meal', cost=Decimal('3000.00'), category='Feed', date='2026-01-10')
+        header, *rows = self.export('expenses')
+        self.assertEqual(header, ['name', 'description', 'category', 'cost', 'date'])
+        self.assertEqual(rows, [['Dairy meal', '', 'Feed', '3000.00', '2026-01-10']])
+
+    def test_unknown_export(self):
+        url = reverse('mashamba:export_records', kwargs={'slug': self.farm.slug, 'kind': 'cows'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class SyncTests(FarmTestMixin, TestCase):
+    def sync(self, payload):
+        return self.client.post(
+            reverse('mashamba:sync', kwargs={'slug': self.farm.slug}), json.dumps(payload), content_type='application/json'
+        )
+
+    def test_resent_batch_is_applied_once(self):
+        cow = self.cows[0]
+        milked = (timezone.now() - timedelta(hours=2)).isoformat()
+        sessions = [
+            {'client_id': str(uuid.uuid4()), 'cow': cow.identifier, 'milk_yield': '7.25', 'milking_time': milked}
+            for _ in range(3)
+        ]
+        payload = {
+            'since': None,
+            'milking_sessions': sessions + [sessions[0], {'client_id': str(uuid.uuid4()), 'cow': 'nope', 'milk_yield': '1'}],
+            'health_records': [{
+                'client_id': str(uuid.uuid4()), 'cow': cow.identifier, 'health_issue': 'Mastitis',
+                'treatment': 'Antibiotics', 'treatment_date': str(timezone.localdate()),
+                'vet_name': 'Dr. Kamau', 'vet_company': 'VetCare',
+            }],
+        }
+
+        body = self.sync(payload).json()
+        self.assertEqual(body['created'], {'milking_sessions': 3, 'health_records': 1})
+        self.assertEqual(body['duplicates'], {'milking_sessions': 1, 'health_records': 0})
+        self.assertEqual(len(body['errors']), 1)
+        today = DailyMilkSummary.objects.get(cow=cow, date=timezone.localdate(timezone.now() - timedelta(hours=2)))
+        self.assertEqual(today.session_count, 4)
+
+        payload['since'] = body['sync_token']
+        again = self.sync(payload).json()
+        self.assertEqual(again['created'], {'milking_sessions': 0, 'health_records': 0})
+        self.assertEqual(again['duplicates'], {'milking_sessions': 4, 'health_records': 1})
+        self.assertEqual(MilkingSession.objects.filter(client_id__isnull=False).count(), 3)
+        synced = {row['client_id'] for row in again['changes']['milking_sessions']}
+        self.assertTrue({session['client_id'] for session in sessions} <= synced)
+
+    def test_malformed_request(self):
+        response = self.client.post(
+            reverse('mashamba:sync', kwargs={'slug': self.farm.slug}), 'not json', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.sync({'since': 'yesterday'}).status_code, 400)
+
+
+class SyntheticDataTests(TestCase):
+    def test_same_seed_gives_same_data(self):
+        first = SyntheticFarmGenerator(seed=7, cows=4, prefix='First')
+        second = SyntheticFarmGenerator(seed=7, cows=4, prefix='Second')
+        farms = [first.generate(1)[0], second.generate(1)[0]]
+
+        self.assertEqual(first.counts, second.counts)
+        totals = [
+            MilkingSession.objects.filter(cow__farm=farm).aggregate(total=Sum('milk_yield'))['total']
+            for farm in farms
+        ]
+        self.assertEqual(totals[0], totals[1])
+        summarised = DailyMilkSummary.objects.filter(farm=farms[0]).aggregate(total=Sum('total_yield'))['total']
+        self.assertEqual(summarised, totals[0])
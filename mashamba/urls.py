@@ -12,16 +12,28 @@ urlpatterns = [
     path('', include('django.contrib.auth.urls')),
     path('', views.home_view, name='home'),
     path('all_farms/', views.all_farms_view, name='all_farms'),
-    #path('<slug:slug>/dashboard/', views.dashboard_view, name='dashboard'),
+    path('directory/', views.farm_directory_view, name='farm_directory'),
+    path('<slug:slug>/dashboard/', views.dashboard_view, name='dashboard'),
     path('farm-subscription/', views.subscribe_farm, name='farm_subscribe'),
     path('user_farms/', views.farm_list_view, name='farm_list'),
     path('<slug:slug>/pay-to-activate/', views.pay_to_activate_view, name='pay_to_activate'),
     path('<slug:slug>/', views.farm_detail_view, name='farm_detail'),
     path('<slug:slug>/cows/', views.cow_list_view, name='cow_list'),
     path('<slug:slug>/milk/', views.daily_milk_view, name='daily-milk'),
+    path('<slug:slug>/milk/herd/', views.herd_milking_view, name='herd_milking'),
     path('<slug:slug>/milk-sales', views.milk_sales_entry_view, name='milk_sales_entry'),
+    path('<slug:slug>/profit-and-loss/', views.profit_and_loss_view, name='profit_and_loss'),
+    path('<slug:slug>/customers/', views.customer_list_view, name='customer_list'),
+    path('<slug:slug>/customers/<int:customer_id>/', views.customer_statement_view, name='customer_statement'),
     path('<slug:slug>/cows/add-cow/', views.add_cow_view, name='add_cow'),
+    path('<slug:slug>/cows/lactation/', views.lactation_ranking_view, name='lactation_ranking'),
+    path('<slug:slug>/cows/breeding/', views.breeding_calendar_view, name='breeding_calendar'),
+    path('<slug:slug>/cows/health/', views.herd_health_view, name='herd_health'),
+    path('<slug:slug>/import/', views.import_records_view, name='import_records'),
+    path('<slug:slug>/export/<slug:kind>.csv', views.export_records_view, name='export_records'),
+    path('<slug:slug>/sync/', views.sync_view, name='sync'),
     path('<slug:slug>/cows/<int:cow_id>/', views.cow_detail_view, name='cow_detail'),
+    path('<slug:slug>/cows/<int:cow_id>/health/', views.cow_health_view, name='cow_health'),
     path('<slug:slug>/cows/<int:cow_id>/update/', views.update_cow_view, name='update_cow'),
     path('farms/<slug:slug>/cows/<int:cow_id>/archive/', views.archive_cow_view, name='archive_cow'),
     path('<slug:slug>/cows/<int:cow_id>/milking-sessions/', views.milking_sessions_view, name='milking_sessions'),
@@ -1,15 +1,34 @@
 # views.py
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Cow, Farm, MilkingSession, MilkSale
-from django.db.models import DateField, Sum, Prefetch
-from .forms import UserRegistrationForm, FarmSubscriptionForm, CowForm, MilkingSessionForm, MilkSaleForm
+from .models import Cow, Customer, Farm, MilkingSession
+from django.db.models import DateField, Prefetch
+from .forms import UserRegistrationForm, FarmSubscriptionForm, CowForm, HealthRecordForm, MilkingSessionForm, MilkSaleForm, CustomerForm, CustomerPaymentForm, DateRangeForm, FarmDirectoryForm, HerdMilkingFormSet, HerdMilkingTimeForm, RecordImportForm
+from .analytics import RANKING_KEYS, herd_lactation_metrics, rank_cows
+from .async_shortcuts import aget_object_or_404, aget_user, alogin_required
+from .cache import acached_report, cached_report
+from .customers import customer_statement, farm_customers
+from .exports import EXPORTS, stream_csv
+from .health import cows_under_treatment
+from .importers import ImportFileError, import_records
+from .ledger import farm_profit_and_loss
+from .middleware import query_budget
+from .reproduction import breeding_calendar
+from .reports import (
+    cow_milking_history, farm_daily_milk, farm_dashboard, herd_daily_milk,
+    milk_reconciliation, milk_sales_in_window,
+)
+from .rollups import bulk_create_milking_sessions
+from .search import search_farms
+from .sync import SyncError, sync_farm
 from django.contrib.auth.decorators import login_required
-from collections import defaultdict
-from django.http import HttpResponseForbidden, HttpResponseRedirect
+from django.http import Http404, HttpResponseForbidden, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.utils import timezone
 from django.urls import reverse
+from datetime import MAXYEAR, MINYEAR
 from decimal import Decimal
+import json
 
 
 def custom_404(request, exception):
@@ -63,18 +82,44 @@ def pay_to_activate_view(request, slug):
     return render(request, 'mashamba/dairyfarm/pay_to_activate.html', context)
 
 
-@login_required
-def all_farms_view(request):
+@query_budget(3)
+@alogin_required
+async def all_farms_view(request):
     user = request.user
-    user_farms = Farm.objects.filter(manager=user)
-    other_farms = Farm.objects.exclude(manager=user)
+    user_farms = [farm async for farm in Farm.objects.filter(manager=user)]
+    # Other farms are found through the paginated farm directory
     context = {
         'user_farms': user_farms,
-        'other_farms': other_farms
     }
     return render(request, 'mashamba/dairyfarm/all_farms.html', context)
 
 
+@query_budget(4)
+async def farm_directory_view(request):
+    filter_form = FarmDirectoryForm(request.GET or None)
+    farms = Farm.objects.filter(active=True, verified=True).order_by('name')
+    if filter_form.is_valid():
+        data = filter_form.cleaned_data
+        farms = search_farms(farms, query=data['q'], location=data['location'], product=data['product'])
+
+    paginator = Paginator(farms, 20)
+    paginator.count = await farms.acount()  # so the paginator itself never queries
+    farms_paginated = paginator.get_page(request.GET.get('page'))
+    farms_paginated.object_list = [farm async for farm in farms_paginated.object_list]
+    await aget_user(request)
+
+    # Page links keep the filters
+    query = request.GET.copy()
+    query.pop('page', None)
+    context = {
+        'filter_form': filter_form,
+        'farms': farms_paginated,
+        'query': query.urlencode(),
+    }
+    return render(request, 'mashamba/dairyfarm/farm_directory.html', context)
+
+
+@query_budget(3)
 @login_required
 def farm_list_view(request):
     user = request.user
@@ -85,11 +130,14 @@ def farm_list_view(request):
     return render(request, 'mashamba/dairyfarm/farm_list.html', context)
 
 
-def farm_detail_view(request, slug):
-    farm = get_object_or_404(Farm, slug=slug)
+@query_budget(4)
+async def farm_detail_view(request, slug):
+    farm = await aget_object_or_404(Farm.objects.select_related('manager'), slug=slug)
 
     # Retrieve products_services related to the farm
-    products_services = farm.products_services.all()
+    products_services = [product async for product in farm.products_services.all()]
+    # The template checks whether the visitor manages this farm
+    await aget_user(request)
 
     context = {
         'farm': farm,
@@ -101,6 +149,20 @@ def farm_detail_view(request, slug):
     return render(request, 'mashamba/dairyfarm/farm_detail.html', context)
 
 
+@query_budget(11)
+@login_required
+def dashboard_view(request, slug):
+    farm = get_object_or_404(Farm, slug=slug, manager=request.user)
+
+    today = timezone.localdate()
+    context = {
+        'farm': farm,
+        'today': today,
+        'kpis': farm_dashboard(farm, today),
+    }
+    return render(request, 'mashamba/dairyfarm/dashboard.html', context)
+
+
 @login_required
 def add_cow_view(request, slug):
     farm = get_object_or_404(Farm, slug=slug, manager=request.user)
@@ -122,14 +184,16 @@ def add_cow_view(request, slug):
     return render(request, 'mashamba/dairyfarm/add_cow.html', context)
 
 
-@login_required
-def cow_list_view(request, slug):
+@query_budget(5)
+@alogin_required
+async def cow_list_view(request, slug):
     user = request.user
-    farm = get_object_or_404(Farm, slug=slug, manager=user)
+    farm = await aget_object_or_404(Farm.objects, slug=slug, manager=user)
     cows = Cow.objects.order_by('id').filter(farm=farm, is_active=True)
 
     # Pagination
     paginator = Paginator(cows, 7)  # Show 10 cows per page
+    paginator.count = await cows.acount()  # so the paginator itself never queries
     page = request.GET.get('page')
 
     try:
@@ -138,6 +202,7 @@ def cow_list_view(request, slug):
         cows_paginated = paginator.page(1)
     except EmptyPage:
         cows_paginated = paginator.page(paginator.num_pages)
+    cows_paginated.object_list = [cow async for cow in cows_paginated.object_list]
 
     context = {
         'farm': farm,
@@ -145,6 +210,7 @@ def cow_list_view(request, slug):
     }
     return render(request, 'mashamba/dairyfarm/cow_list.html', context)
 
+@query_budget(8)
 @login_required
 def cow_detail_view(request, slug, cow_id):
     user = request.user
@@ -152,14 +218,187 @@ def cow_detail_view(request, slug, cow_id):
     cow = get_object_or_404(Cow, id=cow_id, farm=farm)
     #last_mass = cow.mass_measurements.order_by('-date_measured').first()
 
+    # The herd's metrics are needed anyway for the cow's deviation from the herd curve
+    lactation = None
+    if cow.gender == 'Female':
+        metrics = farm_lactation_metrics(farm)
+        lactation = next((entry for entry in metrics['cows'] if entry['cow_id'] == cow.id), None)
+
     context = {
         'farm': farm,
         'cow': cow,
+        'lactation': lactation,
+        'yield_anomalies': cow.yield_anomalies.all()[:10],
         #'last_mass': last_mass
     }
     return render(request, 'mashamba/dairyfarm/cow_detail.html', context)
 
 
+@query_budget(6)
+@login_required
+def lactation_ranking_view(request, slug):
+    farm = get_object_or_404(Farm, slug=slug, manager=request.user)
+
+    sort = request.GET.get('sort')
+    if sort not in RANKING_KEYS:
+        sort = RANKING_KEYS[0]
+    ranked, unranked = rank_cows(farm_lactation_metrics(farm), sort)
+
+    context = {
+        'farm': farm,
+        'sort': sort,
+        'ranked': ranked,
+        'unranked': unranked,
+    }
+    return render(request, 'mashamba/dairyfarm/lactation_ranking.html', context)
+
+
+@query_budget(7)
+@login_required
+def breeding_calendar_view(request, slug):
+    farm = get_object_or_404(Farm, slug=slug, manager=request.user)
+
+    days = request.GET.get('days', '')
+    days = min(int(days), 365) if days.isdigit() else 30
+
+    context = {
+        'farm': farm,
+        'days': days,
+        **breeding_calendar(farm, days),
+    }
+    return render(request, 'mashamba/dairyfarm/breeding_calendar.html', context)
+
+
+@query_budget(4)
+@login_required
+def herd_health_view(request, slug):
+    farm = get_object_or_404(Farm, slug=slug, manager=request.user)
+
+    today = timezone.localdate()
+    cows = cows_under_treatment(farm, today)
+
+    context = {
+        'farm': farm,
+        'today': today,
+        'withdrawn_cows': [entry for entry in cows if entry['withdrawal_until']],
+        'treated_cows': [entry for entry in cows if not entry['withdrawal_until']],
+    }
+    return render(request, 'mashamba/dairyfarm/herd_health.html', context)
+
+
+@query_budget(6)
+@login_required
+def cow_health_view(request, slug, cow_id):
+    farm = get_object_or_404(Farm, slug=slug, manager=request.user)
+    cow = get_object_or_404(Cow, id=cow_id, farm=farm)
+
+    if request.method == 'POST':
+        form = HealthRecordForm(request.POST)
+        if form.is_valid():
+            record = form.save(commit=False)
+            record.cow = cow
+            record.save()
+            return redirect('mashamba:cow_health', slug=farm.slug, cow_id=cow.id)
+    else:
+        form = HealthRecordForm(initial={'treatment_date': timezone.localdate()})
+
+    # Newest first on the (cow, treatment_date) index
+    records = cow.healthrecord_set.order_by('-treatment_date', '-id')
+    records_paginated = Paginator(records, 20).get_page(request.GET.get('page'))
+
+    context = {
+        'farm': farm,
+        'cow': cow,
+        'form': form,
+        'today': timezone.localdate(),
+        'records': records_paginated,
+    }
+    return render(request, 'mashamba/dairyfarm/cow_health.html', context)
+
+
+def _year_param(request):
+    """The ``year`` query parameter, this year if it is missing or not a number."""
+    year = request.GET.get('year', '')
+    if not year.isdigit():
+        return timezone.localdate().year
+    if not MINYEAR <= int(year) <= MAXYEAR:
+        raise Http404("No such year.")
+    return int(year)
+
+
+@query_budget(5)
+@login_required
+def profit_and_loss_view(request, slug):
+    farm = get_object_or_404(Farm, slug=slug, manager=request.user)
+
+    year = _year_param(request)
+    report = farm_profit_and_loss(farm, year)
+
+    context = {
+        'farm': farm,
+        'year': year,
+        **report,
+    }
+    return render(request, 'mashamba/dairyfarm/profit_and_loss.html', context)
+
+
+@query_budget(5)
+@login_required
+def customer_list_view(request, slug):
+    farm = get_object_or_404(Farm, slug=slug, manager=request.user)
+
+    if request.method == 'POST':
+        form = CustomerForm(request.POST, farm=farm)
+        if form.is_valid():
+            customer = form.save(commit=False)
+            customer.farm = farm
+            customer.save()
+            return redirect('mashamba:customer_list', slug=farm.slug)
+    else:
+        form = CustomerForm(farm=farm)
+
+    context = {
+        'farm': farm,
+        'form': form,
+        'customers': farm_customers(farm),
+    }
+    return render(request, 'mashamba/dairyfarm/customer_list.html', context)
+
+
+# Recording a payment also refreshes that month of the account (five queries)
+@query_budget(10)
+@login_required
+def customer_statement_view(request, slug, customer_id):
+    farm = get_object_or_404(Farm, slug=slug, manager=request.user)
+    customer = get_object_or_404(Customer, id=customer_id, farm=farm)
+
+    if request.method == 'POST':
+        form = CustomerPaymentForm(request.POST)
+        if form.is_valid():
+            payment = form.save(commit=False)
+            payment.customer = customer
+            payment.save()
+            return redirect(f"{reverse('mashamba:customer_statement', args=[farm.slug, customer.id])}?year={payment.paid_on.year}")
+    else:
+        form = CustomerPaymentForm()
+
+    year = _year_param(request)
+
+    context = {
+        'farm': farm,
+        'customer': customer,
+        'form': form,
+        'year': year,
+        **customer_statement(customer, year),
+    }
+    return render(request, 'mashamba/dairyfarm/customer_statement.html', context)
+
+
+def farm_lactation_metrics(farm):
+    today = timezone.localdate()
+    return cached_report(farm.id, 'lactation', (today,), lambda: herd_lactation_metrics(farm, today))
+
+
 @login_required
 def update_cow_view(request, slug, cow_id):
     user = request.user
@@ -193,6 +432,23 @@ def archive_cow_view(request, slug, cow_id):
     return redirect('mashamba:cow_list', slug=farm.slug)
 
 
+@query_budget(20)
+@login_required
+@require_POST
+def sync_view(request, slug):
+    """JSON sync for offline field entry; see sync.py for the payload."""
+    farm = get_object_or_404(Farm, slug=slug, manager=request.user)
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'The request body is not valid JSON.'}, status=400)
+    try:
+        result = sync_farm(farm, payload)
+    except SyncError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(result)
+
+
 @login_required
 def add_milking_session_view(request, slug, cow_id):
     farm = get_object_or_404(Farm, slug=slug, manager=request.user)
@@ -219,133 +475,198 @@ def add_milking_session_view(request, slug, cow_id):
 
 
 @login_required
-def milking_sessions_view(request, slug, cow_id):
-    user = request.user
-    farm = get_object_or_404(Farm, slug=slug, manager=user)  # Ensure user owns the farm
-    cow = get_object_or_404(Cow, id=cow_id, farm=farm)
+def herd_milking_view(request, slug):
+    farm = get_object_or_404(Farm, slug=slug, manager=request.user)
+    herd = list(Cow.objects.filter(farm=farm, is_active=True, gender='Female').order_by('name_or_tag'))
+    herd_by_id = {cow.id: cow for cow in herd}
 
-    milking_sessions = MilkingSession.objects.filter(cow=cow).order_by('milking_time')
-    grouped_milk_yield = {}
+    if request.method == 'POST':
+        time_form = HerdMilkingTimeForm(request.POST)
+        formset = HerdMilkingFormSet(request.POST, form_kwargs={'herd': herd_by_id})
+        if time_form.is_valid() and formset.is_valid():
+            milking_time = time_form.cleaned_data['milking_time']
+            sessions = [
+                MilkingSession(cow=row['cow'], milk_yield=row['milk_yield'], milking_time=milking_time)
+                for row in formset.cleaned_data
+                if row.get('milk_yield') is not None
+            ]
+            # One transaction and one INSERT per batch for the whole herd
+            bulk_create_milking_sessions(sessions)
+            return redirect('mashamba:all_cows_milk', slug=farm.slug)
+    else:
+        time_form = HerdMilkingTimeForm()
+        formset = HerdMilkingFormSet(
+            initial=[{'cow': cow.id} for cow in herd], form_kwargs={'herd': herd_by_id}
+        )
+
+    # Pair every row with its cow so the sheet can show names next to errors
+    rows = []
+    for form in formset:
+        cow_id = form['cow'].value()
+        try:
+            cow = herd_by_id.get(int(cow_id))
+        except (TypeError, ValueError):
+            cow = None
+        rows.append((cow, form))
 
-    for session in milking_sessions:
-        date = session.milking_time.date()
-        if date not in grouped_milk_yield:
-            grouped_milk_yield[date] = {'sessions': [], 'total': 0}
-        grouped_milk_yield[date]['sessions'].append(session)
-        grouped_milk_yield[date]['total'] += session.milk_yield
+    context = {
+        'farm': farm,
+        'time_form': time_form,
+        'formset': formset,
+        'rows': rows,
+    }
+    return render(request, 'mashamba/dairyfarm/herd_milking.html', context)
+
+
+@login_required
+def import_records_view(request, slug):
+    farm = get_object_or_404(Farm, slug=slug, manager=request.user)
+    result = None
 
-    sorted_grouped_milk_yield = dict(sorted(grouped_milk_yield.items(), reverse=True))
+    if request.method == 'POST':
+        form = RecordImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = import_records(farm, form.cleaned_data['kind'], upload, upload.name)
+            except ImportFileError as exc:
+                form.add_error('file', str(exc))
+    else:
+        form = RecordImportForm()
 
     context = {
+        'farm': farm,
+        'form': form,
+        'result': result,
+    }
+    return render(request, 'mashamba/dairyfarm/import_records.html', context)
+
+
+@query_budget(4)
+@login_required
+def export_records_view(request, slug, kind):
+    farm = get_object_or_404(Farm, slug=slug, manager=request.user)
+    if kind not in EXPORTS:
+        raise Http404('Unknown export.')
+
+    response = StreamingHttpResponse(stream_csv(farm, kind), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{farm.slug}-{kind}.csv"'
+    return response
+
+
+@query_budget(6)
+@alogin_required
+async def milking_sessions_view(request, slug, cow_id):
+    user = request.user
+    farm = await aget_object_or_404(Farm.objects, slug=slug, manager=user)  # Ensure user owns the farm
+    cow = await aget_object_or_404(Cow.objects, id=cow_id, farm=farm)
+
+    filter_form = DateRangeForm(request.GET or None)
+    start, end = filter_form.get_window()
+    before = filter_form.get_cursor()
+
+    report = await acached_report(
+        farm.id, 'milking-sessions', (cow.id, start, end, before),
+        lambda: cow_milking_history(cow, start, end, before),
+    )
+
+    context = {
+        'farm': farm,
         'cow': cow,
-        'sorted_grouped_milk_yield': sorted_grouped_milk_yield,
+        'filter_form': filter_form,
+        'start': start,
+        'end': end,
+        **report,
     }
     return render(request, 'mashamba/dairyfarm/milking_sessions.html', context)
 
 
-@login_required
-def all_cows_milk_view(request, slug):
+@query_budget(5)
+@alogin_required
+async def all_cows_milk_view(request, slug):
     user = request.user
-    farm = get_object_or_404(Farm, slug=slug, manager=user)  # Ensure user owns the farm
+    farm = await aget_object_or_404(Farm.objects, slug=slug, manager=user)  # Ensure user owns the farm
 
-    # Aggregate milking sessions by cow and date
-    milking_sessions = MilkingSession.objects.filter(cow__farm=farm).values(
-        'cow__name_or_tag', 'milking_time__date'
-    ).annotate(total_yield=Sum('milk_yield')).order_by('-milking_time__date', 'cow__name_or_tag')
-
-    # Group by date
-    grouped_milk_yield = defaultdict(list)
-    daily_totals = defaultdict(float)
-    for session in milking_sessions:
-        date_str = session['milking_time__date'].strftime("%Y-%m-%d")
-        grouped_milk_yield[date_str].append({
-            'cow': session['cow__name_or_tag'],
-            'total_yield': session['total_yield']
-        })
-        daily_totals[date_str] += float(session['total_yield'])
-
-    # Sort dates in descending order
-    sorted_grouped_milk_yield = sorted(grouped_milk_yield.items(), reverse=True)
-    sorted_daily_totals = [(date, total) for date, total in sorted(daily_totals.items(), reverse=True)]
+    filter_form = DateRangeForm(request.GET or None)
+    start, end = filter_form.get_window()
+    before = filter_form.get_cursor()
+
+    report = await acached_report(
+        farm.id, 'all-cows-milk', (start, end, before),
+        lambda: herd_daily_milk(farm, start, end, before),
+    )
 
     # Prepare context to pass data to the template
     context = {
         'farm': farm,
-        'sorted_grouped_milk_yield': sorted_grouped_milk_yield,
-        'sorted_daily_totals': sorted_daily_totals,
+        'filter_form': filter_form,
+        'start': start,
+        'end': end,
+        **report,
     }
 
     return render(request, 'mashamba/dairyfarm/all_cows_milk.html', context)
 
 
 
-@login_required
-def daily_milk_view(request, slug):
+@query_budget(5)
+@alogin_required
+async def daily_milk_view(request, slug):
     user = request.user
-    farm = get_object_or_404(Farm, slug=slug, manager=user)  # Ensure user owns the farm
+    farm = await aget_object_or_404(Farm.objects, slug=slug, manager=user)  # Ensure user owns the farm
 
-    # Aggregate milking sessions by date
-    milking_sessions = MilkingSession.objects.filter(cow__farm=farm).values(
-        'milking_time__date'
-    ).annotate(total_yield=Sum('milk_yield')).order_by('-milking_time__date')
+    filter_form = DateRangeForm(request.GET or None)
+    start, end = filter_form.get_window()
+    before = filter_form.get_cursor()
 
-    # Group by date
-    grouped_milk_yield = defaultdict(float)
-    for session in milking_sessions:
-        date_str = session['milking_time__date'].strftime("%Y-%m-%d")
-        grouped_milk_yield[date_str] += float(session['total_yield'])
-
-    # Sort dates in descending order
-    sorted_grouped_milk_yield = sorted(grouped_milk_yield.items(), reverse=True)
+    report = await acached_report(
+        farm.id, 'daily-milk', (start, end, before),
+        lambda: farm_daily_milk(farm, start, end, before),
+    )
 
     # Prepare context to pass data to the template
     context = {
         'farm': farm,
-        'sorted_grouped_milk_yield': sorted_grouped_milk_yield,
+        'filter_form': filter_form,
+        'start': start,
+        'end': end,
+        **report,
     }
 
     return render(request, 'mashamba/dairyfarm/daily_milk.html', context)
 
 
+# Saving a sale also refreshes its ledger month and customer account (five queries each)
+@query_budget(16)
 @login_required
 def milk_sales_entry_view(request, slug):
-    farm = get_object_or_404(Farm, slug=slug)
-    today = timezone.now().date()
+    farm = get_object_or_404(Farm, slug=slug, manager=request.user)
 
     if request.method == 'POST':
-        form = MilkSaleForm(request.POST)
+        form = MilkSaleForm(request.POST, farm=farm)
         if form.is_valid():
-            form.save()
+            milk_sale = form.save(commit=False)
+            milk_sale.farm = farm
+            milk_sale.save()
             return redirect(reverse('mashamba:milk_sales_entry', kwargs={'slug': slug}))
     else:
-        form = MilkSaleForm()
-
-    milking_sessions = MilkingSession.objects.values('milking_time__date').annotate(total_milk=Sum('milk_yield')).order_by('-milking_time__date')
-    milk_sales = MilkSale.objects.values('sale_time__date', 'customer_name').annotate(milk_sold=Sum('milk_amount')).order_by('-sale_time__date')
-
-    sales_by_date = defaultdict(list)
-    for sale in milk_sales:
-        sales_by_date[sale['sale_time__date']].append(sale)
-
-    report_data = []
-    for session in milking_sessions:
-        date = session['milking_time__date']
-        total_milk = session['total_milk']
-        sold_milk = sum(sale['milk_sold'] for sale in sales_by_date[date])
-        remaining = total_milk - sold_milk
-        for sale in sorted(sales_by_date[date], key=lambda x: x['sale_time__date'], reverse=True):
-            report_data.append({
-                'date': date,
-                'total_milk': total_milk,
-                'customer_name': sale['customer_name'],
-                'milk_sold': sale['milk_sold'],
-                'remaining_milk': remaining,
-            })
+        form = MilkSaleForm(farm=farm)
+
+    filter_form = DateRangeForm(request.GET or None)
+    start, end = filter_form.get_window()
+
+    # Produced, sold and remaining milk per date, reconciled by the database
+    report_data = milk_reconciliation(farm, start, end)
+    milk_sales = milk_sales_in_window(farm, start, end)
 
     context = {
         'farm': farm,
         'form': form,
         'report_data': report_data,
+        'milk_sales': milk_sales,
+        'filter_form': filter_form,
+        'start': start,
+        'end': end,
     }
 
     return render(request, 'mashamba/dairyfarm/milk_sales_entry.html', context)